@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Google sign-in for the Consumption Dashboard, on Streamlit's built-in OIDC login (st.login)
+- Streamlit runs the authorization-code flow (Authlib) on its own /auth/login and
+  /oauth2callback routes and verifies the ID token against Google's published keys
+- The OAuth state and nonce live in Streamlit's signed session cookie, so a callback only
+  completes in the browser that started the login (login CSRF protection) and a state is
+  spent by its callback; nothing is kept per process, so any instance sharing the
+  cookie secret can complete it
+- The verified identity is kept in a signed, HttpOnly cookie that expires after 30 days:
+  reloads and new tabs are signed in without going back to Google, and nothing that
+  grants access is ever put in the URL
+"""
+
+import streamlit as st
+
+AUTH_KEYS = ('client_id', 'client_secret', 'redirect_uri', 'cookie_secret', 'server_metadata_url')
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+def get_auth_section():
+    """The [auth] secrets section st.login reads (None if not configured)"""
+    try:
+        if 'auth' in st.secrets:
+            return st.secrets['auth']
+    except Exception:
+        # Secrets not configured - this is OK for local development
+        pass
+    return None
+
+def is_configured():
+    """True if [auth] has everything st.login needs"""
+    section = get_auth_section()
+    return section is not None and all(section.get(key) for key in AUTH_KEYS)
+
+def missing_keys():
+    """[auth] keys st.login needs that are not set"""
+    section = get_auth_section() or {}
+    return [key for key in AUTH_KEYS if not section.get(key)]
+
+# ============================================================================
+# IDENTITY
+# ============================================================================
+
+def current_claims():
+    """Verified ID token claims from the identity cookie, or None when signed out"""
+    if not st.user.get('is_logged_in', False):
+        return None
+    return dict(st.user)
+
+def login():
+    """Send the browser to Google (via Streamlit's /auth/login)"""
+    st.login()
+
+def logout():
+    """Clear the identity cookie"""
+    st.logout()
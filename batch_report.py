@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Batch Report Renderer
+Renders every dashboard view for every split option of the dimension selector
+(5 views x 7 options) to static HTML or PNG, plus an index page.
+
+Only the report's date range is loaded, once (prewarm snapshot when fresh, otherwise
+BigQuery), and aggregated once per split option; the 35 figures are then built and written
+in a process pool from those small aggregates.
+
+Usage:
+    # Last 30 days of data as HTML into reports/<max date>/
+    python batch_report.py
+
+    # Explicit range, filtered, as PNG (needs the kaleido package)
+    python batch_report.py --start 2025-01-01 --end 2025-01-31 --filter is_us_player=1 --format png -o reports/january
+"""
+
+import argparse
+import html
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import export
+import views
+
+DEFAULT_DAYS = 30
+
+# ============================================================================
+# RENDERING
+# ============================================================================
+
+def _slug(label):
+    return label.lower().replace(' ', '_')
+
+def render_one(view, dimension_label, dimension, aggregate, date_range, fmt, path):
+    """Build one figure from a precomputed aggregate and write it (runs in a worker process)"""
+    from consumption_dashboard import CHART_FUNCTIONS
+
+    fig = CHART_FUNCTIONS[view](aggregate, dimension, date_range)
+    if fig is None:
+        return view, dimension_label, None
+    if dimension:
+        fig.update_layout(title=f"{fig.layout.title.text} by {dimension_label}")
+    if fmt == 'png':
+        fig.write_image(path, width=1400, height=fig.layout.height or 600)
+    else:
+        # plotly.js from the CDN keeps each file small; the index links them all
+        fig.write_html(path, include_plotlyjs='cdn', full_html=True)
+    return view, dimension_label, path
+
+def write_index(output_dir, results, date_range, fmt, column_filters):
+    """index.html linking every rendered view, one table row per split option"""
+    labels = list(dict.fromkeys(label for _, label, _ in results))
+    paths = {(view, label): path for view, label, path in results}
+    filters = "; ".join(f"{c} in {', '.join(map(str, v))}" for c, v in column_filters.items()) or "none"
+    lines = [
+        "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Consumption Daily Pack</title></head><body>",
+        f"<h1>📊 Consumption Daily Pack</h1><p>{date_range[0]} to {date_range[1]} · filters: {html.escape(filters)}</p>",
+        "<table border='1' cellpadding='6'><tr><th>Split by</th>"
+        + "".join(f"<th>{html.escape(views.VIEWS[v][0])}</th>" for v in views.VIEWS) + "</tr>",
+    ]
+    for label in labels:
+        cells = []
+        for view in views.VIEWS:
+            path = paths.get((view, label))
+            cells.append(f"<td><a href='{os.path.basename(path)}'>{fmt}</a></td>" if path else "<td>no data</td>")
+        lines.append(f"<tr><th>{html.escape(label)}</th>{''.join(cells)}</tr>")
+    lines.append("</table></body></html>")
+    with open(os.path.join(output_dir, 'index.html'), 'w') as f:
+        f.write("\n".join(lines))
+
+def render_pack(dataset, output_dir, date_range, column_filters=None, fmt='html', workers=None):
+    """Aggregate once per split option, then render all view x split combinations in parallel"""
+    from consumption_dashboard import DIMENSION_OPTIONS
+
+    rows = dataset.select_rows(date_range, column_filters)
+    if len(rows) == 0:
+        raise ValueError("No data matches the selected range and filters")
+    aggregates = {label: dataset.aggregate(rows, dimension) for label, dimension in DIMENSION_OPTIONS.items()}
+
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                render_one, view, label, dimension, aggregates[label], date_range, fmt,
+                os.path.join(output_dir, f"{view}__{_slug(label)}.{fmt}")
+            )
+            for label, dimension in DIMENSION_OPTIONS.items()
+            for view in views.VIEWS
+        ]
+        # Selector order (not completion order) for the index
+        results = [future.result() for future in futures]
+
+    write_index(output_dir, results, date_range, fmt, column_filters or {})
+    return results
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Render all dashboard views x split options to static files")
+    parser.add_argument('--start', type=date.fromisoformat, default=None,
+                        help=f"First date (default: {DEFAULT_DAYS} days before --end)")
+    parser.add_argument('--end', type=date.fromisoformat, default=None, help="Last date (default: latest date)")
+    parser.add_argument('--filter', action='append', default=[], metavar='COLUMN=V1,V2',
+                        help="Keep rows whose COLUMN is one of the values (repeatable)")
+    parser.add_argument('--format', choices=['html', 'png'], default='html')
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument('-o', '--output', default=None, help="Output directory (default: reports/<end date>)")
+    args = parser.parse_args()
+
+    if args.format == 'png':
+        try:
+            import kaleido  # noqa: F401 - plotly's static image engine
+        except ImportError:
+            print("❌ PNG output needs kaleido: pip install kaleido")
+            sys.exit(1)
+
+    start_time = time.time()
+    # Resolve the report's range first, so only its days are loaded
+    available = export.resolve_range(args.start, args.end)
+    if available is None:
+        print("❌ No data available")
+        sys.exit(1)
+    end = args.end or available.end
+    start = args.start or (end - timedelta(days=DEFAULT_DAYS - 1))
+    dataset = export.load_dataset(start, end)
+    if dataset is None:
+        print(f"❌ No data between {start} and {end}")
+        sys.exit(1)
+
+    output_dir = args.output or os.path.join('reports', str(end))
+    try:
+        column_filters = export.parse_filters(dataset.values, export.parse_filter_items(args.filter))
+        results = render_pack(dataset, output_dir, (start, end), column_filters, args.format, args.workers)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    rendered = sum(1 for _, _, path in results if path)
+    print(f"✅ Rendered {rendered}/{len(results)} charts ({start} to {end}) in {time.time() - start_time:.1f}s → "
+          f"{os.path.join(output_dir, 'index.html')}")
+
+if __name__ == "__main__":
+    main()
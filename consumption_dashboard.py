@@ -5,20 +5,36 @@ Connects to BigQuery fact_consumption_daily_dashboard table and displays consump
 """
 
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from google.cloud import bigquery
-from google.auth import default
-from google.oauth2 import service_account
-from google_auth_oauthlib.flow import Flow
 import json
+import threading
 import time
 from datetime import datetime, timedelta
-import numpy as np
 import os
 from urllib.parse import urlparse
+from startup_profile import LazyModule, DEFERRED_MODULES, mark, prewarm, enabled as startup_profile_enabled, format_report
+from dataset_cache import DatasetCache, memory_budget
+import snapshot
+import auth
+import query_planner
+import rerun_profiler
+import query_telemetry
+import dashboard_table
+from dashboard_table import FULL_TABLE, build_dashboard_query, query_dashboard_table, iter_result_pages
+
+# Heavy modules are imported on first use so the login page is served before the data stack loads
+pd = LazyModule('pandas')
+np = LazyModule('numpy')
+px = LazyModule('plotly.express')
+go = LazyModule('plotly.graph_objects')
+plotly_subplots = LazyModule('plotly.subplots')
+bigquery = LazyModule('google.cloud.bigquery')
+google_auth = LazyModule('google.auth')
+service_account = LazyModule('google.oauth2.service_account')
+hll_sketch = LazyModule('hll_sketch')
+shared_dataset = LazyModule('shared_dataset')
+date_store = LazyModule('date_store')
+views = LazyModule('views')
+downsample = LazyModule('downsample')
 
 # Page configuration
 st.set_page_config(
@@ -34,6 +50,8 @@ st.set_page_config(
 
 ALLOWED_DOMAINS = ['peerplay.com', 'peerplay.io']
 ALLOWED_EMAILS = []
+# Admins get the diagnostics tools (rerun profiler); comma-separated emails
+ADMIN_EMAILS = [e.strip() for e in os.environ.get('DASHBOARD_ADMIN_EMAILS', '').split(',') if e.strip()]
 
 def check_authorization(email):
     """Check if user's email is authorized"""
@@ -44,116 +62,23 @@ def check_authorization(email):
     email_domain = email.split('@')[-1].lower() if '@' in email else ''
     return email_domain in [d.lower() for d in ALLOWED_DOMAINS]
 
-def get_google_oauth_url():
-    """Get Google OAuth URL for authentication"""
-    client_id = None
-    client_secret = None
-    
-    # Try to access secrets, but handle missing secrets gracefully
-    try:
-        if hasattr(st, 'secrets'):
-            try:
-                if 'GOOGLE_OAUTH_CLIENT_ID' in st.secrets:
-                    client_id = st.secrets['GOOGLE_OAUTH_CLIENT_ID']
-                elif hasattr(st.secrets, 'get'):
-                    client_id = st.secrets.get('GOOGLE_OAUTH_CLIENT_ID')
-                if not client_id and 'GOOGLE_APPLICATION_CREDENTIALS_JSON' in st.secrets:
-                    creds_json = st.secrets['GOOGLE_APPLICATION_CREDENTIALS_JSON']
-                    try:
-                        if hasattr(creds_json, 'get'):
-                            client_id = creds_json.get('GOOGLE_OAUTH_CLIENT_ID')
-                        elif hasattr(creds_json, '__getitem__'):
-                            if 'GOOGLE_OAUTH_CLIENT_ID' in creds_json:
-                                client_id = creds_json['GOOGLE_OAUTH_CLIENT_ID']
-                    except:
-                        pass
-            except (KeyError, AttributeError, TypeError, Exception):
-                pass
-    except Exception:
-        # Secrets not configured - this is OK for local development
-        pass
-    
-    # Try to get client_secret
-    try:
-        if hasattr(st, 'secrets'):
-            try:
-                if 'GOOGLE_OAUTH_CLIENT_SECRET' in st.secrets:
-                    client_secret = st.secrets['GOOGLE_OAUTH_CLIENT_SECRET']
-                elif hasattr(st.secrets, 'get'):
-                    client_secret = st.secrets.get('GOOGLE_OAUTH_CLIENT_SECRET')
-                if not client_secret and 'GOOGLE_APPLICATION_CREDENTIALS_JSON' in st.secrets:
-                    creds_json = st.secrets['GOOGLE_APPLICATION_CREDENTIALS_JSON']
-                    try:
-                        if hasattr(creds_json, 'get'):
-                            client_secret = creds_json.get('GOOGLE_OAUTH_CLIENT_SECRET')
-                        elif hasattr(creds_json, '__getitem__'):
-                            if 'GOOGLE_OAUTH_CLIENT_SECRET' in creds_json:
-                                client_secret = creds_json['GOOGLE_OAUTH_CLIENT_SECRET']
-                    except:
-                        pass
-            except (KeyError, AttributeError, TypeError, Exception):
-                pass
-    except Exception:
-        # Secrets not configured - this is OK for local development
-        pass
-    
-    if not client_id:
-        client_id = os.environ.get('GOOGLE_OAUTH_CLIENT_ID')
-    if not client_secret:
-        client_secret = os.environ.get('GOOGLE_OAUTH_CLIENT_SECRET')
-    
-    if not client_id or not client_secret:
-        return None
-    
-    redirect_uri = None
-    try:
-        if hasattr(st, 'secrets'):
-            try:
-                if 'STREAMLIT_REDIRECT_URI' in st.secrets:
-                    redirect_uri = st.secrets['STREAMLIT_REDIRECT_URI']
-                elif hasattr(st.secrets, 'get'):
-                    redirect_uri = st.secrets.get('STREAMLIT_REDIRECT_URI')
-                if not redirect_uri and 'GOOGLE_APPLICATION_CREDENTIALS_JSON' in st.secrets:
-                    creds_json = st.secrets['GOOGLE_APPLICATION_CREDENTIALS_JSON']
-                    try:
-                        if hasattr(creds_json, 'get'):
-                            redirect_uri = creds_json.get('STREAMLIT_REDIRECT_URI')
-                        elif hasattr(creds_json, '__getitem__'):
-                            if 'STREAMLIT_REDIRECT_URI' in creds_json:
-                                redirect_uri = creds_json['STREAMLIT_REDIRECT_URI']
-                    except:
-                        pass
-            except (KeyError, AttributeError, TypeError, Exception):
-                pass
-    except Exception:
-        # Secrets not configured - this is OK for local development
-        pass
-    
-    if not redirect_uri:
-        redirect_uri = os.environ.get('STREAMLIT_REDIRECT_URI')
-    
-    if not redirect_uri:
-        redirect_uri = "https://consumption-dashboard.streamlit.app/"
-    
-    try:
-        flow = Flow.from_client_config(
-            {
-                "web": {
-                    "client_id": client_id,
-                    "client_secret": client_secret,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "redirect_uris": [redirect_uri]
-                }
-            },
-            scopes=["openid", "https://www.googleapis.com/auth/userinfo.email", "https://www.googleapis.com/auth/userinfo.profile"],
-            redirect_uri=redirect_uri
-        )
-        authorization_url, _ = flow.authorization_url(prompt="consent")
-        return authorization_url
-    except Exception as e:
-        st.error(f"Error creating OAuth flow: {e}")
-        return None
+def is_admin(email):
+    """Check if an authenticated user is a dashboard admin"""
+    return bool(email) and email.lower() in [e.lower() for e in ADMIN_EMAILS]
+
+def set_authenticated_user(claims):
+    """Store a verified identity in the session, or show why it is not allowed"""
+    email = claims.get('email', '') if claims.get('email_verified', False) else ''
+    if not check_authorization(email):
+        st.error(f"❌ Access Denied: {claims.get('email', '')} is not authorized to access this dashboard.")
+        st.info("This dashboard is restricted to Peerplay employees only.")
+        if st.button("🔄 Sign in with another account"):
+            auth.logout()
+        return False
+    st.session_state.authenticated = True
+    st.session_state.user_email = email
+    st.session_state.user_name = claims.get('name', '')
+    return True
 
 def authenticate_user():
     """Handle Google OAuth authentication"""
@@ -165,181 +90,27 @@ def authenticate_user():
     if st.session_state.authenticated:
         return True
     
-    query_params = st.query_params
-    code = query_params.get('code', None)
+    if auth.is_configured():
+        # Signed identity cookie from an earlier login: no call to Google
+        claims = auth.current_claims()
+        if claims is not None:
+            return set_authenticated_user(claims)
+        
+        st.markdown("### 🔐 Redirecting to Google Authentication...")
+        st.markdown("Please wait while we redirect you to sign in with your Google account.")
+        
+        # Import the data stack in the background while the user signs in
+        mark('login page served')
+        prewarm(DEFERRED_MODULES + ['shared_dataset'])
+        auth.login()
+        
+        # Stop execution to prevent dashboard from loading
+        st.stop()
     
-    if code:
-        try:
-            redirect_uri = None
-            try:
-                if hasattr(st, 'secrets'):
-                    try:
-                        if 'STREAMLIT_REDIRECT_URI' in st.secrets:
-                            redirect_uri = st.secrets['STREAMLIT_REDIRECT_URI']
-                        elif hasattr(st.secrets, 'get'):
-                            redirect_uri = st.secrets.get('STREAMLIT_REDIRECT_URI')
-                        if not redirect_uri and 'GOOGLE_APPLICATION_CREDENTIALS_JSON' in st.secrets:
-                            creds_json = st.secrets['GOOGLE_APPLICATION_CREDENTIALS_JSON']
-                            try:
-                                if hasattr(creds_json, 'get'):
-                                    redirect_uri = creds_json.get('STREAMLIT_REDIRECT_URI')
-                                elif hasattr(creds_json, '__getitem__'):
-                                    if 'STREAMLIT_REDIRECT_URI' in creds_json:
-                                        redirect_uri = creds_json['STREAMLIT_REDIRECT_URI']
-                            except:
-                                pass
-                    except (KeyError, AttributeError, TypeError, Exception):
-                        pass
-            except Exception:
-                pass
-            
-            if not redirect_uri:
-                redirect_uri = os.environ.get('STREAMLIT_REDIRECT_URI', "https://consumption-dashboard.streamlit.app/")
-            
-            client_id = None
-            client_secret = None
-            try:
-                if hasattr(st, 'secrets'):
-                    try:
-                        if 'GOOGLE_OAUTH_CLIENT_ID' in st.secrets:
-                            client_id = st.secrets['GOOGLE_OAUTH_CLIENT_ID']
-                        elif hasattr(st.secrets, 'get'):
-                            client_id = st.secrets.get('GOOGLE_OAUTH_CLIENT_ID')
-                        if not client_id and 'GOOGLE_APPLICATION_CREDENTIALS_JSON' in st.secrets:
-                            creds_json = st.secrets['GOOGLE_APPLICATION_CREDENTIALS_JSON']
-                            try:
-                                if hasattr(creds_json, 'get'):
-                                    client_id = creds_json.get('GOOGLE_OAUTH_CLIENT_ID')
-                                elif hasattr(creds_json, '__getitem__'):
-                                    if 'GOOGLE_OAUTH_CLIENT_ID' in creds_json:
-                                        client_id = creds_json['GOOGLE_OAUTH_CLIENT_ID']
-                            except:
-                                pass
-                    except (KeyError, AttributeError, TypeError, Exception):
-                        pass
-                    
-                    try:
-                        if 'GOOGLE_OAUTH_CLIENT_SECRET' in st.secrets:
-                            client_secret = st.secrets['GOOGLE_OAUTH_CLIENT_SECRET']
-                        elif hasattr(st.secrets, 'get'):
-                            client_secret = st.secrets.get('GOOGLE_OAUTH_CLIENT_SECRET')
-                        if not client_secret and 'GOOGLE_APPLICATION_CREDENTIALS_JSON' in st.secrets:
-                            creds_json = st.secrets['GOOGLE_APPLICATION_CREDENTIALS_JSON']
-                            try:
-                                if hasattr(creds_json, 'get'):
-                                    client_secret = creds_json.get('GOOGLE_OAUTH_CLIENT_SECRET')
-                                elif hasattr(creds_json, '__getitem__'):
-                                    if 'GOOGLE_OAUTH_CLIENT_SECRET' in creds_json:
-                                        client_secret = creds_json['GOOGLE_OAUTH_CLIENT_SECRET']
-                            except:
-                                pass
-                    except (KeyError, AttributeError, TypeError, Exception):
-                        pass
-            except Exception:
-                # Secrets not configured - this is OK for local development
-                pass
-            
-            if not client_id:
-                client_id = os.environ.get('GOOGLE_OAUTH_CLIENT_ID')
-            if not client_secret:
-                client_secret = os.environ.get('GOOGLE_OAUTH_CLIENT_SECRET')
-            
-            if client_id and client_secret:
-                flow = Flow.from_client_config(
-                    {
-                        "web": {
-                            "client_id": client_id,
-                            "client_secret": client_secret,
-                            "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                            "token_uri": "https://oauth2.googleapis.com/token",
-                            "redirect_uris": [redirect_uri]
-                        }
-                    },
-                    scopes=["openid", "https://www.googleapis.com/auth/userinfo.email", "https://www.googleapis.com/auth/userinfo.profile"],
-                    redirect_uri=redirect_uri
-                )
-                flow.fetch_token(code=code)
-                credentials = flow.credentials
-                import requests
-                user_info = requests.get(
-                    f"https://www.googleapis.com/oauth2/v2/userinfo?access_token={credentials.token}"
-                ).json()
-                email = user_info.get('email', '')
-                
-                if check_authorization(email):
-                    st.session_state.authenticated = True
-                    st.session_state.user_email = email
-                    st.session_state.user_name = user_info.get('name', '')
-                    # Clear the code from URL
-                    st.query_params.clear()
-                    st.rerun()
-                    return email
-                else:
-                    st.error(f"❌ Access Denied: {email} is not authorized to access this dashboard.")
-                    st.info("This dashboard is restricted to Peerplay employees only.")
-                    return None
-        except Exception as e:
-            error_msg = str(e)
-            # Handle scope change errors specifically
-            if "Scope has changed" in error_msg or "scope" in error_msg.lower():
-                st.error("🔐 **Authentication Error: Scope Mismatch**")
-                st.warning("""
-                **What happened:**
-                The OAuth scopes have changed. You need to re-authorize the application.
-                
-                **Solution:**
-                1. Clear your browser cookies/cache for this site
-                2. Or use an incognito/private browsing window
-                3. Click the login button again to re-authorize
-                
-                **Note:** This is a one-time re-authorization. After this, you should be able to access the dashboard normally.
-                """)
-                # Clear session state to force re-authentication
-                if 'authenticated' in st.session_state:
-                    del st.session_state['authenticated']
-                if 'user_email' in st.session_state:
-                    del st.session_state['user_email']
-            else:
-                st.error(f"Authentication error: {error_msg}")
-            return None
-    # Check for auth URL first - if it exists, redirect immediately without showing debug
-    try:
-        auth_url = get_google_oauth_url()
-        if auth_url:
-            # Show minimal content and redirect using JavaScript
-            st.markdown("### 🔐 Redirecting to Google Authentication...")
-            st.markdown("Please wait while we redirect you to sign in with your Google account.")
-            
-            # Use JavaScript to redirect - simplified approach
-            redirect_js = f"""
-            <script type="text/javascript">
-                (function() {{
-                    try {{
-                        window.location.href = "{auth_url}";
-                    }} catch(e) {{
-                        console.error("Redirect error:", e);
-                        // Fallback: create a link and click it
-                        var link = document.createElement('a');
-                        link.href = "{auth_url}";
-                        link.click();
-                    }}
-                }})();
-            </script>
-            """
-            
-            st.markdown(redirect_js, unsafe_allow_html=True)
-            
-            # Also provide a clickable link as fallback
-            st.markdown("---")
-            st.markdown("If you are not redirected automatically, click here:")
-            st.markdown(f"[**🔵 Sign in with Google**]({auth_url})")
-            
-            # Stop execution to prevent dashboard from loading
-            st.stop()
-    except Exception as e:
-        # If there's an error getting the auth URL, show it and continue to error page
-        st.error(f"Error setting up authentication: {str(e)}")
-        auth_url = None
+    if auth.get_auth_section() is not None:
+        # A half-configured login must not fall through to the open local-development mode
+        st.error(f"Error setting up authentication: [auth] secrets are missing {', '.join(auth.missing_keys())}")
+        st.stop()
     
     # Only show login page and debug if OAuth is not configured
     st.title("🔐 Authentication Required")
@@ -379,7 +150,6 @@ def authenticate_user():
 # ============================================================================
 
 PROJECT_ID = "yotam-395120"
-FULL_TABLE = "yotam-395120.peerplay.fact_consumption_daily_dashboard"
 
 @st.cache_resource
 def init_bigquery_client():
@@ -439,7 +209,7 @@ def init_bigquery_client():
         # Method 3: Application Default Credentials (for local development)
         # This is the standard way to authenticate locally
         try:
-            credentials, project = default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+            credentials, project = google_auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
             client = bigquery.Client(credentials=credentials, project=PROJECT_ID)
             return client
         except Exception as adc_error:
@@ -466,136 +236,47 @@ def init_bigquery_client():
         """)
         return None
 
-@st.cache_data(ttl=300, show_spinner="Loading data from BigQuery...")  # Cache for 5 minutes
-def load_data(_client, date_limit_days=None):
+@st.cache_data(ttl=300, show_spinner=False)
+def get_table_date_range(_client):
+    """First and last date in the dashboard table, cached"""
+    return dashboard_table.table_date_range(_client)
+
+def plan_store_load(client, store, start_date=None, end_date=None, allow_downgrade=True):
+    """
+    Dry-run the load of [start_date, end_date] against the query budget. If it does not fit,
+    downgrade to the most recent days that do. Returns (plan, first date loaded).
+    """
+    # Pages must keep the projection the store was built with (a snapshot seed has the event
+    # counts); a store built from BigQuery leaves them out, no view reads them
+    counts = store.columns is not None and any(c.endswith('_cnt') for c in store.columns)
+    name = 'all columns' if counts else 'view columns'
+
+    def plan(first_date, downgrade):
+        query, job_config = build_dashboard_query(client, start_date=first_date, end_date=end_date, counts=counts)
+        return query_planner.plan(client, name, query, job_config, downgrade)
+
+    try:
+        return plan(start_date, False), start_date
+    except query_planner.QueryBudgetExceeded as e:
+        if not allow_downgrade:
+            raise
+        table_min, table_max = get_table_date_range(client)
+        first, last = start_date or table_min, end_date or table_max
+        if first is None or last is None:
+            raise
+        # Date-partitioned scans grow with the number of days: keep the share of days that fits
+        fit_days = int(((last - first).days + 1) * query_planner.QUERY_BUDGET_BYTES / e.plan.bytes_estimated * 0.9)
+        if fit_days < 1:
+            raise
+        first = last - timedelta(days=fit_days - 1)
+        return plan(first, True), first
+
+def load_data(_client, date_limit_days=None, start_date=None, end_date=None):
     """Load data from BigQuery with optimized query"""
     try:
         # Debug: Show which table we're querying
         st.write(f"🔍 Querying table: `{FULL_TABLE}`")
-        # Load all available data (or last N days if date_limit_days is specified)
-        # The new table has sources as columns, not rows
-        if date_limit_days:
-            date_filter = f"WHERE date >= DATE_SUB(CURRENT_DATE(), INTERVAL {date_limit_days} DAY)"
-        else:
-            # Load all data - no date filter
-            date_filter = ""
-        
-        query = f"""
-        SELECT 
-            date,
-            first_chapter_bucket,
-            is_us_player,
-            last_balance_bucket,
-            last_version_of_day,
-            paid_today_flag,
-            paid_ever_flag,
-            players,
-            -- Inflow sources (all 18 sources)
-            rewards_race_inflow_sum_value,
-            rewards_race_inflow_cnt,
-            rewards_store_inflow_sum_value,
-            rewards_store_inflow_cnt,
-            rewards_rolling_offer_collect_inflow_sum_value,
-            rewards_rolling_offer_collect_inflow_cnt,
-            rewards_board_task_inflow_sum_value,
-            rewards_board_task_inflow_cnt,
-            rewards_harvest_collect_inflow_sum_value,
-            rewards_harvest_collect_inflow_cnt,
-            rewards_missions_total_inflow_sum_value,
-            rewards_missions_total_inflow_cnt,
-            rewards_recipes_inflow_sum_value,
-            rewards_recipes_inflow_cnt,
-            rewards_flowers_inflow_sum_value,
-            rewards_flowers_inflow_cnt,
-            rewards_rewarded_video_inflow_sum_value,
-            rewards_rewarded_video_inflow_cnt,
-            rewards_disco_inflow_sum_value,
-            rewards_disco_inflow_cnt,
-            rewards_timed_task_inflow_sum_value,
-            rewards_timed_task_inflow_cnt,
-            rewards_sell_board_item_inflow_sum_value,
-            rewards_sell_board_item_inflow_cnt,
-            rewards_mass_compensation_inflow_sum_value,
-            rewards_mass_compensation_inflow_cnt,
-            rewards_missions_task_inflow_sum_value,
-            rewards_missions_task_inflow_cnt,
-            rewards_album_set_completion_inflow_sum_value,
-            rewards_album_set_completion_inflow_cnt,
-            rewards_self_collectable_inflow_sum_value,
-            rewards_self_collectable_inflow_cnt,
-            rewards_eoc_inflow_sum_value,
-            rewards_eoc_inflow_cnt,
-            rewards_frenzy_non_jackpot_inflow_sum_value,
-            rewards_frenzy_non_jackpot_inflow_cnt,
-            -- Outflow sources (2 sources)
-            generation_outflow_sum_value,
-            generation_outflow_cnt,
-            click_bubble_purchase_outflow_sum_value,
-            click_bubble_purchase_outflow_cnt,
-            -- Calculated totals
-            total_inflow,
-            total_free_inflow,
-            total_paid_inflow,
-            total_outflow
-        FROM `{FULL_TABLE}`
-        {date_filter}
-        ORDER BY date DESC
-        """
-        
-        # Use job_config for faster queries with caching
-        from google.cloud.bigquery import QueryJobConfig
-        job_config = QueryJobConfig(
-            use_query_cache=True,
-            use_legacy_sql=False,
-            maximum_bytes_billed=10**10  # 10GB limit
-        )
-        
-        df = _client.query(query, job_config=job_config).to_dataframe()
-        
-        # Ensure proper data types
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date']).dt.date
-        
-        # Handle numeric fields - all source columns and totals
-        numeric_fields = [
-            'players', 'last_version_of_day',
-            'rewards_race_inflow_sum_value', 'rewards_race_inflow_cnt',
-            'rewards_store_inflow_sum_value', 'rewards_store_inflow_cnt',
-            'rewards_rolling_offer_collect_inflow_sum_value', 'rewards_rolling_offer_collect_inflow_cnt',
-            'rewards_board_task_inflow_sum_value', 'rewards_board_task_inflow_cnt',
-            'rewards_harvest_collect_inflow_sum_value', 'rewards_harvest_collect_inflow_cnt',
-            'rewards_missions_total_inflow_sum_value', 'rewards_missions_total_inflow_cnt',
-            'rewards_recipes_inflow_sum_value', 'rewards_recipes_inflow_cnt',
-            'rewards_flowers_inflow_sum_value', 'rewards_flowers_inflow_cnt',
-            'rewards_rewarded_video_inflow_sum_value', 'rewards_rewarded_video_inflow_cnt',
-            'rewards_disco_inflow_sum_value', 'rewards_disco_inflow_cnt',
-            'rewards_timed_task_inflow_sum_value', 'rewards_timed_task_inflow_cnt',
-            'rewards_sell_board_item_inflow_sum_value', 'rewards_sell_board_item_inflow_cnt',
-            'rewards_mass_compensation_inflow_sum_value', 'rewards_mass_compensation_inflow_cnt',
-            'rewards_missions_task_inflow_sum_value', 'rewards_missions_task_inflow_cnt',
-            'rewards_album_set_completion_inflow_sum_value', 'rewards_album_set_completion_inflow_cnt',
-            'rewards_self_collectable_inflow_sum_value', 'rewards_self_collectable_inflow_cnt',
-            'rewards_eoc_inflow_sum_value', 'rewards_eoc_inflow_cnt',
-            'rewards_frenzy_non_jackpot_inflow_sum_value', 'rewards_frenzy_non_jackpot_inflow_cnt',
-            'generation_outflow_sum_value', 'generation_outflow_cnt',
-            'click_bubble_purchase_outflow_sum_value', 'click_bubble_purchase_outflow_cnt',
-            'total_inflow', 'total_free_inflow', 'total_paid_inflow', 'total_outflow'
-        ]
-        for field in numeric_fields:
-            if field in df.columns:
-                df[field] = pd.to_numeric(df[field], errors='coerce').fillna(0)
-        
-        # Handle flag fields
-        flag_fields = ['paid_today_flag', 'paid_ever_flag', 'is_us_player']
-        for field in flag_fields:
-            if field in df.columns:
-                df[field] = df[field].fillna(0).astype(int)
-        
-        # Handle string fields (buckets)
-        string_fields = ['first_chapter_bucket', 'last_balance_bucket']
-        for field in string_fields:
-            if field in df.columns:
-                df[field] = df[field].astype(str)
+        df = query_dashboard_table(_client, date_limit_days, start_date, end_date)
         
         # Debug info
         if len(df) > 0:
@@ -611,6 +292,144 @@ def load_data(_client, date_limit_days=None):
         st.info("💡 Tip: Make sure the table exists and has data. Check BigQuery console.")
         return pd.DataFrame()
 
+def stream_data(_client, store, start_date=None, end_date=None, backfill_from=None):
+    """
+    Fold result pages into the date store as they arrive instead of building one full DataFrame.
+    Returns None, or why the load failed (already shown).
+    """
+    loaded = {'rows': 0, 'pages': 0}
+
+    def pages(load_plan):
+        for page in iter_result_pages(_client, load_plan.query, load_plan.job_config):
+            loaded['rows'] += len(page)
+            loaded['pages'] += 1
+            yield page
+
+    try:
+        st.write(f"🔍 Querying table: `{FULL_TABLE}`")
+        # Full loads and backfills may be cut to the most recent days that fit the budget
+        load_plan, first_date = plan_store_load(_client, store, start_date, end_date,
+                                                allow_downgrade=start_date is None or backfill_from is not None)
+        st.write(f"🧮 Query plan: {load_plan.name} · ~{load_plan.bytes_estimated / 1e9:,.2f} GB · "
+                 f"~{load_plan.seconds_estimated:,.0f}s (budget {query_planner.QUERY_BUDGET_BYTES / 1e9:,.0f} GB)")
+        if load_plan.downgrade:
+            st.warning(f"⚠️ Loading from {first_date} only: the full range would exceed the query budget. "
+                       f"Earlier days are fetched when the date range is widened.")
+            backfill_from = first_date
+        if backfill_from is not None:
+            query_planner.timed(load_plan, lambda p: store.backfill(pages(p), backfill_from))
+        else:
+            query_planner.timed(load_plan, lambda p: store.ingest(pages(p)))
+        if loaded['rows'] > 0:
+            st.success(f"✅ Successfully loaded {loaded['rows']:,} rows from `{FULL_TABLE}` "
+                       f"({loaded['pages']} pages streamed)")
+        return None
+    except query_planner.QueryBudgetExceeded as e:
+        st.error(f"❌ Load refused: {e}")
+        st.info("💡 Tip: Narrow the date range, or raise DASHBOARD_QUERY_BUDGET_GB.")
+        return f"Load refused: {e}"
+    except Exception as e:
+        st.error(f"❌ Error loading data from `{FULL_TABLE}`: {e}")
+        st.info("💡 Tip: Make sure the table exists and has data. Check BigQuery console.")
+        return str(e)
+
+@st.cache_resource
+def get_dataset_cache():
+    """Process-wide cache of the published dataset (one load per TTL for all sessions)"""
+    return DatasetCache()
+
+@st.cache_resource
+def get_date_store():
+    """
+    Process-wide date-chunked store behind the full-history dataset (DASHBOARD_RETENTION_DAYS),
+    capped at its share of DASHBOARD_CACHE_BUDGET_MB (the rest is for date cubes)
+    """
+    store_budget, _ = memory_budget()
+    return date_store.DateChunkedStore(date_store.default_retention_days(), budget_bytes=store_budget)
+
+def load_dataset(client, date_limit_days=None):
+    """Build the SharedDataset from the prewarmed snapshot when fresh, otherwise from BigQuery"""
+    if date_limit_days is None:
+        return refresh_date_store(client)
+    df = snapshot.read_snapshot(date_limit_days)
+    if df is None:
+        df = load_data(client, date_limit_days)
+    return shared_dataset.SharedDataset.from_frame(df)
+
+def refresh_date_store(client):
+    """
+    Full history through the date store: the first load reads the snapshot or the whole table,
+    later loads fetch only the newest held day (it may have been partial) and the days after it.
+    Query results are streamed into the store page by page.
+    """
+    store = get_date_store()
+    df = snapshot.read_snapshot(None) if store.n_days == 0 else None
+    if df is not None:
+        store.append(df)
+    else:
+        stream_data(client, store, start_date=store.max_date)
+    store.apply_retention()
+    return store.to_dataset()
+
+def get_shared_dataset(client, date_limit_days=None):
+    """Immutable SharedDataset shared by all sessions, loaded once per process and history length"""
+    return get_dataset_cache().get(date_limit_days, lambda days: load_dataset(client, days))
+
+@st.cache_resource
+def get_backfill_lock():
+    """
+    One backfill of the date store at a time: every backfill extends the same edge of the held
+    history, so concurrent ones for overlapping ranges would fetch and merge the same days
+    """
+    return threading.Lock()
+
+BACKFILL_RETRY_SECONDS = 60          # First wait after a failed backfill, doubled per failure
+BACKFILL_RETRY_MAX_SECONDS = 3600
+
+@st.cache_resource
+def get_backfill_failures():
+    """Process-wide {(first, last) fetch: failure} of backfills waiting for their retry time"""
+    return {}
+
+def backfill_failure(date_min):
+    """The failure recorded for the backfill date_min needs, while it waits to be retried (else None)"""
+    fetch = get_date_store().backfill_range(date_min)
+    failure = get_backfill_failures().get(fetch) if fetch else None
+    return failure if failure and time.time() < failure['retry_at'] else None
+
+def extend_shared_dataset(client, date_min):
+    """
+    Fetch only the days from date_min up to the held history (as many as the memory budget has
+    room for), merge them and republish
+    """
+    store = get_date_store()
+    with get_backfill_lock():
+        # Another session may have fetched these days while we waited, or the store may be full
+        fetch = store.backfill_range(date_min)
+        if fetch is None or backfill_failure(date_min):
+            return get_shared_dataset(client)
+        # A failed backfill is retried with backoff, not on every rerun of every session
+        failures = get_backfill_failures()
+        error = stream_data(client, store, start_date=fetch[0], end_date=fetch[1], backfill_from=fetch[0])
+        if error is not None:
+            attempts = failures[fetch]['attempts'] + 1 if fetch in failures else 1
+            wait = min(BACKFILL_RETRY_SECONDS * 2 ** (attempts - 1), BACKFILL_RETRY_MAX_SECONDS)
+            failures[fetch] = {'attempts': attempts, 'error': error, 'retry_at': time.time() + wait}
+            return get_shared_dataset(client)
+        failures.pop(fetch, None)
+        dataset = store.to_dataset()
+        get_dataset_cache().put(None, dataset)
+        return dataset
+
+def get_column_filters(filters):
+    """Applied sidebar filters as {table column: allowed values}"""
+    return {
+        column: filters[filter_key]
+        for filter_key, column in FILTER_COLUMNS.items()
+        if filters.get(filter_key)
+    }
+
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -626,147 +445,103 @@ def create_bucket_label(value, buckets):
                 return label
     return buckets[-1][2]  # Default to last bucket
 
+# Bucket definitions (min inclusive, max exclusive, label) - same boundaries as the SQL CASE expressions
+FIRST_CHAPTER_BUCKETS = [
+    (0, 11, "0-10"),
+    (11, 21, "11-20"),
+    (21, 51, "21-50"),
+    (51, float('inf'), "50+")
+]
+
+LAST_BALANCE_BUCKETS = [
+    (0, 101, "0-100"),
+    (101, 301, "101-300"),
+    (301, 501, "301-500"),
+    (501, 1001, "501-1000"),
+    (1001, 3001, "1001-3000"),
+    (3001, 5001, "3001-5000"),
+    (5001, float('inf'), "5000+")
+]
+
 def bucket_first_chapter(value):
     """Bucket first_chapter_of_day"""
-    buckets = [
-        (0, 11, "0-10"),
-        (11, 21, "11-20"),
-        (21, 51, "21-50"),
-        (51, float('inf'), "50+")
-    ]
-    return create_bucket_label(value, buckets)
+    return create_bucket_label(value, FIRST_CHAPTER_BUCKETS)
 
 def bucket_last_balance(value):
     """Bucket last_balance_of_day"""
-    buckets = [
-        (0, 101, "0-100"),
-        (101, 301, "101-300"),
-        (301, 501, "301-500"),
-        (501, 1001, "501-1000"),
-        (1001, 3001, "1001-3000"),
-        (3001, 5001, "3001-5000"),
-        (5001, float('inf'), "5000+")
-    ]
-    return create_bucket_label(value, buckets)
+    return create_bucket_label(value, LAST_BALANCE_BUCKETS)
 
-def calculate_daily_aggregates(df, dimension=None, date_range=None):
-    """Helper function to calculate daily aggregates"""
-    if len(df) == 0:
-        return pd.DataFrame()
-    
-    # Aggregate data by date (and dimension if provided)
-    # The new table already has calculated totals, so we just need to sum them
+def calculate_player_kpis(dataset, rows, dimension=None):
+    """Unique players and credits per player from merged HLL++ sketches"""
+    if dataset.sketches is None or len(rows) == 0:
+        return None
+
+    outflow = abs(dataset.columns['total_outflow'][rows].sum())
+    free_inflow = dataset.columns['total_free_inflow'][rows].sum()
+    paid_inflow = dataset.columns['total_paid_inflow'][rows].sum()
+
+    # Player-days: unique players per date, summed over the range
+    date_codes = dataset.date_codes[rows]
+    daily_players = hll_sketch.count_unique(dataset.sketches, rows, date_codes, len(dataset.dates))
+    daily_players = daily_players[np.bincount(date_codes, minlength=len(dataset.dates)) > 0]
+    player_days = daily_players.sum()
+
+    kpis = {
+        'unique_players': hll_sketch.count_unique(dataset.sketches, rows)[0],
+        'relative_error': hll_sketch.relative_error(dataset.sketches.precision),
+        'avg_daily_players': daily_players.mean(),
+        'outflow_per_player_day': outflow / player_days if player_days > 0 else 0,
+        'free_inflow_per_player_day': free_inflow / player_days if player_days > 0 else 0,
+        'paid_inflow_per_player_day': paid_inflow / player_days if player_days > 0 else 0,
+        'by_dimension': None
+    }
+
+    # Per split value: unique players over the whole range and credits per unique player
     if dimension:
-        group_cols = ['date', dimension]
-    else:
-        group_cols = ['date']
-    
-    # Calculate daily aggregates
-    daily_data = []
-    for date_group, group_df in df.groupby(group_cols):
-        if dimension:
-            # date_group is a tuple (date, dimension_value)
-            date_val, dim_val = date_group
-        else:
-            # date_group is just the date
-            date_val = date_group
-            dim_val = None
-        
-        # Ensure date_val is a proper date object, not a tuple
-        if isinstance(date_val, tuple):
-            date_val = date_val[0]
-        if isinstance(date_val, pd.Timestamp):
-            date_val = date_val.date()
-        
-        # Use calculated totals from the table (already aggregated)
-        total_inflow = group_df['total_inflow'].sum()
-        total_free_inflow = group_df['total_free_inflow'].sum()
-        total_paid_inflow = group_df['total_paid_inflow'].sum()
-        total_outflow_positive = abs(group_df['total_outflow'].sum())  # Make positive, then negative for display
-        
-        # Calculate consumption ratio (outflow / inflow)
-        consumption = (total_outflow_positive / total_inflow * 100) if total_inflow > 0 else 0
-        
-        row = {
-            'date': date_val,
-            'total_outflow': -total_outflow_positive,  # Keep negative for display (below zero)
-            'total_free_inflow': total_free_inflow,
-            'total_paid_inflow': total_paid_inflow,
-            'consumption': consumption
+        dim_codes = dataset.codes[dimension][rows]
+        n_values = len(dataset.values[dimension])
+        present = np.bincount(dim_codes, minlength=n_values) > 0
+        players = hll_sketch.count_unique(dataset.sketches, rows, dim_codes, n_values)
+        sums = {
+            column: np.bincount(dim_codes, weights=dataset.columns[column][rows], minlength=n_values)
+            for column in ['total_outflow', 'total_free_inflow', 'total_paid_inflow']
         }
+        kpis['by_dimension'] = pd.DataFrame({
+            dimension: dataset.values[dimension][present],
+            'Unique Players': np.round(players[present]).astype(int),
+            'Outflow per Player': np.abs(sums['total_outflow'][present]) / np.maximum(players[present], 1),
+            'Free Inflow per Player': sums['total_free_inflow'][present] / np.maximum(players[present], 1),
+            'Paid Inflow per Player': sums['total_paid_inflow'][present] / np.maximum(players[present], 1)
+        })
+
+    return kpis
+
+def calculate_daily_aggregates(df, dimension=None, date_range=None, dimension_values=None):
+    """Helper function to calculate daily aggregates"""
+    return views.consumption_series(df, dimension, date_range, dimension_values)
+
+def add_comparison_traces(fig, comparison_df, dimension, unique_values, y, name, color, legendgroup=None):
+    """Dotted overlay of the comparison period's series (one trace per subplot when split)"""
+    if comparison_df is None or len(comparison_df) == 0:
+        return
+    subsets = [comparison_df[comparison_df[dimension] == v] for v in unique_values] if dimension else [comparison_df]
+    for i, subset in enumerate(subsets, 1):
+        trace = go.Scatter(
+            x=subset['date'],
+            y=subset[y],
+            mode='lines',
+            name=f"{name} (comparison)",
+            line=dict(color=color, width=2, dash='dot'),
+            opacity=0.7,
+            legendgroup=legendgroup,
+            showlegend=(i == 1)
+        )
         if dimension:
-            row[dimension] = dim_val
-        
-        daily_data.append(row)
-    
-    chart_df = pd.DataFrame(daily_data)
-    
-    # Ensure we have all dates in the range, even if no data
-    if len(chart_df) > 0:
-        # Use date_range if provided, otherwise use min/max from data
-        if date_range and isinstance(date_range, (tuple, list)) and len(date_range) == 2:
-            try:
-                min_date, max_date = date_range
-                # Ensure dates are proper date objects
-                if isinstance(min_date, pd.Timestamp):
-                    min_date = min_date.date()
-                if isinstance(max_date, pd.Timestamp):
-                    max_date = max_date.date()
-                # Handle None values
-                if min_date is None or max_date is None:
-                    raise ValueError("Date range contains None values")
-            except (ValueError, TypeError) as e:
-                # Fallback to data min/max if date_range is invalid
-                date_range = None
-        
-        # If date_range is not valid, use min/max from data
-        if not date_range or not isinstance(date_range, (tuple, list)) or len(date_range) != 2:
-            min_date = chart_df['date'].min()
-            max_date = chart_df['date'].max()
-            
-            # Ensure dates are proper date objects, not tuples
-            if isinstance(min_date, tuple):
-                min_date = min_date[0]
-            if isinstance(max_date, tuple):
-                max_date = max_date[0]
-            
-            # Convert to pandas Timestamp if needed
-            if isinstance(min_date, pd.Timestamp):
-                min_date = min_date.date()
-            if isinstance(max_date, pd.Timestamp):
-                max_date = max_date.date()
-        
-        # Create a complete date range
-        all_dates = pd.date_range(start=min_date, end=max_date, freq='D').date.tolist()
-        
-        # Add missing dates with zero values
-        existing_dates = set(chart_df['date'].tolist())
-        for date_val in all_dates:
-            if date_val not in existing_dates:
-                row = {
-                    'date': date_val,
-                    'total_outflow': 0,
-                    'total_free_inflow': 0,
-                    'total_paid_inflow': 0,
-                    'consumption': 0
-                }
-                if dimension:
-                    # For missing dates, we need to add rows for each dimension value
-                    # Get all unique dimension values from existing data
-                    unique_dim_vals = chart_df[dimension].dropna().unique()
-                    for dim_val in unique_dim_vals:
-                        row_with_dim = row.copy()
-                        row_with_dim[dimension] = dim_val
-                        daily_data.append(row_with_dim)
-                else:
-                    daily_data.append(row)
-        
-        chart_df = pd.DataFrame(daily_data)
-    
-    chart_df = chart_df.sort_values('date')
-    return chart_df
+            fig.add_trace(trace, row=i, col=1)
+        else:
+            fig.add_trace(trace)
 
-def create_consumption_trend_chart(df, dimension=None, date_range=None):
+def create_consumption_trend_chart(df, dimension=None, date_range=None, comparison_df=None):
     """Create daily consumption trend line chart only"""
     if len(df) == 0:
         return None
@@ -781,7 +556,7 @@ def create_consumption_trend_chart(df, dimension=None, date_range=None):
         unique_values = sorted(chart_df[dimension].dropna().unique())
         n_rows = len(unique_values)
         
-        fig = make_subplots(
+        fig = plotly_subplots.make_subplots(
             rows=n_rows, cols=1,
             subplot_titles=[f"{dimension}: {val}" for val in unique_values],
             vertical_spacing=0.1
@@ -808,6 +583,7 @@ def create_consumption_trend_chart(df, dimension=None, date_range=None):
         fig.update_yaxes(title_text="Consumption %", row=n_rows, col=1)
         
     else:
+        unique_values = []
         # Single chart
         fig = go.Figure()
         
@@ -826,6 +602,11 @@ def create_consumption_trend_chart(df, dimension=None, date_range=None):
         fig.update_xaxes(title_text="Date")
         fig.update_yaxes(title_text="Consumption %")
     
+    # Comparison traces go after the main ones so point selection curve numbers are unchanged
+    if comparison_df is not None:
+        comparison = calculate_daily_aggregates(comparison_df, dimension, date_range, unique_values)
+        add_comparison_traces(fig, comparison, dimension, unique_values, 'consumption', 'Consumption %', 'darkblue')
+    
     fig.update_layout(
         title="Daily Consumption Trend",
         height=600 if not dimension else 200 * n_rows,
@@ -834,7 +615,7 @@ def create_consumption_trend_chart(df, dimension=None, date_range=None):
     
     return fig
 
-def create_credits_components_chart(df, dimension=None, date_range=None):
+def create_credits_components_chart(df, dimension=None, date_range=None, comparison_df=None):
     """Create bar chart showing credits components on single axis (outflow below zero, inflow above zero)"""
     if len(df) == 0:
         return None
@@ -849,7 +630,7 @@ def create_credits_components_chart(df, dimension=None, date_range=None):
         unique_values = sorted(chart_df[dimension].dropna().unique())
         n_rows = len(unique_values)
         
-        fig = make_subplots(
+        fig = plotly_subplots.make_subplots(
             rows=n_rows, cols=1,
             subplot_titles=[f"{dimension}: {val}" for val in unique_values],
             vertical_spacing=0.1
@@ -894,6 +675,7 @@ def create_credits_components_chart(df, dimension=None, date_range=None):
         )
         
     else:
+        unique_values = []
         # Single chart with single axis
         fig = go.Figure()
         
@@ -927,6 +709,11 @@ def create_credits_components_chart(df, dimension=None, date_range=None):
             zerolinecolor='black'
         )
     
+    if comparison_df is not None:
+        comparison = views.credits_components_series(comparison_df, dimension, date_range, unique_values)
+        add_comparison_traces(fig, comparison, dimension, unique_values, 'total_outflow', 'Total Outflow', 'orange')
+        add_comparison_traces(fig, comparison, dimension, unique_values, 'total_inflow', 'Total Inflow', 'darkblue')
+    
     fig.update_layout(
         title="Credits Components",
         height=600 if not dimension else 200 * n_rows,
@@ -936,105 +723,18 @@ def create_credits_components_chart(df, dimension=None, date_range=None):
     
     return fig
 
-def create_free_vs_paid_inflow_chart(df, dimension=None, date_range=None):
+def create_free_vs_paid_inflow_chart(df, dimension=None, date_range=None, comparison_df=None):
     """Create stacked bar chart showing Free vs Paid Inflow share as percentages"""
     if len(df) == 0:
         return None
     
-    # Aggregate by date (and dimension if provided)
-    # The new table already has calculated totals
-    if dimension:
-        group_cols = ['date', dimension]
-    else:
-        group_cols = ['date']
-    
-    daily_data = []
-    for date_group, group_df in df.groupby(group_cols):
-        if dimension:
-            date_val, dim_val = date_group
-        else:
-            date_val = date_group
-            dim_val = None
-        
-        # Ensure date_val is a proper date object
-        if isinstance(date_val, tuple):
-            date_val = date_val[0]
-        if isinstance(date_val, pd.Timestamp):
-            date_val = date_val.date()
-        
-        # Use calculated totals from the table
-        free_inflow = group_df['total_free_inflow'].sum()
-        paid_inflow = group_df['total_paid_inflow'].sum()
-        total_inflow = group_df['total_inflow'].sum()
-        
-        # Calculate percentages
-        free_share = (free_inflow / total_inflow * 100) if total_inflow > 0 else 0
-        paid_share = (paid_inflow / total_inflow * 100) if total_inflow > 0 else 0
-        
-        row = {
-            'date': date_val,
-            'Free Inflow': free_inflow,  # Keep absolute for tooltip
-            'Paid Inflow': paid_inflow,  # Keep absolute for tooltip
-            'Free Share %': free_share,
-            'Paid Share %': paid_share
-        }
-        if dimension:
-            row[dimension] = dim_val
-        
-        daily_data.append(row)
-    
-    chart_df = pd.DataFrame(daily_data)
-    
-    # Fill in missing dates in the selected range
-    if date_range:
-        date_min, date_max = date_range
-        if isinstance(date_min, tuple):
-            date_min = date_min[0]
-        if isinstance(date_max, tuple):
-            date_max = date_max[0]
-        if isinstance(date_min, pd.Timestamp):
-            date_min = date_min.date()
-        if isinstance(date_max, pd.Timestamp):
-            date_max = date_max.date()
-        
-        all_dates = pd.date_range(start=date_min, end=date_max, freq='D').date.tolist()
-        existing_dates = set(chart_df['date'].tolist()) if len(chart_df) > 0 else set()
-        
-        if dimension:
-            unique_dim_values = chart_df[dimension].dropna().unique() if len(chart_df) > 0 else []
-            for date_val in all_dates:
-                for dim_val in unique_dim_values:
-                    if date_val not in existing_dates or (date_val, dim_val) not in [(d, chart_df.loc[chart_df['date'] == date_val, dimension].iloc[0]) if len(chart_df[chart_df['date'] == date_val]) > 0 else None for d in existing_dates]:
-                        row = {
-                            'date': date_val,
-                            'Free Inflow': 0,
-                            'Paid Inflow': 0,
-                            'Free Share %': 0,
-                            'Paid Share %': 0,
-                            dimension: dim_val
-                        }
-                        daily_data.append(row)
-        else:
-            for date_val in all_dates:
-                if date_val not in existing_dates:
-                    row = {
-                        'date': date_val,
-                        'Free Inflow': 0,
-                        'Paid Inflow': 0,
-                        'Free Share %': 0,
-                        'Paid Share %': 0
-                    }
-                    daily_data.append(row)
-        
-        chart_df = pd.DataFrame(daily_data)
-    
-    chart_df = chart_df.sort_values('date')
+    chart_df = views.free_vs_paid_series(df, dimension, date_range)
     
     if dimension:
         unique_values = sorted(chart_df[dimension].dropna().unique())
         n_rows = len(unique_values)
         
-        fig = make_subplots(
+        fig = plotly_subplots.make_subplots(
             rows=n_rows, cols=1,
             subplot_titles=[f"{dimension}: {val}" for val in unique_values],
             vertical_spacing=0.1
@@ -1078,6 +778,7 @@ def create_free_vs_paid_inflow_chart(df, dimension=None, date_range=None):
         fig.update_xaxes(title_text="Date", row=n_rows, col=1)
         fig.update_yaxes(title_text="Share (%)", row=n_rows, col=1, range=[0, 100])
     else:
+        unique_values = []
         fig = go.Figure()
         
         fig.add_trace(go.Bar(
@@ -1107,6 +808,11 @@ def create_free_vs_paid_inflow_chart(df, dimension=None, date_range=None):
         fig.update_xaxes(title_text="Date")
         fig.update_yaxes(title_text="Share (%)", range=[0, 100])
     
+    if comparison_df is not None:
+        # Free share line: the paid share is its complement
+        comparison = views.free_vs_paid_series(comparison_df, dimension, date_range, unique_values)
+        add_comparison_traces(fig, comparison, dimension, unique_values, 'Free Share %', 'Free Share %', 'black')
+    
     fig.update_layout(
         title="Daily Free vs Paid Inflow",
         height=600 if not dimension else 200 * n_rows,
@@ -1116,123 +822,21 @@ def create_free_vs_paid_inflow_chart(df, dimension=None, date_range=None):
     
     return fig
 
-def create_free_share_by_source_chart(df, dimension=None, date_range=None):
+def create_free_share_by_source_chart(df, dimension=None, date_range=None, comparison_df=None):
     """Create stacked bar chart showing Free Inflow share by source"""
     if len(df) == 0:
         return None
     
-    # Define free inflow sources (all inflow sources EXCEPT paid ones)
-    # Based on SQL: total_free_inflow excludes rewards_store, rewards_rolling_offer_collect, rewards_disco
-    free_sources = [
-        'rewards_race', 'rewards_board_task', 'rewards_harvest_collect',
-        'rewards_missions_total', 'rewards_recipes', 'rewards_flowers',
-        'rewards_rewarded_video', 'rewards_timed_task', 'rewards_sell_board_item',
-        'rewards_mass_compensation', 'rewards_missions_task', 'rewards_album_set_completion',
-        'rewards_self_collectable', 'rewards_eoc', 'rewards_frenzy_non_jackpot'
-    ]
-    
-    # Aggregate by date (and dimension if provided)
-    if dimension:
-        group_cols = ['date', dimension]
-    else:
-        group_cols = ['date']
-    
-    daily_data = []
-    for date_group, group_df in df.groupby(group_cols):
-        if dimension:
-            date_val, dim_val = date_group
-        else:
-            date_val = date_group
-            dim_val = None
-        
-        # Ensure date_val is a proper date object
-        if isinstance(date_val, tuple):
-            date_val = date_val[0]
-        if isinstance(date_val, pd.Timestamp):
-            date_val = date_val.date()
-        
-        # Extract free inflow values from source columns
-        for source in free_sources:
-            col_name = f'{source}_inflow_sum_value'
-            if col_name in group_df.columns:
-                free_inflow = group_df[col_name].sum()
-                if free_inflow > 0:  # Only include sources with data
-                    row = {
-                        'date': date_val,
-                        'source': source,
-                        'Free Inflow': free_inflow
-                    }
-                    if dimension:
-                        row[dimension] = dim_val
-                    daily_data.append(row)
-    
-    chart_df = pd.DataFrame(daily_data)
-    
-    # Fill in missing dates in the selected range (for each source)
-    if date_range:
-        date_min, date_max = date_range
-        if isinstance(date_min, tuple):
-            date_min = date_min[0]
-        if isinstance(date_max, tuple):
-            date_max = date_max[0]
-        if isinstance(date_min, pd.Timestamp):
-            date_min = date_min.date()
-        if isinstance(date_max, pd.Timestamp):
-            date_max = date_max.date()
-        
-        all_dates = pd.date_range(start=date_min, end=date_max, freq='D').date.tolist()
-        sources = sorted(chart_df['source'].unique()) if len(chart_df) > 0 else []
-        
-        if dimension:
-            unique_dim_values = chart_df[dimension].dropna().unique() if len(chart_df) > 0 else []
-            for date_val in all_dates:
-                for source_val in sources:
-                    for dim_val in unique_dim_values:
-                        if len(chart_df[(chart_df['date'] == date_val) & (chart_df['source'] == source_val) & (chart_df[dimension] == dim_val)]) == 0:
-                            row = {
-                                'date': date_val,
-                                'source': source_val,
-                                'Free Inflow': 0,
-                                dimension: dim_val
-                            }
-                            daily_data.append(row)
-        else:
-            for date_val in all_dates:
-                for source_val in sources:
-                    if len(chart_df[(chart_df['date'] == date_val) & (chart_df['source'] == source_val)]) == 0:
-                        row = {
-                            'date': date_val,
-                            'source': source_val,
-                            'Free Inflow': 0
-                        }
-                        daily_data.append(row)
-        
-        chart_df = pd.DataFrame(daily_data)
-    
-    chart_df = chart_df.sort_values('date')
-    
-    # Calculate shares per date
-    if dimension:
-        for dim_val in chart_df[dimension].unique():
-            for date_val in chart_df[chart_df[dimension] == dim_val]['date'].unique():
-                subset = chart_df[(chart_df['date'] == date_val) & (chart_df[dimension] == dim_val)]
-                total = subset['Free Inflow'].sum()
-                chart_df.loc[(chart_df['date'] == date_val) & (chart_df[dimension] == dim_val), 'Share'] = (
-                    chart_df.loc[(chart_df['date'] == date_val) & (chart_df[dimension] == dim_val), 'Free Inflow'] / total * 100
-                ) if total > 0 else 0
-    else:
-        for date_val in chart_df['date'].unique():
-            subset = chart_df[chart_df['date'] == date_val]
-            total = subset['Free Inflow'].sum()
-            chart_df.loc[chart_df['date'] == date_val, 'Share'] = (
-                chart_df.loc[chart_df['date'] == date_val, 'Free Inflow'] / total * 100
-            ) if total > 0 else 0
+    # Share of each free inflow source (paid sources excluded, as in total_free_inflow)
+    chart_df = views.free_share_by_source_series(df, dimension, date_range)
+    if len(chart_df) == 0:
+        return None
     
     if dimension:
         unique_values = sorted(chart_df[dimension].dropna().unique())
         n_rows = len(unique_values)
         
-        fig = make_subplots(
+        fig = plotly_subplots.make_subplots(
             rows=n_rows, cols=1,
             subplot_titles=[f"{dimension}: {val}" for val in unique_values],
             vertical_spacing=0.1
@@ -1266,6 +870,7 @@ def create_free_share_by_source_chart(df, dimension=None, date_range=None):
         fig.update_xaxes(title_text="Date", row=n_rows, col=1)
         fig.update_yaxes(title_text="Share (%)", row=n_rows, col=1)
     else:
+        unique_values = []
         sources = sorted(chart_df['source'].unique())
         colors = px.colors.qualitative.Set3[:len(sources)]
         
@@ -1289,6 +894,12 @@ def create_free_share_by_source_chart(df, dimension=None, date_range=None):
         fig.update_xaxes(title_text="Date")
         fig.update_yaxes(title_text="Share (%)")
     
+    if comparison_df is not None:
+        comparison = views.free_share_by_source_series(comparison_df, dimension, date_range, unique_values, sources)
+        for j, source_val in enumerate(sources):
+            add_comparison_traces(fig, comparison[comparison['source'] == source_val], dimension, unique_values,
+                                  'Share', source_val, colors[j % len(colors)], legendgroup=source_val)
+    
     fig.update_layout(
         title="Daily Free Share by Source",
         height=600 if not dimension else 200 * n_rows,
@@ -1298,113 +909,21 @@ def create_free_share_by_source_chart(df, dimension=None, date_range=None):
     
     return fig
 
-def create_rtp_by_source_chart(df, dimension=None, date_range=None):
+def create_rtp_by_source_chart(df, dimension=None, date_range=None, comparison_df=None):
     """Create line chart showing RTP by source (Free Inflow / Outflow)"""
     if len(df) == 0:
         return None
     
-    # Define free inflow sources (all inflow sources EXCEPT paid ones)
-    free_sources = [
-        'rewards_race', 'rewards_board_task', 'rewards_harvest_collect',
-        'rewards_missions_total', 'rewards_recipes', 'rewards_flowers',
-        'rewards_rewarded_video', 'rewards_timed_task', 'rewards_sell_board_item',
-        'rewards_mass_compensation', 'rewards_missions_task', 'rewards_album_set_completion',
-        'rewards_self_collectable', 'rewards_eoc', 'rewards_frenzy_non_jackpot'
-    ]
-    
-    # Aggregate by date (and dimension if provided)
-    if dimension:
-        group_cols = ['date', dimension]
-    else:
-        group_cols = ['date']
-    
-    daily_data = []
-    for date_group, group_df in df.groupby(group_cols):
-        if dimension:
-            date_val, dim_val = date_group
-        else:
-            date_val = date_group
-            dim_val = None
-        
-        # Ensure date_val is a proper date object
-        if isinstance(date_val, tuple):
-            date_val = date_val[0]
-        if isinstance(date_val, pd.Timestamp):
-            date_val = date_val.date()
-        
-        # Get total outflow for this date/dimension combination
-        total_outflow = abs(group_df['total_outflow'].sum())  # Make positive
-        
-        # Calculate RTP for each free source
-        for source in free_sources:
-            col_name = f'{source}_inflow_sum_value'
-            if col_name in group_df.columns:
-                free_inflow = group_df[col_name].sum()
-                
-                # Calculate RTP
-                rtp = (free_inflow / total_outflow * 100) if total_outflow > 0 else 0
-                
-                if free_inflow > 0 or total_outflow > 0:  # Include if there's data
-                    row = {
-                        'date': date_val,
-                        'source': source,
-                        'RTP': rtp
-                    }
-                    if dimension:
-                        row[dimension] = dim_val
-                    
-                    daily_data.append(row)
-    
-    chart_df = pd.DataFrame(daily_data)
-    
-    # Fill in missing dates in the selected range (for each source)
-    if date_range:
-        date_min, date_max = date_range
-        if isinstance(date_min, tuple):
-            date_min = date_min[0]
-        if isinstance(date_max, tuple):
-            date_max = date_max[0]
-        if isinstance(date_min, pd.Timestamp):
-            date_min = date_min.date()
-        if isinstance(date_max, pd.Timestamp):
-            date_max = date_max.date()
-        
-        all_dates = pd.date_range(start=date_min, end=date_max, freq='D').date.tolist()
-        sources = sorted(chart_df['source'].unique()) if len(chart_df) > 0 else free_sources
-        
-        if dimension:
-            unique_dim_values = chart_df[dimension].dropna().unique() if len(chart_df) > 0 else []
-            for date_val in all_dates:
-                for source_val in sources:
-                    for dim_val in unique_dim_values:
-                        if len(chart_df[(chart_df['date'] == date_val) & (chart_df['source'] == source_val) & (chart_df[dimension] == dim_val)]) == 0:
-                            row = {
-                                'date': date_val,
-                                'source': source_val,
-                                'RTP': 0,
-                                dimension: dim_val
-                            }
-                            daily_data.append(row)
-        else:
-            for date_val in all_dates:
-                for source_val in sources:
-                    if len(chart_df[(chart_df['date'] == date_val) & (chart_df['source'] == source_val)]) == 0:
-                        row = {
-                            'date': date_val,
-                            'source': source_val,
-                            'RTP': 0
-                        }
-                        daily_data.append(row)
-        
-        chart_df = pd.DataFrame(daily_data)
-    
-    chart_df = chart_df.sort_values('date')
+    # RTP of each free inflow source (Free Inflow / Outflow)
+    chart_df = views.rtp_by_source_series(df, dimension, date_range)
+    if len(chart_df) == 0:
+        return None
     
     if dimension:
         unique_values = sorted(chart_df[dimension].dropna().unique())
         n_rows = len(unique_values)
         
-        fig = make_subplots(
+        fig = plotly_subplots.make_subplots(
             rows=n_rows, cols=1,
             subplot_titles=[f"{dimension}: {val}" for val in unique_values],
             vertical_spacing=0.1
@@ -1435,6 +954,7 @@ def create_rtp_by_source_chart(df, dimension=None, date_range=None):
         fig.update_xaxes(title_text="Date", row=n_rows, col=1)
         fig.update_yaxes(title_text="RTP (%)", row=n_rows, col=1)
     else:
+        unique_values = []
         sources = sorted(chart_df['source'].unique())
         colors = px.colors.qualitative.Set1[:len(sources)]
         
@@ -1455,6 +975,12 @@ def create_rtp_by_source_chart(df, dimension=None, date_range=None):
         fig.update_xaxes(title_text="Date")
         fig.update_yaxes(title_text="RTP (%)")
     
+    if comparison_df is not None:
+        comparison = views.rtp_by_source_series(comparison_df, dimension, date_range, unique_values, sources)
+        for j, source_val in enumerate(sources):
+            add_comparison_traces(fig, comparison[comparison['source'] == source_val], dimension, unique_values,
+                                  'RTP', source_val, colors[j % len(colors)], legendgroup=source_val)
+    
     fig.update_layout(
         title="Daily RTP by Source",
         height=600 if not dimension else 200 * n_rows,
@@ -1463,6 +989,353 @@ def create_rtp_by_source_chart(df, dimension=None, date_range=None):
     
     return fig
 
+# Split options of the dimension selector (label -> column)
+DIMENSION_OPTIONS = {
+    'None': None,
+    'First Chapter of Day': 'first_chapter_bucket',
+    'Is US Player': 'is_us_player',
+    'Last Balance of Day': 'last_balance_bucket',
+    'Last Version of Day': 'last_version_of_day',
+    'Paid Ever Flag': 'paid_ever_flag',
+    'Paid Today Flag': 'paid_today_flag'
+}
+
+# Smoothing options -> trailing window in days
+SMOOTHING_OPTIONS = {
+    'Daily': 1,
+    '7-day rolling average': 7,
+    '28-day rolling average': 28
+}
+
+# Comparison overlay options -> comparison period (see comparison_shift)
+COMPARISON_OPTIONS = {
+    'None': None,
+    'Previous period': 'previous',
+    'Same days last week': 'week',
+    'Same days last month': 'month'
+}
+
+def comparison_shift(option, date_range):
+    """Offset from each shown day to its comparison day (None = no comparison)"""
+    if option == 'previous':
+        # The N days right before an N-day range
+        return pd.DateOffset(days=(date_range[1] - date_range[0]).days + 1)
+    if option == 'week':
+        return pd.DateOffset(days=7)
+    if option == 'month':
+        return pd.DateOffset(months=1)
+    return None
+
+# Points per trace sent to the browser: about the chart's width in pixels, more cannot be told apart
+CHART_MAX_POINTS = int(os.environ.get('DASHBOARD_CHART_MAX_POINTS', 1200))
+
+# View name (views.VIEWS) -> chart function
+CHART_FUNCTIONS = {
+    'consumption': create_consumption_trend_chart,
+    'credits_components': create_credits_components_chart,
+    'free_vs_paid': create_free_vs_paid_inflow_chart,
+    'free_share_by_source': create_free_share_by_source_chart,
+    'rtp_by_source': create_rtp_by_source_chart,
+}
+
+# ============================================================================
+# TWO-DIMENSION PIVOT
+# ============================================================================
+
+MAX_SMALL_MULTIPLES = 36    # Panels in the small-multiples grid; larger pivots use the heatmap
+
+def create_pivot_heatmap(matrix, metric, row_label, column_label):
+    """Heatmap of a metric over two dimensions (totals over the selected range)"""
+    if matrix.empty:
+        return None
+    fig = go.Figure(go.Heatmap(
+        z=matrix.values,
+        x=[str(v) for v in matrix.columns],
+        y=[str(v) for v in matrix.index],
+        colorscale='Blues',
+        colorbar=dict(title=metric),
+        texttemplate='%{z:.1f}',
+        hovertemplate=f'{row_label}: %{{y}}<br>{column_label}: %{{x}}<br>{metric}: %{{z:.2f}}<extra></extra>'
+    ))
+    fig.update_xaxes(title_text=column_label, type='category')
+    fig.update_yaxes(title_text=row_label, type='category', autorange='reversed')
+    fig.update_layout(
+        title=f"{metric} by {row_label} x {column_label}",
+        height=max(400, 35 * len(matrix.index) + 200)
+    )
+    return fig
+
+def create_pivot_small_multiples(series, metric, row_dimension, column_dimension, row_label, column_label):
+    """Grid of daily metric lines, one panel per (row value, column value) combination"""
+    if len(series) == 0:
+        return None
+    n_rows = series[row_dimension].nunique()
+    fig = px.line(
+        series.sort_values('date'), x='date', y=metric,
+        facet_row=row_dimension, facet_col=column_dimension,
+        category_orders={
+            row_dimension: sorted(series[row_dimension].dropna().unique()),
+            column_dimension: sorted(series[column_dimension].dropna().unique())
+        },
+        labels={row_dimension: row_label, column_dimension: column_label}
+    )
+    fig.update_traces(line=dict(color='darkblue', width=2))
+    fig.update_layout(title=f"Daily {metric} by {row_label} x {column_label}", height=max(400, 180 * n_rows))
+    # Each panel is a fraction of the chart width
+    return downsample.downsample_figure(fig, CHART_MAX_POINTS // series[column_dimension].nunique())
+
+def render_pivot_view(dataset, rows, row_dimension, column_dimension):
+    """Two-dimension pivot section: one grouped reduction over the combined codes, then a heatmap or grid"""
+    labels = {column: label for label, column in DIMENSION_OPTIONS.items()}
+    row_label, column_label = labels[row_dimension], labels[column_dimension]
+
+    st.header(f"Pivot: {row_label} x {column_label}")
+    metric_col, display_col = st.columns(2)
+    metric = metric_col.radio("Metric", options=list(views.PIVOT_METRICS.keys()), horizontal=True, key='pivot_metric')
+    display = display_col.radio("Display", options=['Heatmap', 'Small multiples'], horizontal=True, key='pivot_display')
+
+    if display == 'Heatmap':
+        sums = dataset.pivot(rows, row_dimension, column_dimension, views.TOTAL_COLUMNS)
+        st.markdown(f"**{metric}** over the whole selected range for each combination (blank = no data)")
+        fig = create_pivot_heatmap(views.pivot_matrix(sums, row_dimension, column_dimension, metric),
+                                   metric, row_label, column_label)
+    else:
+        n_panels = len(dataset.values[row_dimension]) * len(dataset.values[column_dimension])
+        if n_panels > MAX_SMALL_MULTIPLES:
+            st.info(f"{n_panels} combinations are too many panels for a grid (max {MAX_SMALL_MULTIPLES}); use the heatmap.")
+            return
+        sums = dataset.pivot(rows, row_dimension, column_dimension, views.TOTAL_COLUMNS, by_date=True)
+        st.markdown(f"Daily **{metric}** per combination (daily values, smoothing not applied)")
+        fig = create_pivot_small_multiples(views.pivot_series(sums, row_dimension, column_dimension, metric, by_date=True),
+                                           metric, row_dimension, column_dimension, row_label, column_label)
+    if fig:
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("No data available for the selected filters.")
+
+# ============================================================================
+# PLAYER DRILLDOWN
+# ============================================================================
+
+PLAYER_TABLE = "yotam-395120.peerplay.fact_consumption_daily_new_ver_temp"
+DRILLDOWN_ROW_LIMIT = 50
+DRILLDOWN_MAX_BYTES = int(os.environ.get('DRILLDOWN_MAX_BYTES', 2 * 10**9))  # Cost cap per drilldown query
+PAID_SOURCES = ['rewards_store', 'rewards_rolling_offer_collect', 'rewards_disco']
+
+# Sidebar filter key -> aggregated table column
+FILTER_COLUMNS = {
+    'first_chapter_of_day': 'first_chapter_bucket',
+    'is_us_player': 'is_us_player',
+    'last_balance_of_day': 'last_balance_bucket',
+    'last_version_of_day': 'last_version_of_day',
+    'paid_ever_flag': 'paid_ever_flag',
+    'paid_today_flag': 'paid_today_flag'
+}
+
+# Aggregated table column -> (player-grain column, bucket definitions or None for exact match)
+DRILLDOWN_COLUMNS = {
+    'first_chapter_bucket': ('first_chapter_of_day', FIRST_CHAPTER_BUCKETS),
+    'last_balance_bucket': ('last_balance_of_day', LAST_BALANCE_BUCKETS),
+    'is_us_player': ('is_us_player', None),
+    'last_version_of_day': ('last_version_of_day', None),
+    'paid_ever_flag': ('paid_ever_flag', None),
+    'paid_today_flag': ('paid_today_flag', None)
+}
+
+def build_drilldown_query(cell_date, cell_filters, limit):
+    """Parameterized, partition-pruned query for one date / bucket cell of the player-grain table"""
+    from google.cloud.bigquery import ScalarQueryParameter, ArrayQueryParameter
+    
+    conditions = ["date = @cell_date"]  # Single partition
+    params = [
+        ScalarQueryParameter('cell_date', 'DATE', cell_date),
+        ScalarQueryParameter('row_limit', 'INT64', limit),
+        ArrayQueryParameter('paid_sources', 'STRING', PAID_SOURCES)
+    ]
+    
+    for i, (dimension, values) in enumerate(cell_filters):
+        column, buckets = DRILLDOWN_COLUMNS[dimension]
+        if buckets:
+            # Bucket labels -> value ranges on the raw player-level column
+            ranges = []
+            for j, label in enumerate(values):
+                bucket_index = next(k for k, bucket in enumerate(buckets) if bucket[2] == label)
+                min_val, max_val, _ = buckets[bucket_index]
+                params.append(ScalarQueryParameter(f'p{i}_{j}_min', 'INT64', int(min_val)))
+                if bucket_index == len(buckets) - 1:
+                    # Last bucket is the SQL CASE ELSE branch (also catches NULL / negative values)
+                    params.append(ScalarQueryParameter(f'p{i}_{j}_first', 'INT64', int(buckets[0][0])))
+                    ranges.append(f"({column} IS NULL OR {column} < @p{i}_{j}_first OR {column} >= @p{i}_{j}_min)")
+                else:
+                    params.append(ScalarQueryParameter(f'p{i}_{j}_max', 'INT64', int(max_val)))
+                    ranges.append(f"({column} >= @p{i}_{j}_min AND {column} < @p{i}_{j}_max)")
+            conditions.append("(" + " OR ".join(ranges) + ")")
+        else:
+            param_type = 'FLOAT64' if dimension == 'last_version_of_day' else 'INT64'
+            cast = float if param_type == 'FLOAT64' else int
+            params.append(ArrayQueryParameter(f'p{i}', param_type, [cast(v) for v in values]))
+            conditions.append(f"{column} IN UNNEST(@p{i})")
+    
+    where_clause = "\n          AND ".join(conditions)
+    query = f"""
+    WITH player_totals AS (
+        SELECT
+            distinct_id,
+            SUM(IF(inflow_outflow = 'outflow', sum_value, 0)) AS outflow,
+            SUM(IF(inflow_outflow = 'inflow' AND source NOT IN UNNEST(@paid_sources), sum_value, 0)) AS free_inflow,
+            SUM(IF(inflow_outflow = 'inflow' AND source IN UNNEST(@paid_sources), sum_value, 0)) AS paid_inflow,
+            ANY_VALUE(first_chapter_of_day) AS first_chapter_of_day,
+            ANY_VALUE(last_balance_of_day) AS last_balance_of_day
+        FROM `{PLAYER_TABLE}`
+        WHERE {where_clause}
+        GROUP BY distinct_id
+    )
+    SELECT
+        COUNT(*) AS players,
+        SUM(outflow) AS total_outflow,
+        SUM(free_inflow) AS total_free_inflow,
+        APPROX_QUANTILES(outflow, 20) AS outflow_quantiles,
+        APPROX_QUANTILES(SAFE_DIVIDE(free_inflow, ABS(outflow)) * 100, 20 IGNORE NULLS) AS rtp_quantiles,
+        ARRAY_AGG(
+            STRUCT(distinct_id, outflow, free_inflow, paid_inflow, first_chapter_of_day, last_balance_of_day)
+            ORDER BY outflow DESC LIMIT @row_limit
+        ) AS top_players
+    FROM player_totals
+    """
+    return query, params
+
+@st.cache_data(ttl=3600, show_spinner="Loading player drilldown...")  # Cached per cell
+def load_player_drilldown(_client, cell_date, cell_filters, limit=DRILLDOWN_ROW_LIMIT):
+    """Top players and outflow / RTP distribution for one date and bucket cell"""
+    from google.cloud.bigquery import QueryJobConfig
+    
+    query, params = build_drilldown_query(cell_date, cell_filters, limit)
+    
+    # Dry run first so an expensive cell is refused instead of billed
+    dry_run_job = _client.query(query, job_config=QueryJobConfig(
+        dry_run=True, use_query_cache=False, query_parameters=params
+    ))
+    bytes_estimated = dry_run_job.total_bytes_processed or 0
+    if bytes_estimated > DRILLDOWN_MAX_BYTES:
+        return {
+            'error': f"Drilldown would scan {bytes_estimated / 1e9:.2f} GB "
+                     f"(cap {DRILLDOWN_MAX_BYTES / 1e9:.2f} GB). Narrow the cell with filters.",
+            'bytes_estimated': bytes_estimated
+        }
+    
+    job_config = QueryJobConfig(
+        use_query_cache=True,
+        use_legacy_sql=False,
+        maximum_bytes_billed=DRILLDOWN_MAX_BYTES,
+        query_parameters=params
+    )
+    start = time.perf_counter()
+    job = _client.query(query, job_config=job_config)
+    row = list(job.result())[0]
+    query_telemetry.record('drilldown', job, job_config, 1, time.perf_counter() - start, 0.0)
+    top_players = pd.DataFrame([dict(player) for player in (row['top_players'] or [])])
+    return {
+        'error': None,
+        'players': row['players'] or 0,
+        'total_outflow': row['total_outflow'] or 0,
+        'total_free_inflow': row['total_free_inflow'] or 0,
+        'outflow_quantiles': list(row['outflow_quantiles'] or []),
+        'rtp_quantiles': list(row['rtp_quantiles'] or []),
+        'top_players': top_players,
+        'bytes_estimated': bytes_estimated,
+        'bytes_processed': job.total_bytes_processed or 0
+    }
+
+def get_drilldown_cell_filters(filters, dimension=None, dimension_value=None):
+    """Hashable cell definition: applied sidebar filters plus the clicked split value"""
+    cell = {}
+    for filter_key, column in FILTER_COLUMNS.items():
+        if filters.get(filter_key):
+            cell[column] = tuple(sorted(v.item() if hasattr(v, 'item') else v for v in filters[filter_key]))
+    if dimension and dimension_value is not None:
+        value = dimension_value.item() if hasattr(dimension_value, 'item') else dimension_value
+        cell[dimension] = (value,)
+    return tuple(sorted(cell.items()))
+
+def render_player_drilldown(client, filters, dimension, dimension_values, chart_date_range):
+    """Player-level drilldown for one date / bucket cell (queried on demand, never at startup)"""
+    st.header("Player Drilldown")
+    st.markdown("**Click a point in Daily Consumption** or pick a cell below to load the top players for that day")
+    
+    if not chart_date_range:
+        return
+    min_date, max_date = chart_date_range
+    clicked = st.session_state.get('drilldown_cell') or {}
+    
+    options = list(dimension_values) if dimension else []
+    
+    # A clicked chart point moves the cell pickers to that cell
+    if clicked.get('pending'):
+        if min_date <= clicked['date'] <= max_date:
+            st.session_state.drilldown_date = clicked['date']
+        if dimension and clicked.get('value') in options:
+            st.session_state.drilldown_dimension_value = clicked['value']
+    if not st.session_state.get('drilldown_date') or not (min_date <= st.session_state.drilldown_date <= max_date):
+        st.session_state.drilldown_date = max_date
+    
+    cols = st.columns(3 if dimension else 2)
+    cell_date = cols[0].date_input("Date", min_value=min_date, max_value=max_date, key='drilldown_date')
+    dimension_value = None
+    if dimension and options:
+        if st.session_state.get('drilldown_dimension_value') not in options:
+            st.session_state.drilldown_dimension_value = options[0]
+        dimension_value = cols[1].selectbox(dimension, options=options, key='drilldown_dimension_value')
+    
+    if cols[-1].button("🔍 Drill down", key='drilldown_button') or clicked.get('pending'):
+        st.session_state.drilldown_request = (cell_date, get_drilldown_cell_filters(filters, dimension, dimension_value))
+        if clicked:
+            clicked['pending'] = False
+    
+    request = st.session_state.get('drilldown_request')
+    if not request:
+        return
+    
+    request_date, cell_filters = request
+    try:
+        result = load_player_drilldown(client, request_date, cell_filters)
+    except Exception as e:
+        st.error(f"❌ Drilldown failed: {e}")
+        return
+    
+    cell_label = ", ".join(f"{column} in {list(values)}" for column, values in cell_filters) or "all players"
+    st.caption(f"📅 {request_date} | {cell_label}")
+    if result['error']:
+        st.warning(result['error'])
+        return
+    
+    metric_cols = st.columns(3)
+    metric_cols[0].metric("Players", f"{result['players']:,}")
+    metric_cols[1].metric("Total Outflow", f"{result['total_outflow']:,.0f}")
+    metric_cols[2].metric("Outflow per Player", f"{result['total_outflow'] / result['players']:,.1f}" if result['players'] else "0")
+    
+    distributions = [
+        (result['outflow_quantiles'], "Outflow Distribution", "Outflow (credits)", 'orange'),
+        (result['rtp_quantiles'], "RTP Distribution (players with outflow)", "RTP %", 'green'),
+    ]
+    distribution_cols = st.columns(2)
+    for col, (quantiles, title, y_title, color) in zip(distribution_cols, distributions):
+        if not quantiles:
+            continue
+        percentiles = np.linspace(0, 100, len(quantiles))
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=percentiles, y=quantiles, mode='lines+markers',
+                                 name=y_title, line=dict(color=color, width=2)))
+        fig.update_xaxes(title_text="Percentile of players")
+        fig.update_yaxes(title_text=y_title)
+        fig.update_layout(title=title, height=350, hovermode='x unified')
+        col.plotly_chart(fig, use_container_width=True)
+    
+    if len(result['top_players']) > 0:
+        st.markdown(f"**Top {len(result['top_players'])} players by outflow**")
+        st.dataframe(result['top_players'], use_container_width=True, hide_index=True)
+    st.caption(f"BigQuery: {result['bytes_processed'] / 1e6:,.1f} MB processed "
+               f"(cap {DRILLDOWN_MAX_BYTES / 1e9:.1f} GB)")
+
 # ============================================================================
 # MAIN DASHBOARD
 # ============================================================================
@@ -1473,6 +1346,7 @@ def main():
         return
     
     st.title("📊 Consumption Dashboard")
+    mark('authenticated')
     
     # Initialize BigQuery client
     client = init_bigquery_client()
@@ -1480,24 +1354,25 @@ def main():
         st.stop()
     
     # Load data with loading indicator and progress
+    # The dataset is loaded once per process and shared read-only by every session
     with st.spinner("Loading data from BigQuery (this may take 30-60 seconds for full dataset)..."):
         # Load all available data
         try:
-            # Clear cache to ensure we get fresh data from new table
-            load_data.clear()
-            df = load_data(client, date_limit_days=None)  # Load all data
+            dataset = get_shared_dataset(client, date_limit_days=None)  # Load all data
         except Exception as e:
             st.error(f"Error loading data: {e}")
             st.info("💡 Tip: The query might be taking too long. Try reducing the date range or check your BigQuery connection.")
             return
     
-    if len(df) == 0:
+    if dataset is None or len(dataset) == 0:
         st.warning("No data available.")
         st.info("💡 Tip: Check your BigQuery connection and table permissions.")
         return
     
+    mark('data loaded')
+    
     # Show data info
-    st.caption(f"📊 Loaded {len(df):,} rows. Use date filter to refine the view.")
+    st.caption(f"📊 Loaded {len(dataset):,} rows. Use date filter to refine the view.")
     
     # ============================================================================
     # FILTERS WITH APPLY BUTTON
@@ -1523,33 +1398,25 @@ def main():
     
     # Initialize date_range to full available range if not set
     if st.session_state.filter_applied.get('date_range') is None:
-        if 'date' in df.columns and len(df) > 0:
-            min_date = df['date'].min()
-            max_date = df['date'].max()
+        if len(dataset) > 0:
+            min_date = dataset.min_date
+            max_date = dataset.max_date
             st.session_state.filter_applied['date_range'] = (min_date, max_date)
             st.session_state.filter_temp['date_range'] = (min_date, max_date)
     
     # Prepare filter options
     # Get date range from loaded data for the slider
-    if 'date' in df.columns and len(df) > 0:
-        min_date = df['date'].min()
-        max_date = df['date'].max()
+    if len(dataset) > 0:
+        min_date = dataset.min_date
+        max_date = dataset.max_date
         date_range = (min_date, max_date)
     else:
         date_range = (None, None)
     
     # Query actual min/max dates from table for slider range (lightweight query)
     try:
-        range_query = f"""
-        SELECT 
-            MIN(date) as min_date,
-            MAX(date) as max_date
-        FROM `{FULL_TABLE}`
-        """
-        range_df = client.query(range_query).to_dataframe()
-        if len(range_df) > 0 and pd.notna(range_df['min_date'].iloc[0]) and pd.notna(range_df['max_date'].iloc[0]):
-            actual_min_date = pd.to_datetime(range_df['min_date'].iloc[0]).date()
-            actual_max_date = pd.to_datetime(range_df['max_date'].iloc[0]).date()
+        actual_min_date, actual_max_date = get_table_date_range(client)
+        if actual_min_date is not None:
             # Use actual range for slider, but keep loaded data range as default
             if date_range[0] is None:
                 date_range = (actual_min_date, actual_max_date)
@@ -1601,7 +1468,7 @@ def main():
         st.sidebar.caption(f"From: {selected_start_date} to {selected_end_date}")
     
     # First chapter filter
-    chapter_options = sorted(df['first_chapter_bucket'].dropna().unique())
+    chapter_options = dataset.dimension_values('first_chapter_bucket')
     selected_chapter = st.sidebar.multiselect(
         "First Chapter of Day",
         options=chapter_options,
@@ -1610,7 +1477,7 @@ def main():
     st.session_state.filter_temp['first_chapter_of_day'] = selected_chapter
     
     # Is US Player filter
-    us_player_options = sorted(df['is_us_player'].dropna().unique())
+    us_player_options = dataset.dimension_values('is_us_player')
     selected_us_player = st.sidebar.multiselect(
         "Is US Player",
         options=us_player_options,
@@ -1619,7 +1486,7 @@ def main():
     st.session_state.filter_temp['is_us_player'] = selected_us_player
     
     # Last balance filter
-    balance_options = sorted(df['last_balance_bucket'].dropna().unique())
+    balance_options = dataset.dimension_values('last_balance_bucket')
     selected_balance = st.sidebar.multiselect(
         "Last Balance of Day",
         options=balance_options,
@@ -1628,7 +1495,7 @@ def main():
     st.session_state.filter_temp['last_balance_of_day'] = selected_balance
     
     # Last version filter
-    version_options = sorted(df['last_version_of_day'].dropna().unique())
+    version_options = dataset.dimension_values('last_version_of_day')
     selected_version = st.sidebar.multiselect(
         "Last Version of Day",
         options=version_options,
@@ -1637,7 +1504,7 @@ def main():
     st.session_state.filter_temp['last_version_of_day'] = selected_version
     
     # Paid ever flag filter
-    paid_ever_options = sorted(df['paid_ever_flag'].dropna().unique())
+    paid_ever_options = dataset.dimension_values('paid_ever_flag')
     selected_paid_ever = st.sidebar.multiselect(
         "Paid Ever Flag",
         options=paid_ever_options,
@@ -1646,7 +1513,7 @@ def main():
     st.session_state.filter_temp['paid_ever_flag'] = selected_paid_ever
     
     # Paid today flag filter
-    paid_today_options = sorted(df['paid_today_flag'].dropna().unique())
+    paid_today_options = dataset.dimension_values('paid_today_flag')
     selected_paid_today = st.sidebar.multiselect(
         "Paid Today Flag",
         options=paid_today_options,
@@ -1667,43 +1534,13 @@ def main():
     if filters.get('date_range'):
         date_min, date_max = filters['date_range']
         # Check if the requested range is outside loaded data
-        if len(df) > 0:
-            loaded_min = df['date'].min()
-            loaded_max = df['date'].max()
-            if date_min < loaded_min or date_max > loaded_max:
-                # Need to reload with expanded range
-                # Calculate days needed from today
-                from datetime import date
-                today = date.today()
-                days_needed = (today - date_min).days + 1
-                with st.spinner(f"Loading data for selected date range ({date_min} to {date_max})..."):
-                    # Clear cache and reload
-                    load_data.clear()
-                    df = load_data(client, date_limit_days=days_needed)
-    
-    filtered_df = df.copy()
-    
-    # Apply date range filter
-    # If no date range is set, show all available data
-    if filters.get('date_range'):
-        date_min, date_max = filters['date_range']
-        filtered_df = filtered_df[
-            (filtered_df['date'] >= date_min) & 
-            (filtered_df['date'] <= date_max)
-        ]
-    # If no date range filter is applied, show all loaded data (no filtering)
-    if filters.get('first_chapter_of_day'):
-        filtered_df = filtered_df[filtered_df['first_chapter_bucket'].isin(filters['first_chapter_of_day'])]
-    if filters.get('is_us_player'):
-        filtered_df = filtered_df[filtered_df['is_us_player'].isin(filters['is_us_player'])]
-    if filters.get('last_balance_of_day'):
-        filtered_df = filtered_df[filtered_df['last_balance_bucket'].isin(filters['last_balance_of_day'])]
-    if filters.get('last_version_of_day'):
-        filtered_df = filtered_df[filtered_df['last_version_of_day'].isin(filters['last_version_of_day'])]
-    if filters.get('paid_ever_flag'):
-        filtered_df = filtered_df[filtered_df['paid_ever_flag'].isin(filters['paid_ever_flag'])]
-    if filters.get('paid_today_flag'):
-        filtered_df = filtered_df[filtered_df['paid_today_flag'].isin(filters['paid_today_flag'])]
+        if len(dataset) > 0:
+            loaded_min = dataset.min_date
+            # Later days arrive with the periodic refresh; earlier ones may have been dropped by retention
+            if date_min < loaded_min and get_date_store().backfill_range(date_min):
+                # Fetch only the missing days and merge them into the resident data
+                with st.spinner(f"Loading data for selected date range ({date_min} to {loaded_min})..."):
+                    dataset = extend_shared_dataset(client, date_min)
     
     # ============================================================================
     # DIMENSION SELECTOR
@@ -1711,22 +1548,91 @@ def main():
     
     st.sidebar.header("Dimension Selector")
     
-    dimension_options = {
-        'None': None,
-        'First Chapter of Day': 'first_chapter_bucket',
-        'Is US Player': 'is_us_player',
-        'Last Balance of Day': 'last_balance_bucket',
-        'Last Version of Day': 'last_version_of_day',
-        'Paid Ever Flag': 'paid_ever_flag',
-        'Paid Today Flag': 'paid_today_flag'
-    }
-    
     selected_dimension_label = st.sidebar.selectbox(
         "Split by Dimension",
-        options=list(dimension_options.keys()),
+        options=list(DIMENSION_OPTIONS.keys()),
         index=0
     )
-    selected_dimension = dimension_options[selected_dimension_label]
+    selected_dimension = DIMENSION_OPTIONS[selected_dimension_label]
+    
+    pivot_dimension_label = st.sidebar.selectbox(
+        "Pivot Against",
+        options=list(DIMENSION_OPTIONS.keys()),
+        index=0,
+        help="Second dimension: adds a heatmap / small-multiples view of the split dimension x this one"
+    )
+    pivot_dimension = DIMENSION_OPTIONS[pivot_dimension_label]
+    
+    selected_smoothing = st.sidebar.radio(
+        "Smoothing",
+        options=list(SMOOTHING_OPTIONS.keys()),
+        index=0,
+        help="Rolling averages of the daily sums; ratios (consumption, shares, RTP) are computed from the rolling sums"
+    )
+    rolling_days = SMOOTHING_OPTIONS[selected_smoothing]
+    
+    selected_comparison = st.sidebar.selectbox(
+        "Compare with",
+        options=list(COMPARISON_OPTIONS.keys()),
+        index=0,
+        help="Overlay a dotted comparison series on every view, aligned day by day with the selected range"
+    )
+    window = filters.get('date_range') or (dataset.min_date, dataset.max_date)
+    shift = comparison_shift(COMPARISON_OPTIONS[selected_comparison], window)
+    if shift is not None:
+        # The comparison reads resident data; days dropped by retention are fetched as a delta
+        comparison_start = (pd.Timestamp(window[0]) - shift).date() - timedelta(days=rolling_days - 1)
+        if get_date_store().backfill_range(comparison_start):
+            with st.spinner(f"Loading comparison data from {comparison_start}..."):
+                dataset = extend_shared_dataset(client, comparison_start)
+    
+    # Resolve filters to row indices into the shared dataset (no copy of the data)
+    # If no date range is set, show all available data
+    rows = dataset.select_rows(filters.get('date_range'), get_column_filters(filters))
+    
+    # Charts get the small per-date (x dimension) frame read from prefix sums along the date axis,
+    # so moving the date range or switching smoothing is two lookups per series
+    filtered_df = dataset.window_frame(
+        filters.get('date_range'), get_column_filters(filters), selected_dimension, rolling_days
+    )
+    # The comparison period is the same lookups at shifted positions of the cached cube
+    comparison_df = None
+    if shift is not None:
+        comparison_df = dataset.window_frame(
+            filters.get('date_range'), get_column_filters(filters), selected_dimension, rolling_days, shift
+        )
+    
+    cache_stats = get_dataset_cache().stats()
+    store_budget, cube_budget = memory_budget()
+    store = get_date_store()
+    requested_min = window[0] if shift is None else min(window[0], comparison_start)
+    failure = backfill_failure(requested_min)
+    if failure:
+        attempts = f"{failure['attempts']} failed attempts" if failure['attempts'] > 1 else "failed"
+        st.warning(f"⚠️ Days before {store.history_start} could not be loaded ({attempts}: {failure['error']}). "
+                   f"Retrying in {failure['retry_at'] - time.time():,.0f}s.")
+    if store.trimmed_by_budget():
+        st.sidebar.caption(f"✂️ History trimmed to {store.history_start} to fit the memory budget")
+        # Ask for earlier days than are held: say why they are missing instead of showing a shorter range
+        if requested_min < store.history_start:
+            st.warning(f"⚠️ Showing data from {store.history_start} only: earlier days do not fit the memory "
+                       f"budget ({store_budget / 1e6:,.0f} MB). Raise DASHBOARD_CACHE_BUDGET_MB to keep more history.")
+    st.sidebar.caption(
+        f"🧠 Shared dataset: {dataset.nbytes / 1e6:,.1f} MB (one copy per process) · "
+        f"this session: {(rows.nbytes + filtered_df.memory_usage(deep=True).sum()) / 1e3:,.0f} KB"
+    )
+    st.sidebar.caption(
+        f"🗄️ Memory budget: store {store.nbytes / 1e6:,.1f} / {store_budget / 1e6:,.0f} MB · "
+        f"date cubes {cache_stats['cube_bytes'] / 1e6:,.1f} / {cube_budget / 1e6:,.0f} MB · "
+        f"{cache_stats['hits']} hits / {cache_stats['misses']} loads"
+    )
+    if query_planner.history:
+        last_plan, seconds = query_planner.history[-1]
+        st.sidebar.caption(
+            f"🧮 Last load: {last_plan.name} · {last_plan.bytes_estimated / 1e9:,.2f} GB estimated · "
+            f"{seconds:,.1f}s (estimated {last_plan.seconds_estimated:,.1f}s) · "
+            f"budget {query_planner.QUERY_BUDGET_BYTES / 1e9:,.0f} GB"
+        )
     
     # ============================================================================
     # MAIN CONTENT
@@ -1777,6 +1683,30 @@ def main():
             # If we can't get dates from data, set to None
             chart_date_range = None
     
+    # Players: unique counts from merged HLL++ sketches (per-cell `players` is not additive)
+    player_kpis = calculate_player_kpis(dataset, rows, selected_dimension)
+    if player_kpis:
+        st.header("Players")
+        st.markdown(f"**Unique players** are estimated by merging HLL++ sketches "
+                    f"(standard error ±{player_kpis['relative_error']:.1%}, about ±{2 * player_kpis['relative_error']:.1%} at 95%)")
+        kpi_cols = st.columns(4)
+        kpi_cols[0].metric("Unique Players", f"{player_kpis['unique_players']:,.0f}")
+        kpi_cols[1].metric("Avg Daily Players", f"{player_kpis['avg_daily_players']:,.0f}")
+        kpi_cols[2].metric("Outflow per Player-Day", f"{player_kpis['outflow_per_player_day']:,.1f}")
+        kpi_cols[3].metric("Free Inflow per Player-Day", f"{player_kpis['free_inflow_per_player_day']:,.1f}")
+        if player_kpis['by_dimension'] is not None:
+            st.dataframe(player_kpis['by_dimension'], use_container_width=True, hide_index=True)
+
+    if rolling_days > 1:
+        st.info(f"📈 Charts show {selected_smoothing.lower()}s: each day is the average of the trailing {rolling_days} days")
+    if comparison_df is not None:
+        comparison_range = tuple((pd.Timestamp(d) - shift).date() for d in window)
+        if len(comparison_df) == 0:
+            st.warning(f"No data for the comparison period ({comparison_range[0]} to {comparison_range[1]}).")
+        else:
+            st.info(f"🔁 Dotted lines compare with {comparison_range[0]} to {comparison_range[1]} "
+                    f"({selected_comparison.lower()}), aligned day by day")
+    
     # View 1: Daily Consumption (Trend Line Only)
     st.header("Daily Consumption")
     st.markdown("**Consumption = Total Outflow / Total Inflow** (line trend)")
@@ -1787,9 +1717,25 @@ def main():
         unique_dates = sorted(filtered_df['date'].unique()) if len(filtered_df) > 0 else []
         st.caption(f"📅 Date range: {date_min} to {date_max} | 📊 Days with data: {len(unique_dates)} ({', '.join(str(d) for d in unique_dates[:5])}{'...' if len(unique_dates) > 5 else ''})")
     
-    consumption_trend_chart = create_consumption_trend_chart(filtered_df, selected_dimension, chart_date_range)
+    consumption_trend_chart = downsample.downsample_figure(
+        create_consumption_trend_chart(filtered_df, selected_dimension, chart_date_range, comparison_df), CHART_MAX_POINTS)
+    dimension_values = sorted(filtered_df[selected_dimension].dropna().unique()) if selected_dimension else []
     if consumption_trend_chart:
-        st.plotly_chart(consumption_trend_chart, use_container_width=True)
+        trend_event = st.plotly_chart(consumption_trend_chart, use_container_width=True,
+                                      on_select="rerun", selection_mode="points", key="consumption_trend_chart")
+        # A clicked point selects the date / split-value cell for the player drilldown
+        selected_points = trend_event.selection.points if trend_event and trend_event.selection else []
+        # Curves past the split values are comparison overlays, not drilldown cells
+        if selected_points and selected_points[0]['curve_number'] < max(len(dimension_values), 1):
+            point = selected_points[0]
+            clicked_cell = {
+                'date': pd.to_datetime(point['x']).date(),
+                'value': dimension_values[point['curve_number']] if selected_dimension else None,
+                'pending': True
+            }
+            previous = st.session_state.get('drilldown_cell') or {}
+            if (previous.get('date'), previous.get('value')) != (clicked_cell['date'], clicked_cell['value']):
+                st.session_state.drilldown_cell = clicked_cell
     else:
         st.info("No data available for the selected filters.")
     
@@ -1797,7 +1743,8 @@ def main():
     st.header("Credits Components")
     st.markdown("**Bars show:** Total Outflow (negative), Total Free Inflow, Total Paid Inflow")
     
-    credits_components_chart = create_credits_components_chart(filtered_df, selected_dimension, chart_date_range)
+    credits_components_chart = downsample.downsample_figure(
+        create_credits_components_chart(filtered_df, selected_dimension, chart_date_range, comparison_df), CHART_MAX_POINTS)
     if credits_components_chart:
         st.plotly_chart(credits_components_chart, use_container_width=True)
     else:
@@ -1807,7 +1754,8 @@ def main():
     st.header("Daily Free vs Paid Inflow")
     st.markdown("**Stacked bars showing share of Free Inflow vs Paid Inflow**")
     
-    free_vs_paid_chart = create_free_vs_paid_inflow_chart(filtered_df, selected_dimension, chart_date_range)
+    free_vs_paid_chart = downsample.downsample_figure(
+        create_free_vs_paid_inflow_chart(filtered_df, selected_dimension, chart_date_range, comparison_df), CHART_MAX_POINTS)
     if free_vs_paid_chart:
         st.plotly_chart(free_vs_paid_chart, use_container_width=True)
     else:
@@ -1817,7 +1765,8 @@ def main():
     st.header("Daily Free Share by Source")
     st.markdown("**Stacked bars showing share of Free Inflow by source (hover for absolute values)**")
     
-    free_share_by_source_chart = create_free_share_by_source_chart(filtered_df, selected_dimension, chart_date_range)
+    free_share_by_source_chart = downsample.downsample_figure(
+        create_free_share_by_source_chart(filtered_df, selected_dimension, chart_date_range, comparison_df), CHART_MAX_POINTS)
     if free_share_by_source_chart:
         st.plotly_chart(free_share_by_source_chart, use_container_width=True)
     else:
@@ -1828,12 +1777,98 @@ def main():
     st.markdown("**RTP = Total Free Inflow (by source) / Total Outflow** (line chart per source)")
     st.caption("Note: Outflow is calculated at player-day level to avoid double counting")
     
-    rtp_by_source_chart = create_rtp_by_source_chart(filtered_df, selected_dimension, chart_date_range)
+    rtp_by_source_chart = downsample.downsample_figure(
+        create_rtp_by_source_chart(filtered_df, selected_dimension, chart_date_range, comparison_df), CHART_MAX_POINTS)
     if rtp_by_source_chart:
         st.plotly_chart(rtp_by_source_chart, use_container_width=True)
     else:
         st.info("No data available for the selected filters.")
+    
+    # Two-dimension pivot (split dimension x pivot dimension)
+    if selected_dimension and pivot_dimension and pivot_dimension != selected_dimension:
+        render_pivot_view(dataset, rows, selected_dimension, pivot_dimension)
+    elif pivot_dimension:
+        st.info("💡 Choose a different Split by Dimension to see the two-dimension pivot.")
+    
+    # Player-level drilldown (on demand against the player-grain table)
+    render_player_drilldown(client, filters, selected_dimension, dimension_values, chart_date_range)
+    
+    mark('dashboard rendered')
+    if startup_profile_enabled():
+        with st.sidebar.expander("⏱️ Startup Profile", expanded=False):
+            st.code(format_report(), language=None)
+
+# ============================================================================
+# ADMIN DIAGNOSTICS
+# ============================================================================
+
+def arm_rerun_profiler():
+    """Button callback: the rerun of the click itself is skipped, the one after it is profiled"""
+    st.session_state.rerun_profiler = 'pending'
+
+def render_rerun_profiler():
+    """Sidebar controls: arm the profiler, download the last profile"""
+    with st.sidebar.expander("🔬 Rerun Profiler", expanded=False):
+        if st.session_state.get('rerun_profiler'):
+            st.caption("Armed: your next interaction is profiled.")
+        else:
+            st.button("Profile next rerun", on_click=arm_rerun_profiler)
+        result = st.session_state.get('rerun_profile')
+        if result:
+            st.caption(f"Last profile: {result['seconds']:.2f}s rerun at {result['created']}")
+            st.download_button("⬇️ Hot functions (.txt)", result['report'],
+                               file_name=f"rerun_profile_{result['created']}.txt", mime='text/plain')
+            st.download_button("⬇️ Raw profile (.prof)", result['stats'],
+                               file_name=f"rerun_profile_{result['created']}.prof", mime='application/octet-stream')
+
+@st.cache_data(ttl=60, show_spinner=False)
+def get_query_ledger_summary():
+    """Ledger summary and latest jobs, reread at most once a minute (the ledger tail can be 20 MB)"""
+    entries = query_telemetry.read_entries()
+    if not entries:
+        return None
+    summary = pd.DataFrame(query_telemetry.summarize(entries)).round(2)
+    latest = pd.DataFrame(entries[-10:][::-1])
+    return summary, latest[['time', 'kind', 'bytes_billed', 'cache_hit', 'rows', 'query_seconds', 'download_seconds']]
+
+def render_query_ledger():
+    """Sidebar summary of the BigQuery jobs recorded in the ledger over the last day"""
+    with st.sidebar.expander(f"📒 Query Ledger ({query_telemetry.SUMMARY_HOURS}h)", expanded=False):
+        ledger = get_query_ledger_summary()
+        if ledger is None:
+            st.caption(f"No queries recorded yet ({query_telemetry.LEDGER_PATH}).")
+            return
+        summary, latest = ledger
+        st.dataframe(summary, hide_index=True)
+        st.caption("Latest jobs:")
+        st.dataframe(latest, hide_index=True)
+
+def run_dashboard():
+    """main(), under the profiler when an admin armed it for this rerun"""
+    if st.session_state.get('rerun_profiler') == 'armed' and is_admin(st.session_state.get('user_email')):
+        profile = rerun_profiler.RerunProfile()
+        try:
+            with profile:
+                main()
+        finally:
+            # Also when main() ends in st.rerun() / st.stop(); if another session holds the
+            # profiler, stay armed for the next rerun
+            if profile.active:
+                st.session_state.rerun_profiler = None
+                st.session_state.rerun_profile = {
+                    'seconds': profile.seconds,
+                    'created': datetime.now().strftime('%Y%m%d_%H%M%S'),
+                    'report': profile.report(),
+                    'stats': profile.dump(),
+                }
+    else:
+        if st.session_state.get('rerun_profiler') == 'pending':
+            st.session_state.rerun_profiler = 'armed'
+        main()
+    if is_admin(st.session_state.get('user_email')):
+        render_rerun_profiler()
+        render_query_ledger()
 
 if __name__ == "__main__":
-    main()
+    run_dashboard()
 
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Dashboard Table
+The aggregated dashboard table as every process reads it: the query builder, the column
+types applied to results, and typed result pages (through the shared result cache when one
+is configured). No Streamlit here, so the dashboard and headless jobs (prewarm, export,
+batch reports) build the same queries.
+
+Heavy modules (pandas, pyarrow, the BigQuery client) are imported on first use so the
+dashboard can import this before its login page is served.
+"""
+
+import os
+
+import query_planner
+import query_telemetry
+
+FULL_TABLE = "yotam-395120.peerplay.fact_consumption_daily_dashboard"
+
+INGEST_PAGE_ROWS = int(os.environ.get('DASHBOARD_INGEST_PAGE_ROWS', 50000))  # Rows per streamed result page
+INGEST_ENGINE = os.environ.get('DASHBOARD_INGEST_ENGINE', 'arrow')  # 'arrow' or 'pandas' result pages
+
+# ============================================================================
+# QUERIES
+# ============================================================================
+
+def build_dashboard_query(client, date_limit_days=None, start_date=None, end_date=None, counts=True, columns=None):
+    """
+    SQL and job config for the dashboard table (optionally bounded by days or explicit dates);
+    columns: select only these instead of the dashboard's full column list
+    """
+    # Load all available data (or last N days if date_limit_days is specified)
+    # The new table has sources as columns, not rows
+    from google.cloud.bigquery import ScalarQueryParameter
+    conditions = []
+    params = []
+    if date_limit_days:
+        conditions.append(f"date >= DATE_SUB(CURRENT_DATE(), INTERVAL {date_limit_days} DAY)")
+    # Explicit bounds fetch only the days missing from the in-memory store
+    if start_date is not None:
+        conditions.append("date >= @start_date")
+        params.append(ScalarQueryParameter('start_date', 'DATE', start_date))
+    if end_date is not None:
+        conditions.append("date <= @end_date")
+        params.append(ScalarQueryParameter('end_date', 'DATE', end_date))
+    date_filter = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    
+    if columns:
+        query = f"SELECT {', '.join(columns)}\n    FROM `{FULL_TABLE}`\n    {date_filter}"
+        return query, _job_config(params)
+
+    # Mergeable HLL++ player sketches (only present on tables rebuilt with players_sketch)
+    try:
+        has_player_sketch = any(field.name == 'players_sketch' for field in client.get_table(FULL_TABLE).schema)
+    except Exception:
+        has_player_sketch = False
+    sketch_select = "players_sketch," if has_player_sketch else ""
+    
+    query = f"""
+    SELECT 
+        date,
+        first_chapter_bucket,
+        is_us_player,
+        last_balance_bucket,
+        last_version_of_day,
+        paid_today_flag,
+        paid_ever_flag,
+        players,
+        {sketch_select}
+        -- Inflow sources (all 18 sources)
+        rewards_race_inflow_sum_value,
+        rewards_race_inflow_cnt,
+        rewards_store_inflow_sum_value,
+        rewards_store_inflow_cnt,
+        rewards_rolling_offer_collect_inflow_sum_value,
+        rewards_rolling_offer_collect_inflow_cnt,
+        rewards_board_task_inflow_sum_value,
+        rewards_board_task_inflow_cnt,
+        rewards_harvest_collect_inflow_sum_value,
+        rewards_harvest_collect_inflow_cnt,
+        rewards_missions_total_inflow_sum_value,
+        rewards_missions_total_inflow_cnt,
+        rewards_recipes_inflow_sum_value,
+        rewards_recipes_inflow_cnt,
+        rewards_flowers_inflow_sum_value,
+        rewards_flowers_inflow_cnt,
+        rewards_rewarded_video_inflow_sum_value,
+        rewards_rewarded_video_inflow_cnt,
+        rewards_disco_inflow_sum_value,
+        rewards_disco_inflow_cnt,
+        rewards_timed_task_inflow_sum_value,
+        rewards_timed_task_inflow_cnt,
+        rewards_sell_board_item_inflow_sum_value,
+        rewards_sell_board_item_inflow_cnt,
+        rewards_mass_compensation_inflow_sum_value,
+        rewards_mass_compensation_inflow_cnt,
+        rewards_missions_task_inflow_sum_value,
+        rewards_missions_task_inflow_cnt,
+        rewards_album_set_completion_inflow_sum_value,
+        rewards_album_set_completion_inflow_cnt,
+        rewards_self_collectable_inflow_sum_value,
+        rewards_self_collectable_inflow_cnt,
+        rewards_eoc_inflow_sum_value,
+        rewards_eoc_inflow_cnt,
+        rewards_frenzy_non_jackpot_inflow_sum_value,
+        rewards_frenzy_non_jackpot_inflow_cnt,
+        -- Outflow sources (2 sources)
+        generation_outflow_sum_value,
+        generation_outflow_cnt,
+        click_bubble_purchase_outflow_sum_value,
+        click_bubble_purchase_outflow_cnt,
+        -- Calculated totals
+        total_inflow,
+        total_free_inflow,
+        total_paid_inflow,
+        total_outflow
+    FROM `{FULL_TABLE}`
+    {date_filter}
+    """
+    if not counts:
+        # Event counts (*_cnt) are not used by any view; leaving them out scans fewer columns
+        query = "\n".join(line for line in query.splitlines() if not line.strip().endswith('_cnt,'))
+    
+    return query, _job_config(params)
+
+def _job_config(params):
+    # Use job_config for faster queries with caching
+    from google.cloud.bigquery import QueryJobConfig
+    return QueryJobConfig(
+        use_query_cache=True,
+        use_legacy_sql=False,
+        maximum_bytes_billed=query_planner.QUERY_BUDGET_BYTES,
+        query_parameters=params
+    )
+
+# ============================================================================
+# TYPES
+# ============================================================================
+
+# Column types of the dashboard table (applied to pandas pages and Arrow batches alike)
+NUMERIC_FIELDS = [
+    'players', 'last_version_of_day',
+    'rewards_race_inflow_sum_value', 'rewards_race_inflow_cnt',
+    'rewards_store_inflow_sum_value', 'rewards_store_inflow_cnt',
+    'rewards_rolling_offer_collect_inflow_sum_value', 'rewards_rolling_offer_collect_inflow_cnt',
+    'rewards_board_task_inflow_sum_value', 'rewards_board_task_inflow_cnt',
+    'rewards_harvest_collect_inflow_sum_value', 'rewards_harvest_collect_inflow_cnt',
+    'rewards_missions_total_inflow_sum_value', 'rewards_missions_total_inflow_cnt',
+    'rewards_recipes_inflow_sum_value', 'rewards_recipes_inflow_cnt',
+    'rewards_flowers_inflow_sum_value', 'rewards_flowers_inflow_cnt',
+    'rewards_rewarded_video_inflow_sum_value', 'rewards_rewarded_video_inflow_cnt',
+    'rewards_disco_inflow_sum_value', 'rewards_disco_inflow_cnt',
+    'rewards_timed_task_inflow_sum_value', 'rewards_timed_task_inflow_cnt',
+    'rewards_sell_board_item_inflow_sum_value', 'rewards_sell_board_item_inflow_cnt',
+    'rewards_mass_compensation_inflow_sum_value', 'rewards_mass_compensation_inflow_cnt',
+    'rewards_missions_task_inflow_sum_value', 'rewards_missions_task_inflow_cnt',
+    'rewards_album_set_completion_inflow_sum_value', 'rewards_album_set_completion_inflow_cnt',
+    'rewards_self_collectable_inflow_sum_value', 'rewards_self_collectable_inflow_cnt',
+    'rewards_eoc_inflow_sum_value', 'rewards_eoc_inflow_cnt',
+    'rewards_frenzy_non_jackpot_inflow_sum_value', 'rewards_frenzy_non_jackpot_inflow_cnt',
+    'generation_outflow_sum_value', 'generation_outflow_cnt',
+    'click_bubble_purchase_outflow_sum_value', 'click_bubble_purchase_outflow_cnt',
+    'total_inflow', 'total_free_inflow', 'total_paid_inflow', 'total_outflow'
+]
+FLAG_FIELDS = ['paid_today_flag', 'paid_ever_flag', 'is_us_player']
+STRING_FIELDS = ['first_chapter_bucket', 'last_balance_bucket']
+
+def type_dashboard_frame(df):
+    """Coerce a result frame (or page) of the dashboard table to the dashboard's column types"""
+    import pandas as pd
+    # Ensure proper data types
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date']).dt.date
+    
+    # Handle numeric fields - all source columns and totals
+    for field in NUMERIC_FIELDS:
+        if field in df.columns:
+            df[field] = pd.to_numeric(df[field], errors='coerce').fillna(0)
+    
+    # Handle flag fields
+    for field in FLAG_FIELDS:
+        if field in df.columns:
+            df[field] = df[field].fillna(0).astype(int)
+    
+    # Handle string fields (buckets)
+    for field in STRING_FIELDS:
+        if field in df.columns:
+            df[field] = df[field].astype(str)
+    
+    return df
+
+def type_dashboard_batch(batch):
+    """The same coercion for an Arrow record batch, with Arrow kernels (no pandas objects built)"""
+    import pyarrow as pa
+    columns = []
+    for name, column in zip(batch.schema.names, batch.columns):
+        if name in NUMERIC_FIELDS:
+            column = column.cast(pa.float64()).fill_null(0)
+        elif name in FLAG_FIELDS:
+            column = column.cast(pa.int64()).fill_null(0)
+        elif name in STRING_FIELDS:
+            # astype(str) on the pandas path renders nulls as 'None'
+            column = column.cast(pa.string()).fill_null('None')
+        columns.append(column)
+    return pa.RecordBatch.from_arrays(columns, names=batch.schema.names)
+
+# ============================================================================
+# RESULTS
+# ============================================================================
+
+def shared_result_key(client, query, job_config):
+    """(shared cache, content key) for a dashboard table query, or (None, None) when not cacheable"""
+    import shared_cache
+    cache = shared_cache.get_shared_cache()
+    if cache is None:
+        return None, None
+    version = shared_cache.data_version(client, FULL_TABLE)
+    if version is None:
+        return None, None
+    return cache, shared_cache.query_key(version, query, job_config)
+
+def query_dashboard_table(client, date_limit_days=None, start_date=None, end_date=None):
+    """Query the dashboard table into a typed DataFrame"""
+    query, job_config = build_dashboard_query(client, date_limit_days, start_date, end_date)
+
+    def fetch():
+        return type_dashboard_frame(query_telemetry.fetch_dataframe(client, query, job_config, kind='load'))
+
+    cache, key = shared_result_key(client, query, job_config)
+    return cache.frame(key, fetch) if cache else fetch()
+
+def iter_result_pages(client, query, job_config, page_size=INGEST_PAGE_ROWS):
+    """Typed result pages of a dashboard table query, one page in memory at a time"""
+    arrow = INGEST_ENGINE == 'arrow'
+    pages = query_telemetry.iter_pages(client, query, job_config, page_size, kind='stream', arrow=arrow)
+    if arrow:
+        # Arrow record batches go straight into the store's Arrow encoder
+        typed = lambda: (type_dashboard_batch(batch) for batch in pages)
+        cache, key = shared_result_key(client, query, job_config)
+        yield from cache.batches(key, typed) if cache else typed()
+    else:
+        for page in pages:
+            yield type_dashboard_frame(page)
+
+def table_date_range(client):
+    """First and last date in the dashboard table (lightweight query); (None, None) if empty"""
+    import pandas as pd
+    range_query = f"""
+    SELECT 
+        MIN(date) as min_date,
+        MAX(date) as max_date
+    FROM `{FULL_TABLE}`
+    """
+    range_df = query_telemetry.fetch_dataframe(client, range_query, kind='date_range')
+    if len(range_df) == 0 or pd.isna(range_df['min_date'].iloc[0]) or pd.isna(range_df['max_date'].iloc[0]):
+        return None, None
+    return pd.to_datetime(range_df['min_date'].iloc[0]).date(), pd.to_datetime(range_df['max_date'].iloc[0]).date()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Dataset Cache
+Process-level cache of the published SharedDataset: one load per TTL shared by all sessions,
+and one load at a time (sessions that miss together wait for the first one's load). A
+request is served by a fresh dataset covering at least the requested history, so widening
+and then narrowing the range does not load a second copy.
+
+Only one dataset is held: a load happens only when the held one does not cover the request,
+so the new one covers everything the old one did and replaces it.
+
+Memory is bounded where it is held, not here: DASHBOARD_CACHE_BUDGET_MB caps the date store
+(whose arrays the published dataset shares) plus each dataset's date cubes (see
+memory_budget()).
+"""
+
+import os
+import threading
+import time
+
+DEFAULT_BUDGET_MB = 1024
+DEFAULT_TTL_SECONDS = 300
+
+def memory_budget():
+    """(date store bytes, date cube bytes) out of DASHBOARD_CACHE_BUDGET_MB"""
+    from shared_dataset import CUBE_BUDGET_BYTES
+    budget_bytes = int(float(os.environ.get('DASHBOARD_CACHE_BUDGET_MB', DEFAULT_BUDGET_MB)) * 1e6)
+    if CUBE_BUDGET_BYTES >= budget_bytes:
+        raise ValueError("DASHBOARD_CUBE_BUDGET_MB must be below DASHBOARD_CACHE_BUDGET_MB")
+    return budget_bytes - CUBE_BUDGET_BYTES, CUBE_BUDGET_BYTES
+
+def _covers(loaded_days, requested_days):
+    """True if a dataset loaded with loaded_days of history serves requested_days (None = all history)"""
+    if loaded_days is None:
+        return True
+    return requested_days is not None and loaded_days >= requested_days
+
+class DatasetCache:
+    """Thread-safe single-entry cache of the dataset keyed by date_limit_days, with a TTL"""
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entry = None                # (date_limit_days, dataset, loaded_at)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _find(self, date_limit_days):
+        """The held dataset if fresh and covering the request (caller holds the lock)"""
+        if self._entry is None:
+            return None
+        key, dataset, loaded_at = self._entry
+        if time.time() - loaded_at > self.ttl_seconds:
+            self._entry = None
+            return None
+        return dataset if _covers(key, date_limit_days) else None
+
+    def get(self, date_limit_days, loader):
+        """Return a dataset covering date_limit_days, calling loader(date_limit_days) on a miss"""
+        with self._lock:
+            dataset = self._find(date_limit_days)
+            if dataset is not None:
+                self.hits += 1
+                return dataset
+
+        with self._load_lock:
+            # Another session may have loaded it while we waited
+            with self._lock:
+                dataset = self._find(date_limit_days)
+                if dataset is not None:
+                    self.hits += 1
+                    return dataset
+            dataset = loader(date_limit_days)
+            with self._lock:
+                self.misses += 1
+                if dataset is not None:
+                    self._entry = (date_limit_days, dataset, time.time())
+            return dataset
+
+    def put(self, date_limit_days, dataset):
+        """Replace the held dataset (e.g. after merging newly fetched days into it)"""
+        with self._lock:
+            self._entry = (date_limit_days, dataset, time.time())
+
+    def clear(self):
+        with self._lock:
+            self._entry = None
+
+    def stats(self):
+        """Occupancy snapshot for display"""
+        with self._lock:
+            dataset = self._entry[1] if self._entry else None
+            return {
+                'entries': int(dataset is not None),
+                'dataset_bytes': dataset.nbytes if dataset is not None else 0,
+                'cube_bytes': dataset.cube_nbytes if dataset is not None else 0,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
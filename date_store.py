@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Date-Chunked Store
+The process keeps the loaded table as one chunk of column arrays per day, in date order:
+- append(): new days are inserted (a reloaded day replaces its chunk); existing chunks are
+  never copied
+- ingest(): the same for a stream of result pages, each encoded and dropped before the next
+- apply_retention(): days older than the retention window are dropped, then the oldest
+  days while the store is over its byte budget; the budget is also enforced after every
+  ingest (refreshes and backfills), so the store never stays over it
+- chunks_between(): date-range selection is a binary search over the chunk dates
+- backfill(): days older than the held history are fetched on demand and merged in, so
+  widening the range costs only the missing days; retention leaves backfilled days alone
+  for DASHBOARD_BACKFILL_TTL_SECONDS (default 3600) after the last backfill.
+  backfill_range() cuts a backfill to the days the budget has room for, so a full store
+  does not fetch days the budget would drop again on every rerun
+
+Sessions read an immutable SharedDataset published from the store (to_dataset()). Publishing
+concatenates the chunks once and then re-points every chunk at a slice of the published
+metric arrays, so the store and the current dataset share memory.
+
+Retention: DASHBOARD_RETENTION_DAYS (default: keep everything), and a byte budget set by the
+caller (the dashboard uses its share of DASHBOARD_CACHE_BUDGET_MB).
+"""
+
+import bisect
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from hll_sketch import concat_sketches, decode_sketches, slice_sketches
+from shared_dataset import DIMENSION_COLUMNS, SKETCH_COLUMN, SharedDataset, _freeze
+
+class _Missing:
+    """Dictionary key for null dimension values (NaN != NaN)"""
+
+    def __repr__(self):
+        return 'NA'
+
+_NA = _Missing()
+
+def _value_key(value):
+    return _NA if pd.isna(value) else value
+
+def _sort_key(value):
+    # Nulls last; values of one dimension share a type so they compare among themselves
+    return (True, 0) if pd.isna(value) else (False, value)
+
+EPOCH = date(1970, 1, 1)
+
+BACKFILL_TTL_SECONDS = int(os.environ.get('DASHBOARD_BACKFILL_TTL_SECONDS', 3600))
+
+def default_retention_days():
+    value = os.environ.get('DASHBOARD_RETENTION_DAYS')
+    return int(value) if value else None
+
+class DayChunk:
+    """Rows of one date: dimension codes, metric columns and decoded sketches"""
+
+    __slots__ = ('date', 'n_rows', 'codes', 'columns', 'sketches')
+
+    def __init__(self, date, n_rows, codes, columns, sketches):
+        self.date = date
+        self.n_rows = n_rows
+        self.codes = codes          # Dimension -> int32 codes into the store dictionary
+        self.columns = columns      # Metric column -> float64 values
+        self.sketches = sketches    # DecodedSketches for these rows or None
+
+    @property
+    def nbytes(self):
+        total = sum(c.nbytes for c in self.codes.values()) + sum(c.nbytes for c in self.columns.values())
+        return total + (self.sketches.nbytes if self.sketches is not None else 0)
+
+def _merge_chunks(chunks):
+    """One DayChunk from the parts of a day received in different pages"""
+    if len(chunks) == 1:
+        return chunks[0]
+    first = chunks[0]
+    block = np.concatenate([np.stack(list(chunk.columns.values())) for chunk in chunks], axis=1)
+    return DayChunk(
+        first.date, sum(chunk.n_rows for chunk in chunks),
+        {d: np.concatenate([chunk.codes[d] for chunk in chunks]) for d in first.codes},
+        dict(zip(first.columns, block)),
+        concat_sketches([chunk.sketches for chunk in chunks]) if first.sketches is not None else None
+    )
+
+class DateChunkedStore:
+    """Per-day column chunks with append, retention and binary-search date selection"""
+
+    def __init__(self, retention_days=None, backfill_ttl_seconds=BACKFILL_TTL_SECONDS, budget_bytes=None):
+        self.retention_days = retention_days
+        self.budget_bytes = budget_bytes
+        self.backfill_ttl_seconds = backfill_ttl_seconds
+        self._dates = []            # Sorted chunk dates (bisect keys)
+        self._chunks = []           # DayChunk per date, same order
+        self._values = {}           # Dimension -> list of values (code -> value)
+        self._lookup = {}           # Dimension -> {value key: code}
+        self._columns = None        # Metric column names, fixed by the first append
+        self._has_sketches = None
+        self.history_start = None   # Held days are complete from this date on (None: from the first row)
+        self._backfilled = None     # (earliest backfilled date, kept by retention until this time)
+        self.budget_start = None    # Oldest day kept the last time the budget dropped days (None: never)
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Metadata
+    # ------------------------------------------------------------------
+
+    def __len__(self):
+        return sum(chunk.n_rows for chunk in self._chunks)
+
+    @property
+    def nbytes(self):
+        """Resident size of the held days (after to_dataset() these are the published arrays)"""
+        return sum(chunk.nbytes for chunk in self._chunks)
+
+    @property
+    def n_days(self):
+        return len(self._dates)
+
+    @property
+    def min_date(self):
+        return self._dates[0] if self._dates else None
+
+    @property
+    def max_date(self):
+        return self._dates[-1] if self._dates else None
+
+    @property
+    def columns(self):
+        """Metric column names every page must have (None until the first page)"""
+        return self._columns
+
+    def _check_columns(self, names):
+        missing = [c for c in self._columns if c not in names]
+        if missing:
+            raise ValueError(f"Page lacks store columns {', '.join(missing)}: "
+                             f"pages must keep the projection the store was built with")
+        if self._has_sketches and SKETCH_COLUMN not in names:
+            raise ValueError(f"Page lacks the {SKETCH_COLUMN} column the store was built with")
+
+    def missing_before(self, date_min):
+        """True if days before the held history up to date_min may exist but are not held"""
+        return self.history_start is not None and date_min < self.history_start
+
+    def trimmed_by_budget(self):
+        """True if the held history starts where the byte budget cut it"""
+        return self.budget_start is not None and self.history_start is not None and self.history_start <= self.budget_start
+
+    def backfill_range(self, date_min):
+        """
+        (first, last) days to fetch so the history reaches back towards date_min, cut to what the
+        byte budget has room for at the held days' average size; None if nothing is missing or fits
+        """
+        if not self.missing_before(date_min):
+            return None
+        last = self.history_start - timedelta(days=1)
+        if self.budget_bytes and self._chunks:
+            held = self.nbytes
+            fit_days = int((self.budget_bytes - held) // (held / len(self._chunks)))
+            if fit_days < 1:
+                return None
+            date_min = max(date_min, self.history_start - timedelta(days=fit_days))
+        return date_min, last
+
+    def chunks_between(self, date_min=None, date_max=None):
+        """Chunks with date_min <= date <= date_max (binary search over the chunk dates)"""
+        start = bisect.bisect_left(self._dates, date_min) if date_min is not None else 0
+        end = bisect.bisect_right(self._dates, date_max) if date_max is not None else len(self._dates)
+        return self._chunks[start:end]
+
+    # ------------------------------------------------------------------
+    # Mutation
+    # ------------------------------------------------------------------
+
+    def _map_codes(self, dimension, codes, uniques):
+        """Page-local codes (into uniques) -> store codes, adding unseen values (caller holds the lock)"""
+        values = self._values.setdefault(dimension, [])
+        lookup = self._lookup.setdefault(dimension, {})
+        mapping = np.empty(len(uniques), dtype=np.int32)
+        for i, value in enumerate(uniques):
+            key = _value_key(value)
+            if key not in lookup:
+                lookup[key] = len(values)
+                values.append(value)
+            mapping[i] = lookup[key]
+        return mapping[codes]
+
+    def _encode_frame(self, df):
+        """Date-sorted dates, dimension codes, metric matrix and sketch blobs of a DataFrame page"""
+        df = df.sort_values('date', kind='stable').reset_index(drop=True)
+        with self._lock:
+            if self._columns is None:
+                self._columns = [
+                    c for c in df.columns
+                    if c not in DIMENSION_COLUMNS and c not in ('date', SKETCH_COLUMN)
+                    and pd.api.types.is_numeric_dtype(df[c])
+                ]
+                self._has_sketches = SKETCH_COLUMN in df.columns
+            self._check_columns(df.columns)
+            codes = {}
+            for d in DIMENSION_COLUMNS:
+                if d in df.columns:
+                    page_codes, uniques = pd.factorize(df[d], use_na_sentinel=False)
+                    codes[d] = self._map_codes(d, page_codes, uniques)
+
+        matrix = np.empty((len(self._columns), len(df)))
+        for i, c in enumerate(self._columns):
+            matrix[i] = df[c].to_numpy(dtype=np.float64)
+        blobs = df[SKETCH_COLUMN].tolist() if self._has_sketches else None
+        return df['date'].to_numpy(), codes, matrix, blobs
+
+    def _encode_arrow(self, batch):
+        """
+        The same from an Arrow record batch or table, with Arrow compute kernels: dimensions
+        are dictionary-encoded, metrics cast to float64 and dates kept as day numbers, so no
+        pandas object columns are built
+        """
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        names = batch.schema.names
+        day_numbers = batch.column('date').cast(pa.int32()).to_numpy(zero_copy_only=False)
+        order = np.argsort(day_numbers, kind='stable')
+        batch = batch.take(pa.array(order))
+        day_numbers = day_numbers[order]
+
+        with self._lock:
+            if self._columns is None:
+                self._columns = [
+                    c for c, t in zip(names, batch.schema.types)
+                    if c not in DIMENSION_COLUMNS and c not in ('date', SKETCH_COLUMN)
+                    and (pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t))
+                ]
+                self._has_sketches = SKETCH_COLUMN in names
+            self._check_columns(names)
+            codes = {}
+            for d in DIMENSION_COLUMNS:
+                if d in names:
+                    encoded = pc.dictionary_encode(batch.column(d))
+                    if isinstance(encoded, pa.ChunkedArray):
+                        encoded = encoded.combine_chunks()
+                    uniques = encoded.dictionary.to_pylist()
+                    indices = encoded.indices
+                    if indices.null_count:
+                        # Nulls get an extra trailing entry
+                        uniques.append(None)
+                        indices = indices.fill_null(len(uniques) - 1)
+                    page_codes = indices.to_numpy(zero_copy_only=False)
+                    codes[d] = self._map_codes(d, page_codes, uniques)
+
+        matrix = np.empty((len(self._columns), batch.num_rows))
+        for i, c in enumerate(self._columns):
+            matrix[i] = batch.column(c).cast(pa.float64()).fill_null(0).to_numpy(zero_copy_only=False)
+        blobs = batch.column(SKETCH_COLUMN).to_pylist() if self._has_sketches else None
+        return day_numbers, codes, matrix, blobs
+
+    def _split_days(self, page):
+        """Encode a page against the store and split it into DayChunks (copies, so the page can be dropped)"""
+        # Metric columns come back as one (n_columns, n_rows) matrix: one copy per day, not per column
+        if isinstance(page, pd.DataFrame):
+            dates, codes, matrix, blobs = self._encode_frame(page)
+        else:
+            dates, codes, matrix, blobs = self._encode_arrow(page)
+        sketches = None
+        if self._has_sketches:
+            sketches = decode_sketches(blobs)
+
+        starts = np.flatnonzero(np.concatenate(([True], dates[1:] != dates[:-1])))
+        ends = np.append(starts[1:], len(dates))
+        return [
+            DayChunk(
+                dates[start] if isinstance(page, pd.DataFrame) else EPOCH + timedelta(days=int(dates[start])),
+                int(end - start),
+                {d: c[start:end].copy() for d, c in codes.items()},
+                dict(zip(self._columns, matrix[:, start:end].copy())),
+                slice_sketches(sketches, start, end, copy=True) if sketches is not None else None
+            )
+            for start, end in zip(starts, ends)
+        ]
+
+    def ingest(self, pages):
+        """
+        Fold DataFrame or Arrow pages (e.g. query result pages) into the store one page at a time, so
+        peak memory is one raw page plus the encoded days. Days in the pages replace held
+        days (e.g. late-arriving data), all at once after the last page. The oldest days are then
+        dropped while over budget_bytes.
+        """
+        self._ingest(pages)
+        return self
+
+    def _ingest(self, pages):
+        """ingest(); returns the days the budget dropped"""
+        parts = {}
+        for page in pages:
+            if len(page) == 0:
+                continue
+            # A day can be spread over several pages
+            for chunk in self._split_days(page):
+                parts.setdefault(chunk.date, []).append(chunk)
+        with self._lock:
+            for date, day_parts in parts.items():
+                chunk = _merge_chunks(day_parts)
+                position = bisect.bisect_left(self._dates, date)
+                if position < len(self._dates) and self._dates[position] == date:
+                    self._chunks[position] = chunk
+                else:
+                    self._dates.insert(position, date)
+                    self._chunks.insert(position, chunk)
+            dropped = self._over_budget(0)
+            self._drop_oldest(dropped)
+        return dropped
+
+    def append(self, df):
+        """Add the days in df; a day already held is replaced (e.g. late-arriving data)"""
+        return self.ingest([df])
+
+    def apply_retention(self, retention_days=None):
+        """
+        Drop days older than the retention window (counted back from the newest day), except
+        recent backfills, then the oldest days while over budget_bytes (backfills included:
+        the budget is a hard cap; the newest day is always kept). Returns the days dropped.
+        """
+        retention_days = retention_days or self.retention_days
+        if not self._dates:
+            return 0
+        with self._lock:
+            dropped = 0
+            cutoff = None
+            if retention_days:
+                cutoff = self._dates[-1] - timedelta(days=retention_days - 1)
+                if self._backfilled is not None:
+                    backfill_start, keep_until = self._backfilled
+                    if time.time() < keep_until:
+                        cutoff = min(cutoff, backfill_start)
+                    else:
+                        self._backfilled = None
+                dropped = bisect.bisect_left(self._dates, cutoff)
+            budget_dropped = self._over_budget(dropped)
+            self._drop_oldest(dropped + budget_dropped, cutoff, budget_dropped > 0)
+        return dropped + budget_dropped
+
+    def _over_budget(self, dropped):
+        """How many more of the oldest days (after the first `dropped`) to drop to fit budget_bytes"""
+        if not self.budget_bytes:
+            return 0
+        sizes = [chunk.nbytes for chunk in self._chunks]
+        held = sum(sizes[dropped:])
+        extra = 0
+        while held > self.budget_bytes and dropped + extra < len(sizes) - 1:
+            held -= sizes[dropped + extra]
+            extra += 1
+        return extra
+
+    def _drop_oldest(self, dropped, cutoff=None, by_budget=True):
+        """Drop the oldest `dropped` days; the history is then complete from the first kept day (lock held)"""
+        if not dropped:
+            return
+        if cutoff is None or self._dates[dropped] > cutoff:
+            cutoff = self._dates[dropped]
+        del self._dates[:dropped]
+        del self._chunks[:dropped]
+        self.history_start = cutoff
+        if by_budget:
+            self.budget_start = cutoff
+
+    def backfill(self, pages, date_min):
+        """Add the pages fetched for date_min..history_start - 1; the history is then complete from date_min"""
+        budget_dropped = self._ingest(pages)
+        with self._lock:
+            if budget_dropped:
+                # The budget dropped the oldest days again: the history starts where it cut
+                date_min = self.history_start
+            self.history_start = date_min
+            if self._backfilled is not None:
+                date_min = min(date_min, self._backfilled[0])
+            self._backfilled = (date_min, time.time() + self.backfill_ttl_seconds)
+        return self
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def to_dataset(self):
+        """Publish the held days as an immutable SharedDataset (one concatenation)"""
+        with self._lock:
+            chunks = list(self._chunks)
+            if not chunks:
+                return None
+            bounds = np.concatenate(([0], np.cumsum([chunk.n_rows for chunk in chunks])))
+
+            codes = {}
+            values = {}
+            for dimension, store_values in self._values.items():
+                # Published codes follow sorted value order (what filters and splits display);
+                # the store keeps its append-only numbering so pages being ingested stay valid
+                order = sorted(range(len(store_values)), key=lambda i: _sort_key(store_values[i]))
+                remap = np.empty(len(store_values), dtype=np.int32)
+                remap[order] = np.arange(len(order), dtype=np.int32)
+                codes[dimension] = _freeze(remap[np.concatenate([chunk.codes[dimension] for chunk in chunks])])
+                values[dimension] = _freeze(pd.Index([store_values[i] for i in order]).to_numpy(copy=True))
+
+            columns = {
+                column: _freeze(np.concatenate([chunk.columns[column] for chunk in chunks]))
+                for column in self._columns
+            }
+            sketches = None
+            if self._has_sketches:
+                sketches = concat_sketches([chunk.sketches for chunk in chunks])
+                for array in (sketches.offsets, sketches.indices, sketches.rhos):
+                    _freeze(array)
+
+            # Chunks now view the published metric arrays instead of holding their own copies
+            for i, chunk in enumerate(chunks):
+                start, end = bounds[i], bounds[i + 1]
+                chunk.columns = {c: v[start:end] for c, v in columns.items()}
+                if sketches is not None:
+                    chunk.sketches = slice_sketches(sketches, start, end)
+
+            return SharedDataset(
+                dates=_freeze(np.asarray(self._dates, dtype=object)),
+                date_codes=_freeze(np.repeat(np.arange(len(chunks), dtype=np.int32), np.diff(bounds))),
+                codes=codes,
+                values=values,
+                columns=columns,
+                sketches=sketches
+            )
@@ -123,8 +123,7 @@ echo "3. Click 'Edit & Deploy New Revision'"
 echo "4. Go to 'Variables & Secrets' tab"
 echo "5. Add the following secrets:"
 echo "   - GOOGLE_APPLICATION_CREDENTIALS_JSON (service account JSON)"
-echo "   - GOOGLE_OAUTH_CLIENT_ID"
-echo "   - GOOGLE_OAUTH_CLIENT_SECRET"
-echo "   - STREAMLIT_REDIRECT_URI (set to: ${SERVICE_URL})"
+echo "   - secrets.toml with the [auth] sign-in section, mounted at /app/.streamlit/secrets.toml"
+echo "     (redirect_uri = ${SERVICE_URL}/oauth2callback)"
 echo ""
 
@@ -135,9 +135,8 @@ echo "   - BQ_DATASET_ID = peerplay"
 echo ""
 echo "3. Create secrets in Secret Manager and reference them in Cloud Run:"
 echo "   - GOOGLE_APPLICATION_CREDENTIALS_JSON"
-echo "   - GOOGLE_OAUTH_CLIENT_ID"
-echo "   - GOOGLE_OAUTH_CLIENT_SECRET"
-echo "   - STREAMLIT_REDIRECT_URI (set to: ${SERVICE_URL})"
+echo "   - secrets.toml with the [auth] sign-in section, mounted at /app/.streamlit/secrets.toml"
+echo "     (redirect_uri = ${SERVICE_URL}/oauth2callback)"
 echo ""
 echo "4. Update OAuth redirect URI in Google Cloud Console:"
 echo "   https://console.cloud.google.com/apis/credentials?project=${PROJECT_ID}"
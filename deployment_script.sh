@@ -152,9 +152,7 @@ echo "7. Click 'Deploy!'"
 echo ""
 echo "After deployment, configure secrets in Streamlit Cloud:"
 echo "- GOOGLE_APPLICATION_CREDENTIALS_JSON (service account JSON)"
-echo "- GOOGLE_OAUTH_CLIENT_ID"
-echo "- GOOGLE_OAUTH_CLIENT_SECRET"
-echo "- STREAMLIT_REDIRECT_URI (your Streamlit Cloud URL)"
+echo "- [auth] sign-in section (redirect_uri = your Streamlit Cloud URL + /oauth2callback, see STREAMLIT_DEPLOYMENT.md)"
 echo ""
 echo "Option 2: Push to GitHub (if not already done)"
 echo "-----------------------------------------------"
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Chart Downsampling
+Thins long daily traces on the server before the figure is sent to the browser: a chart a
+thousand-odd pixels wide cannot show more points than that per trace, but every point is
+serialized and drawn. Shape is preserved, spikes included:
+- lines: largest-triangle-three-buckets (LTTB), which keeps the point of each bucket that
+  deviates most from its neighbours
+- stacked bars: a min/max envelope shared by every trace of the stack (the bars of one day
+  must stay together), keeping each trace's lowest and highest day of every bucket
+
+Traces at or under the point budget are left untouched.
+"""
+
+import numpy as np
+import pandas as pd
+
+# ============================================================================
+# POINT SELECTION
+# ============================================================================
+
+def lttb_indices(x, y, n_out):
+    """Indices of the n_out points LTTB keeps (always the first and last)"""
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    # n_out - 2 buckets between the fixed first and last points
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        # Twice the area of the triangle (previous pick, candidate, next bucket average)
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def envelope_indices(ys, n_out):
+    """
+    Indices kept by a min/max envelope of one or more equally long series (rows of ys):
+    each series' lowest and highest point of every bucket, plus the first and last point,
+    with buckets halved until the union fits n_out
+    """
+    ys = np.nan_to_num(np.atleast_2d(np.asarray(ys, dtype=np.float64)))
+    n = ys.shape[1]
+    if n <= n_out:
+        return np.arange(n)
+    n_buckets = max((n_out - 2) // 2, 1)
+    while True:
+        edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+        bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+        keep = [np.array([0, n - 1])]
+        for y in ys:
+            # Sorted by (bucket, value): each bucket's first entry is its min, last its max
+            order = np.lexsort((y, bucket))
+            keep.extend([order[edges[:-1]], order[edges[1:] - 1]])
+        indices = np.unique(np.concatenate(keep))
+        if len(indices) <= n_out or n_buckets == 1:
+            return indices
+        n_buckets //= 2
+
+# ============================================================================
+# FIGURES
+# ============================================================================
+
+SLICED_ATTRIBUTES = ['x', 'y', 'customdata', 'text', 'hovertext']
+
+def _numeric_x(x):
+    """Trace x as float (dates -> epoch milliseconds, Plotly's date axis unit); None if not numeric"""
+    values = np.asarray(x)
+    if np.issubdtype(values.dtype, np.number):
+        return values.astype(np.float64)
+    dates = pd.to_datetime(pd.Index(values), errors='coerce')
+    if dates.isna().any():
+        return None
+    return dates.as_unit('ms').asi8.astype(np.float64)
+
+def _take(trace, indices):
+    """Keep only the points at indices in every per-point attribute of the trace"""
+    n = len(trace.x)
+    for attribute in SLICED_ATTRIBUTES:
+        value = trace[attribute]
+        if value is not None and not isinstance(value, str) and len(value) == n:
+            trace[attribute] = np.asarray(value)[indices]
+
+def downsample_figure(fig, max_points):
+    """Downsample every trace of fig with more than max_points points (in place); returns fig"""
+    if fig is None or max_points < 3:
+        return fig
+
+    stacks = {}
+    for trace in fig.data:
+        if trace.x is None or trace.y is None or len(trace.x) <= max_points:
+            continue
+        x = _numeric_x(trace.x)
+        if x is None:
+            continue
+        if trace.type == 'scatter':
+            _take(trace, lttb_indices(x, trace.y, max_points))
+        elif trace.type == 'bar':
+            stacks.setdefault((trace.xaxis, trace.yaxis), []).append((trace, x))
+
+    for members in stacks.values():
+        x = members[0][1]
+        if any(len(other) != len(x) or not np.array_equal(other, x) for _, other in members):
+            # Not one shared date grid: thinning per trace would break the stack
+            continue
+        indices = envelope_indices([trace.y for trace, _ in members], max_points)
+        for trace, _ in members:
+            _take(trace, indices)
+        if fig.layout.barmode != 'group':
+            # Each kept bar widens to cover the dropped days after it (grouped bars keep Plotly's layout)
+            step = np.diff(x).min()
+            kept = x[indices]
+            widths = np.diff(np.append(kept, kept[-1] + step))
+            for trace, _ in members:
+                trace.width = widths
+                trace.offset = -step / 2
+    return fig
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Export API for the Consumption Dashboard
+Streams the aggregated series of the five dashboard views as CSV, Parquet or JSON Lines,
+without building Plotly figures. Filtering and aggregation are the dashboard's own
+(SharedDataset + views.py), so exported numbers match the charts.
+
+The requested date range is processed in chunks of --chunk-days, and each chunk is loaded,
+aggregated, written and released before the next one is loaded, so memory does not grow
+with the range. A chunk comes from the prewarm snapshot when it is fresh (a date-filtered
+read of its row groups), otherwise from a date-bounded BigQuery query streamed page by page.
+Only the columns the views use are read.
+
+Splits and filters are resolved over the whole range first, so every chunk has the same
+split values and sources: a small profile of the range (its distinct dimension combinations
+and per-source free inflow, no dates) is built chunk by chunk from the snapshot, or with one
+GROUP BY query.
+
+Usage:
+    # One view to a file (format from the extension, or --format)
+    python export.py export consumption --start 2025-01-01 --end 2025-06-30 -o consumption.csv
+
+    # Split by a dimension, filtered, as Parquet
+    python export.py export rtp_by_source --dimension is_us_player --filter first_chapter_bucket=0-10,11-20 -o rtp.parquet
+
+    # All five views into a directory
+    python export.py export all --format json -o exports/
+
+    # HTTP endpoint: GET /export/<view>.<csv|parquet|json>?start=...&end=...&dimension=...&<column>=v1,v2
+    python export.py serve --port 8081
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+import dashboard_table
+import query_telemetry
+import snapshot
+import views
+from date_store import DateChunkedStore
+from shared_dataset import SharedDataset, DIMENSION_COLUMNS
+
+DEFAULT_CHUNK_DAYS = 31
+SOURCE_COLUMNS = [views.source_column(s) for s in views.FREE_SOURCES]
+EXPORT_COLUMNS = ['date'] + DIMENSION_COLUMNS + views.TOTAL_COLUMNS + SOURCE_COLUMNS  # What the views read
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+    'json': 'application/x-ndjson',
+}
+
+# ============================================================================
+# DATA
+# ============================================================================
+
+# start / end: the dates exported, within the data; from_snapshot: read chunks from the snapshot
+ExportRange = namedtuple('ExportRange', ['start', 'end', 'from_snapshot'])
+
+_client = {}
+_client_lock = threading.Lock()
+
+def get_client():
+    """Headless BigQuery client, created on first use"""
+    from prewarm import init_bigquery_client
+    with _client_lock:
+        if 'client' not in _client:
+            _client['client'] = init_bigquery_client()
+        return _client['client']
+
+def resolve_range(start_date=None, end_date=None):
+    """
+    ExportRange of [start_date, end_date] (None: open) within the data: served by the snapshot
+    if a fresh one covers it, else by BigQuery; None if no data falls in the range
+    """
+    metadata = snapshot.read_metadata() if snapshot.covers(start_date) else None
+    if metadata and metadata['min_date']:
+        first, last = (pd.Timestamp(metadata[k]).date() for k in ('min_date', 'max_date'))
+    else:
+        metadata = None
+        first, last = dashboard_table.table_date_range(get_client())
+        if first is None:
+            return None
+    start = max(start_date, first) if start_date else first
+    end = min(end_date, last) if end_date else last
+    if start > end:
+        return None
+    return ExportRange(start, end, metadata is not None)
+
+def iter_chunk_ranges(export_range, chunk_days):
+    """(first, last) dates of each chunk of the range"""
+    chunk_start = export_range.start
+    while chunk_start <= export_range.end:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), export_range.end)
+        yield chunk_start, chunk_end
+        chunk_start = chunk_end + timedelta(days=1)
+
+def load_chunk(export_range, start_date, end_date, columns=EXPORT_COLUMNS):
+    """SharedDataset of one date chunk (None if it has no rows)"""
+    if export_range.from_snapshot:
+        df = snapshot.read_snapshot_range(start_date, end_date, columns=columns)
+        if df is not None:
+            return SharedDataset.from_frame(df)
+    # No (longer a) fresh snapshot: stream the chunk's rows from BigQuery into a store
+    client = get_client()
+    query, job_config = dashboard_table.build_dashboard_query(client, start_date=start_date, end_date=end_date,
+                                                              columns=columns)
+    return DateChunkedStore().ingest(dashboard_table.iter_result_pages(client, query, job_config)).to_dataset()
+
+def load_dataset(start_date=None, end_date=None, chunk_days=DEFAULT_CHUNK_DAYS):
+    """
+    One SharedDataset of [start_date, end_date] (None: open), for callers that need the whole
+    range at once (batch reports); loaded chunk by chunk into a store, never as one DataFrame
+    """
+    export_range = resolve_range(start_date, end_date)
+    if export_range is None:
+        return None
+    store = DateChunkedStore()
+    for chunk_start, chunk_end in iter_chunk_ranges(export_range, chunk_days):
+        if export_range.from_snapshot:
+            df = snapshot.read_snapshot_range(chunk_start, chunk_end, columns=EXPORT_COLUMNS)
+            if df is not None:
+                store.append(df)
+                continue
+        client = get_client()
+        query, job_config = dashboard_table.build_dashboard_query(client, start_date=chunk_start, end_date=chunk_end,
+                                                                  columns=EXPORT_COLUMNS)
+        store.ingest(dashboard_table.iter_result_pages(client, query, job_config))
+    return store.to_dataset()
+
+def build_profile_query(export_range):
+    """Per dimension combination of the range: summed free inflow of every source (no dates)"""
+    from google.cloud.bigquery import QueryJobConfig, ScalarQueryParameter
+    dimensions = ", ".join(DIMENSION_COLUMNS)
+    sums = ",\n        ".join(f"SUM({c}) AS {c}" for c in SOURCE_COLUMNS)
+    query = f"""
+    SELECT
+        {dimensions},
+        {sums}
+    FROM `{dashboard_table.FULL_TABLE}`
+    WHERE date >= @start_date AND date <= @end_date
+    GROUP BY {dimensions}
+    """
+    job_config = QueryJobConfig(query_parameters=[
+        ScalarQueryParameter('start_date', 'DATE', export_range.start),
+        ScalarQueryParameter('end_date', 'DATE', export_range.end),
+    ])
+    return query, job_config
+
+def _profile_frame(df):
+    return df.groupby(DIMENSION_COLUMNS, dropna=False, sort=False)[SOURCE_COLUMNS].sum().reset_index()
+
+def range_profile(export_range, chunk_days=DEFAULT_CHUNK_DAYS):
+    """Distinct dimension combinations of the range with their per-source free inflow"""
+    if export_range.from_snapshot:
+        profile = None
+        for chunk_start, chunk_end in iter_chunk_ranges(export_range, chunk_days):
+            df = snapshot.read_snapshot_range(chunk_start, chunk_end, columns=DIMENSION_COLUMNS + SOURCE_COLUMNS)
+            if df is None:
+                break
+            part = _profile_frame(df)
+            profile = part if profile is None else _profile_frame(pd.concat([profile, part]))
+        else:
+            return profile if profile is not None else pd.DataFrame(columns=DIMENSION_COLUMNS + SOURCE_COLUMNS)
+    query, job_config = build_profile_query(export_range)
+    df = query_telemetry.fetch_dataframe(get_client(), query, job_config, kind='export_profile')
+    return dashboard_table.type_dashboard_frame(df)
+
+def positive_int(text):
+    """argparse type for counts that must be at least 1"""
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return value
+
+def _format_value(value):
+    """String form used to match filter values given as text (1.0 -> '1')"""
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+def profile_values(profile):
+    """{dimension: sorted distinct values} of a range profile (or a dataset's .values)"""
+    return {column: sorted(profile[column].unique()) for column in DIMENSION_COLUMNS if column in profile}
+
+def parse_filters(values, raw_filters):
+    """{column: [text values]} -> {column: [typed values]} using the {column: values} present"""
+    column_filters = {}
+    for column, texts in raw_filters.items():
+        if column not in DIMENSION_COLUMNS:
+            raise ValueError(f"Unknown filter column '{column}' (one of {', '.join(DIMENSION_COLUMNS)})")
+        wanted = set(texts)
+        column_filters[column] = [v for v in values.get(column, []) if _format_value(v) in wanted]
+        if not column_filters[column]:
+            raise ValueError(f"No {column} values match {', '.join(texts)}")
+    return column_filters
+
+def parse_filter_items(items):
+    """['COLUMN=V1,V2', ...] command line filters -> {column: [text values]}"""
+    raw_filters = {}
+    for item in items:
+        column, _, values = item.partition('=')
+        raw_filters[column] = values.split(',')
+    return raw_filters
+
+def view_options(view, profile, column_filters, dimension):
+    """Split values and sources fixed over the whole range, so every chunk has the same grid"""
+    options = {}
+    if profile is not None:
+        mask = np.ones(len(profile), dtype=bool)
+        for column, allowed in column_filters.items():
+            mask &= profile[column].isin(allowed).to_numpy()
+        profile = profile[mask]
+    if dimension:
+        options['dimension_values'] = sorted(profile[dimension].unique())
+    if view == 'free_share_by_source':
+        options['sources'] = [s for s in views.FREE_SOURCES if profile[views.source_column(s)].sum() > 0]
+    elif view == 'rtp_by_source':
+        options['sources'] = list(views.FREE_SOURCES)
+    return options
+
+def needs_profile(view, raw_filters=None, dimension=None):
+    return bool(raw_filters) or bool(dimension) or view == 'free_share_by_source'
+
+def iter_view_chunks(export_range, view, raw_filters=None, dimension=None, chunk_days=DEFAULT_CHUNK_DAYS, profile=None):
+    """
+    Yield the view's series one date chunk at a time; each chunk is loaded only when the
+    previous one has been consumed. Bad options raise ValueError before the first chunk.
+    """
+    if chunk_days < 1:
+        raise ValueError(f"chunk_days must be at least 1, got {chunk_days}")
+    if view not in views.VIEWS:
+        raise ValueError(f"Unknown view '{view}' (one of {', '.join(views.VIEWS)})")
+    if dimension and dimension not in DIMENSION_COLUMNS:
+        raise ValueError(f"Unknown dimension '{dimension}'")
+    _, series = views.VIEWS[view]
+    if profile is None and needs_profile(view, raw_filters, dimension):
+        profile = range_profile(export_range, chunk_days)
+    column_filters = parse_filters(profile_values(profile), raw_filters) if raw_filters else {}
+    options = view_options(view, profile, column_filters, dimension)
+    del profile
+
+    for chunk_start, chunk_end in iter_chunk_ranges(export_range, chunk_days):
+        dataset = load_chunk(export_range, chunk_start, chunk_end)
+        rows = dataset.select_rows(None, column_filters) if dataset is not None else ()
+        if len(rows):
+            frame = series(dataset.aggregate(rows, dimension), dimension, (chunk_start, chunk_end), **options)
+            del dataset, rows
+            yield frame
+
+# ============================================================================
+# WRITERS
+# ============================================================================
+
+def stream_csv(frames):
+    header = True
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header).encode('utf-8')
+        header = False
+
+def stream_json(frames):
+    """JSON Lines: one object per series point"""
+    for frame in frames:
+        frame = frame.assign(date=frame['date'].astype(str))
+        yield (frame.to_json(orient='records', lines=True, date_format='iso') + "\n").encode('utf-8')
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what has been written so far (for streaming Parquet)"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+def stream_parquet(frames):
+    """One Parquet row group per chunk"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    writer = None
+    for frame in frames:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table.cast(writer.schema))
+        yield sink.take()
+    if writer is not None:
+        writer.close()
+        yield sink.take()
+
+WRITERS = {'csv': stream_csv, 'parquet': stream_parquet, 'json': stream_json}
+
+def stream_view(export_range, view, fmt, **options):
+    """Bytes of one view in the given format, chunk by chunk"""
+    return WRITERS[fmt](iter_view_chunks(export_range, view, **options))
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+def make_handler():
+    token = os.environ.get('DASHBOARD_EXPORT_TOKEN')
+
+    class ExportHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send_error(self, status, message):
+            body = json.dumps({'error': message}).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/health':
+                return self._send_json({'status': 'ok', 'snapshot': snapshot.status()})
+            if token and self.headers.get('Authorization') != f"Bearer {token}":
+                return self._send_error(401, "Missing or wrong bearer token")
+            if not url.path.startswith('/export/'):
+                return self._send_error(404, "Use /export/<view>.<csv|parquet|json>")
+
+            view, _, fmt = url.path[len('/export/'):].partition('.')
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            try:
+                if fmt not in FORMATS:
+                    raise ValueError(f"Unknown format '{fmt}' (one of {', '.join(FORMATS)})")
+                options = request_options(params)
+                export_range = resolve_range(*parse_date_range(params))
+                if export_range is None:
+                    return self._send_error(404, "No data in the requested date range")
+                # Loads the first chunk, so option errors are still reported as 400s
+                chunks = stream_view(export_range, view, fmt, **options)
+                first = next(chunks, b'')
+            except ValueError as e:
+                return self._send_error(400, str(e))
+
+            self.send_response(200)
+            self.send_header('Content-Type', FORMATS[fmt])
+            self.send_header('Content-Disposition', f'attachment; filename="{view}.{fmt}"')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self._write_chunk(first)
+            for chunk in chunks:
+                self._write_chunk(chunk)
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _send_json(self, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _write_chunk(self, data):
+            if data:
+                self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+
+    return ExportHandler
+
+def parse_date_range(params):
+    """start / end query parameters as dates (None when not given)"""
+    start, end = (date.fromisoformat(params[k]) if params.get(k) else None for k in ('start', 'end'))
+    if start and end and start > end:
+        raise ValueError(f"start {start} is after end {end}")
+    return start, end
+
+def request_options(params):
+    """Query parameters -> iter_view_chunks options"""
+    params = dict(params)
+    params.pop('start', None)
+    params.pop('end', None)
+    chunk_days = int(params.pop('chunk_days', DEFAULT_CHUNK_DAYS))
+    if chunk_days < 1:
+        raise ValueError(f"chunk_days must be at least 1, got {chunk_days}")
+    return {
+        'dimension': params.pop('dimension', None) or None,
+        'chunk_days': chunk_days,
+        'raw_filters': {k: v.split(',') for k, v in params.items()},
+    }
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def export_to_file(export_range, view, fmt, path, options):
+    with open(path, 'wb') as f:
+        for chunk in stream_view(export_range, view, fmt, **options):
+            f.write(chunk)
+    print(f"✅ {view} → {path}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Consumption Dashboard views")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Write views to a file, directory or stdout")
+    export_parser.add_argument('view', choices=list(views.VIEWS) + ['all'])
+    export_parser.add_argument('--format', choices=list(FORMATS), default=None,
+                               help="Output format (default: from the output extension, else csv)")
+    export_parser.add_argument('--start', type=date.fromisoformat, default=None)
+    export_parser.add_argument('--end', type=date.fromisoformat, default=None)
+    export_parser.add_argument('--dimension', choices=DIMENSION_COLUMNS, default=None, help="Split by dimension")
+    export_parser.add_argument('--filter', action='append', default=[], metavar='COLUMN=V1,V2',
+                               help="Keep rows whose COLUMN is one of the values (repeatable)")
+    export_parser.add_argument('--chunk-days', type=positive_int, default=DEFAULT_CHUNK_DAYS)
+    export_parser.add_argument('-o', '--output', default=None,
+                               help="Output file (a directory for 'all'); stdout if omitted")
+
+    serve_parser = subparsers.add_parser('serve', help="Serve exports over HTTP")
+    serve_parser.add_argument('--host', default='127.0.0.1',
+                              help="Bind address (set DASHBOARD_EXPORT_TOKEN before exposing it)")
+    serve_parser.add_argument('--port', type=int, default=8081)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        server = ThreadingHTTPServer((args.host, args.port), make_handler())
+        print(f"✅ Serving exports on http://{args.host}:{args.port}/export/<view>.<format>", file=sys.stderr)
+        server.serve_forever()
+        return
+
+    try:
+        export_range = resolve_range(args.start, args.end)
+        if export_range is None:
+            print("❌ No data available", file=sys.stderr)
+            sys.exit(1)
+        options = {
+            'raw_filters': parse_filter_items(args.filter),
+            'dimension': args.dimension,
+            'chunk_days': args.chunk_days,
+        }
+        if args.view == 'all':
+            if not args.output:
+                raise ValueError("Exporting all views needs -o <directory>")
+            fmt = args.format or 'csv'
+            os.makedirs(args.output, exist_ok=True)
+            if needs_profile('free_share_by_source', **options):
+                # One profile for all five views
+                options['profile'] = range_profile(export_range, args.chunk_days)
+            for view in views.VIEWS:
+                export_to_file(export_range, view, fmt, os.path.join(args.output, f"{view}.{fmt}"), options)
+        elif args.output:
+            fmt = args.format or os.path.splitext(args.output)[1].lstrip('.')
+            fmt = fmt if fmt in FORMATS else 'csv'
+            export_to_file(export_range, args.view, fmt, args.output, options)
+        else:
+            for chunk in stream_view(export_range, args.view, args.format or 'csv', **options):
+                sys.stdout.buffer.write(chunk)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
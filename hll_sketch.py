@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+HyperLogLog++ Sketches
+Decodes BigQuery HLL_COUNT.INIT sketches (players_sketch column) and merges them in NumPy,
+so unique players can be counted for any filter / split without going back to the
+player-grain table. Per-cell `players` counts are not additive; merged sketches are.
+
+Sketch format (ZetaSketch AggregatorStateProto, HLL++ state in extension field 112):
+- precision_or_num_buckets (p) and sparse_precision_or_num_buckets (sp)
+- dense `data`: one byte per register (2^p registers)
+- sparse `sparse_data`: sorted, difference + varint encoded sparse values
+
+Counts use Ertl's improved estimator, unbiased across the range without HLL++'s empirical
+bias tables; relative standard error is 1.04 / sqrt(2^p), about 0.8% at p = 14.
+"""
+
+import numpy as np
+
+HLL_STATE_FIELD = 112       # AggregatorStateProto extension holding the HLL++ state
+FIELD_SPARSE_SIZE = 2
+FIELD_PRECISION = 3
+FIELD_SPARSE_PRECISION = 4
+FIELD_DATA = 5
+FIELD_SPARSE_DATA = 6
+
+RHOW_BITS = 6
+RHOW_MASK = (1 << RHOW_BITS) - 1
+
+# ============================================================================
+# PROTO PARSING
+# ============================================================================
+
+def _read_varint(buf, pos):
+    """Read a base-128 varint from buf at pos, return (value, new_pos)"""
+    result = 0
+    shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def _parse_fields(buf):
+    """Parse a protobuf message into {field_number: value} (last value wins)"""
+    fields = {}
+    pos = 0
+    end = len(buf)
+    while pos < end:
+        key, pos = _read_varint(buf, pos)
+        field_number, wire_type = key >> 3, key & 0x7
+        if wire_type == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == 2:
+            length, pos = _read_varint(buf, pos)
+            value = buf[pos:pos + length]
+            pos += length
+        elif wire_type == 1:
+            value = buf[pos:pos + 8]
+            pos += 8
+        elif wire_type == 5:
+            value = buf[pos:pos + 4]
+            pos += 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        fields[field_number] = value
+    return fields
+
+def parse_sketch(blob):
+    """Return (precision, sparse_precision, dense_data, sparse_data) for one HLL_COUNT sketch"""
+    state = _parse_fields(_parse_fields(bytes(blob)).get(HLL_STATE_FIELD, b''))
+    return (
+        state.get(FIELD_PRECISION, 0),
+        state.get(FIELD_SPARSE_PRECISION, 0),
+        state.get(FIELD_DATA, b''),
+        state.get(FIELD_SPARSE_DATA, b''),
+    )
+
+# ============================================================================
+# DECODING
+# ============================================================================
+
+def _decode_varints(buf):
+    """Vectorized decode of a buffer of concatenated varints; returns (values, end_byte_positions)"""
+    data = np.frombuffer(buf, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero((data & 0x80) == 0)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    varint_id = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shift = (np.arange(len(data)) - starts[varint_id]) * 7
+    parts = (data & 0x7F).astype(np.float64) * np.exp2(shift)
+    values = np.bincount(varint_id, weights=parts, minlength=len(ends)).astype(np.int64)
+    return values, ends
+
+def _bit_length(values):
+    """Bit length of non-negative integers (0 -> 0)"""
+    return np.frexp(values.astype(np.float64))[1].astype(np.int64)
+
+def _downgrade(indices, rhos, from_precision, to_precision):
+    """Re-express (index, rhoW) registers at a lower precision"""
+    if from_precision == to_precision:
+        return indices, rhos
+    shift = from_precision - to_precision
+    low = indices & ((1 << shift) - 1)
+    rhos = np.where(low != 0, shift - _bit_length(low) + 1, rhos + shift)
+    return indices >> shift, rhos
+
+class DecodedSketches:
+    """
+    Sketches of many rows decoded once into CSR form at a common precision:
+    registers of row i are indices[offsets[i]:offsets[i + 1]] with values rhos[...]
+    """
+
+    def __init__(self, offsets, indices, rhos, precision):
+        self.offsets = offsets
+        self.indices = indices
+        self.rhos = rhos
+        self.precision = precision
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.indices.nbytes + self.rhos.nbytes
+
+def slice_sketches(sketches, start, end, copy=False):
+    """Sketches of rows start..end-1 (views of the same buffers unless copy=True)"""
+    first, last = sketches.offsets[start], sketches.offsets[end]
+    offsets = sketches.offsets[start:end + 1] - first
+    indices = sketches.indices[first:last]
+    rhos = sketches.rhos[first:last]
+    if copy:
+        indices, rhos = indices.copy(), rhos.copy()
+    return DecodedSketches(offsets, indices, rhos, sketches.precision)
+
+def concat_sketches(parts):
+    """Row-wise concatenation of DecodedSketches, at the lowest precision among them"""
+    precision = min(part.precision for part in parts)
+    indices = []
+    rhos = []
+    counts = []
+    for part in parts:
+        idx, rho = _downgrade(part.indices.astype(np.int64), part.rhos.astype(np.int64), part.precision, precision)
+        indices.append(idx)
+        rhos.append(rho)
+        counts.append(np.diff(part.offsets))
+    offsets = np.concatenate(([0], np.cumsum(np.concatenate(counts)))).astype(np.int64)
+    return DecodedSketches(offsets, np.concatenate(indices).astype(np.uint32),
+                           np.concatenate(rhos).astype(np.uint8), precision)
+
+def decode_sketches(blobs):
+    """Decode a sequence of sketches (bytes or None) into DecodedSketches"""
+    parsed = [parse_sketch(b) if b is not None else None for b in blobs]
+    precisions = {p[0] for p in parsed if p is not None and p[0]}
+    precision = min(precisions) if precisions else 14
+
+    row_indices = []
+    row_rhos = []
+    counts = np.zeros(len(parsed), dtype=np.int64)
+
+    # Sparse sketches: concatenate all sparse_data buffers and decode them in one pass
+    sparse_rows = [i for i, p in enumerate(parsed) if p is not None and p[3]]
+    if sparse_rows:
+        buffers = [parsed[i][3] for i in sparse_rows]
+        values, ends = _decode_varints(b''.join(buffers))
+        byte_ends = np.cumsum([len(b) for b in buffers])
+        value_ends = np.searchsorted(ends, byte_ends - 1, side='right')
+        value_starts = np.concatenate(([0], value_ends[:-1]))
+        # Values are difference encoded per sketch: undo with a segmented cumulative sum
+        totals = np.cumsum(values)
+        segment_base = np.concatenate(([0], totals))[value_starts]
+        values = totals - np.repeat(segment_base, value_ends - value_starts)
+        row_of_value = np.repeat(np.arange(len(sparse_rows)), value_ends - value_starts)
+
+        # Sparse precision and normal precision can differ per sketch in theory; group by them
+        sketch_p = np.array([parsed[i][0] for i in sparse_rows])[row_of_value]
+        sketch_sp = np.array([parsed[i][1] for i in sparse_rows])[row_of_value]
+        for p, sp in set(zip(sketch_p.tolist(), sketch_sp.tolist())):
+            sel = (sketch_p == p) & (sketch_sp == sp)
+            v = values[sel]
+            flag = 1 << max(sp, p + RHOW_BITS)
+            rho_encoded = (v & flag) != 0
+            suffix_bits = sp - p
+            idx = np.where(rho_encoded, (v ^ flag) >> RHOW_BITS, v >> suffix_bits)
+            suffix = v & ((1 << suffix_bits) - 1)
+            rho = np.where(rho_encoded, (v & RHOW_MASK) + suffix_bits, suffix_bits - _bit_length(suffix) + 1)
+            idx, rho = _downgrade(idx, rho, p, precision)
+            rows = np.asarray(sparse_rows)[row_of_value[sel]]
+            row_indices.append((rows, idx, rho))
+
+    # Dense sketches: one byte per register
+    for i, p in enumerate(parsed):
+        if p is None or p[3] or not p[2]:
+            continue
+        registers = np.frombuffer(p[2], dtype=np.uint8)
+        idx = np.flatnonzero(registers)
+        rho = registers[idx].astype(np.int64)
+        idx, rho = _downgrade(idx, rho, p[0], precision)
+        row_indices.append((np.full(len(idx), i), idx, rho))
+
+    if row_indices:
+        rows = np.concatenate([r[0] for r in row_indices])
+        idx = np.concatenate([r[1] for r in row_indices])
+        rho = np.concatenate([r[2] for r in row_indices])
+        order = np.argsort(rows, kind='stable')
+        rows, idx, rho = rows[order], idx[order], rho[order]
+        counts = np.bincount(rows, minlength=len(parsed))
+    else:
+        idx = np.zeros(0, dtype=np.int64)
+        rho = np.zeros(0, dtype=np.int64)
+
+    offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+    return DecodedSketches(offsets, idx.astype(np.uint32), rho.astype(np.uint8), precision)
+
+# ============================================================================
+# MERGE AND ESTIMATE
+# ============================================================================
+
+def merge_registers(sketches, rows, group_codes, n_groups):
+    """
+    Merge the sketches of `rows` into one HLL register array per group.
+    group_codes[k] is the group of rows[k]; returns uint8 array of shape (n_groups, 2^p).
+    """
+    m = 1 << sketches.precision
+    registers = np.zeros(n_groups * m, dtype=np.uint8)
+    rows = np.asarray(rows, dtype=np.int64)
+    if len(rows) == 0:
+        return registers.reshape(n_groups, m)
+    starts = sketches.offsets[rows]
+    lengths = sketches.offsets[rows + 1] - starts
+    total = int(lengths.sum())
+    if total:
+        # Gather every register of every selected row without a Python loop
+        positions = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths) + np.arange(total)
+        groups = np.repeat(np.asarray(group_codes, dtype=np.int64), lengths)
+        flat = groups * m + sketches.indices[positions]
+        np.maximum.at(registers, flat, sketches.rhos[positions])
+    return registers.reshape(n_groups, m)
+
+def _sigma(x):
+    """sigma(x) = x + sum_k x^(2^k) 2^(k-1), elementwise (inf at x = 1)"""
+    x = np.asarray(x, dtype=np.float64).copy()
+    empty = x == 1
+    z = x.copy()
+    y = np.ones_like(x)
+    with np.errstate(over='ignore', invalid='ignore'):
+        for _ in range(64):
+            x = x * x
+            previous = z
+            z = z + x * y
+            y = y + y
+            if np.array_equal(z, previous):
+                break
+    return np.where(empty, np.inf, z)
+
+def _tau(x):
+    """tau(x) = (1 - x - sum_k (1 - x^(2^-k))^2 2^-k) / 3, elementwise (0 at x = 0 and 1)"""
+    x = np.asarray(x, dtype=np.float64).copy()
+    edge = (x == 0) | (x == 1)
+    z = 1 - x
+    y = np.ones_like(x)
+    for _ in range(64):
+        x = np.sqrt(x)
+        previous = z
+        y = y * 0.5
+        z = z - (1 - x) ** 2 * y
+        if np.array_equal(z, previous):
+            break
+    return np.where(edge, 0.0, z / 3)
+
+def estimate_cardinality(registers):
+    """
+    Estimate per row of a (n_groups, m) register array with Ertl's improved estimator
+    ("New cardinality estimation algorithms for HyperLogLog sketches", 2017): it corrects
+    the raw HyperLogLog bias over the whole range, small and mid cardinalities included,
+    without HLL++'s empirical bias tables. Relative standard error is about 1.04 / sqrt(m).
+    """
+    registers = np.atleast_2d(registers)
+    n_groups, m = registers.shape
+    q = 64 - int(np.log2(m))                    # 64-bit hashes: register values 0..q + 1
+    values = np.minimum(registers, q + 1).astype(np.int64) + (np.arange(n_groups) * (q + 2))[:, None]
+    histogram = np.bincount(values.ravel(), minlength=n_groups * (q + 2)).reshape(n_groups, q + 2)
+
+    z = m * _tau(1 - histogram[:, q + 1] / m)
+    for k in range(q, 0, -1):
+        z = 0.5 * (z + histogram[:, k])
+    z = z + m * _sigma(histogram[:, 0] / m)
+    return m * m / (2 * np.log(2)) / z
+
+def relative_error(precision):
+    """Relative standard error of estimates at a sketch precision"""
+    return 1.04 / np.sqrt(1 << precision)
+
+def count_unique(sketches, rows, group_codes=None, n_groups=1):
+    """Estimated unique players per group for the given rows"""
+    rows = np.asarray(rows, dtype=np.int64)
+    if group_codes is None:
+        group_codes = np.zeros(len(rows), dtype=np.int64)
+    registers = merge_registers(sketches, rows, group_codes, n_groups)
+    estimates = estimate_cardinality(registers)
+    estimates[(registers == 0).all(axis=1)] = 0
+    return estimates
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Load Test Harness for the Consumption Dashboard
+Drives many concurrent simulated sessions through main() in one process, as one Cloud Run
+instance serves them, and reports rerun latency, CPU and memory at each concurrency level.
+
+- Sessions are Streamlit AppTest instances; each runs in its own thread
+- Login is bypassed by the test hook: the session state authenticate_user() sets after a
+  verified OAuth login is set before the first run (no call to Google)
+- BigQuery is replaced by SyntheticBigQuery, which serves generated rows of the dashboard
+  table (same columns, dry runs, paged results) with an optional per-query delay
+- Every session plays the same script with its own random choices: first load, move the
+  date slider and apply, filter a dimension and apply, split, smooth, reset
+
+The dataset is shared by every session (as in production), so the first session's load is
+reported separately as the cold start and the levels measure warm reruns. Latencies include
+AppTest's own element-tree overhead, so treat them as an upper bound of the server time.
+
+Usage:
+    # 1, 2, 4, 8 and 16 concurrent sessions, 3 passes of the script each, 365 days of data
+    python load_test.py
+
+    # Bigger table, slower BigQuery, explicit levels
+    python load_test.py --days 730 --query-delay 2 --concurrency 1,4,8,32 --iterations 5
+"""
+
+import argparse
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CONCURRENCY = '1,2,4,8,16'
+DEFAULT_DAYS = 365
+RERUN_TIMEOUT_SECONDS = 300
+LOAD_TEST_EMAIL = 'load-test@peerplay.com'
+
+# ============================================================================
+# SYNTHETIC BIGQUERY
+# ============================================================================
+
+DIMENSION_VALUES = {
+    'first_chapter_bucket': ['0-10', '11-20', '21-50', '50+'],
+    'is_us_player': [0, 1],
+    'last_balance_bucket': ['0-100', '101-300', '301-500', '501-1000', '1001-3000', '3001-5000', '5000+'],
+    'last_version_of_day': [1.0, 1.1, 1.2, 2.0],
+    'paid_today_flag': [0, 1],
+    'paid_ever_flag': [0, 1],
+}
+PAID_SOURCES = ['rewards_store', 'rewards_rolling_offer_collect', 'rewards_disco']
+
+def synthetic_table(days, cells_per_day, seed=0):
+    """Rows of the dashboard table for the `days` days up to yesterday, totals consistent with the sources"""
+    from dashboard_table import NUMERIC_FIELDS
+    rng = np.random.default_rng(seed)
+    n = days * cells_per_day
+    end = date.today() - timedelta(days=1)
+    df = pd.DataFrame({'date': np.repeat([end - timedelta(days=d) for d in range(days)], cells_per_day)})
+    for dimension, values in DIMENSION_VALUES.items():
+        df[dimension] = np.asarray(values, dtype=object if isinstance(values[0], str) else None)[
+            rng.integers(0, len(values), n)]
+    for field in NUMERIC_FIELDS:
+        if field.endswith('_sum_value'):
+            df[field] = rng.gamma(1.5, 400, n).round()
+        elif field.endswith('_cnt') or field == 'players':
+            df[field] = rng.integers(1, 200, n)
+    inflow = [c for c in df.columns if c.endswith('_inflow_sum_value')]
+    paid = [f'{s}_inflow_sum_value' for s in PAID_SOURCES]
+    df['total_inflow'] = df[inflow].sum(axis=1)
+    df['total_paid_inflow'] = df[paid].sum(axis=1)
+    df['total_free_inflow'] = df['total_inflow'] - df['total_paid_inflow']
+    df['total_outflow'] = df[[c for c in df.columns if c.endswith('_outflow_sum_value')]].sum(axis=1)
+    return df
+
+class _Field:
+    def __init__(self, name):
+        self.name = name
+
+class _Table:
+    def __init__(self, df):
+        self.schema = [_Field(c) for c in df.columns]
+        self.num_rows = len(df)
+        self.modified = None
+
+class _Job:
+    """The parts of a QueryJob / RowIterator the dashboard uses"""
+
+    def __init__(self, df, total_bytes_processed=0):
+        self.df = df
+        self.total_bytes_processed = total_bytes_processed
+        self.page_size = None
+
+    def to_dataframe(self, *args, **kwargs):
+        return self.df.copy()
+
+    def to_arrow(self, *args, **kwargs):
+        import pyarrow as pa
+        return pa.Table.from_pandas(self.df, preserve_index=False)
+
+    def result(self, page_size=None, **kwargs):
+        self.page_size = page_size
+        return self
+
+    def to_dataframe_iterable(self, *args, **kwargs):
+        page_size = self.page_size or max(len(self.df), 1)
+        for start in range(0, len(self.df), page_size):
+            yield self.df.iloc[start:start + page_size].reset_index(drop=True)
+
+    def to_arrow_iterable(self, *args, **kwargs):
+        import pyarrow as pa
+        for page in self.to_dataframe_iterable():
+            yield pa.RecordBatch.from_pandas(page, preserve_index=False)
+
+    def __iter__(self):
+        return iter(self.df.to_dict('records'))
+
+class SyntheticBigQuery:
+    """BigQuery client stand-in serving a generated dashboard table (thread-safe, read-only)"""
+
+    def __init__(self, days=DEFAULT_DAYS, cells_per_day=600, query_delay=0.0, seed=0):
+        self.table = synthetic_table(days, cells_per_day, seed)
+        self.query_delay = query_delay
+        self.queries = 0
+        self._lock = threading.Lock()
+
+    def get_table(self, table_id):
+        return _Table(self.table)
+
+    def query(self, query, job_config=None, **kwargs):
+        df = self.table
+        if 'MIN(date)' in query:
+            return _Job(pd.DataFrame({'min_date': [df['date'].min()], 'max_date': [df['date'].max()]}))
+        if 'FROM `' not in query or 'fact_consumption_daily_dashboard' not in query:
+            # Player-grain drilldown: not part of the scripted sessions
+            return _Job(pd.DataFrame())
+
+        interval = re.search(r'INTERVAL (\d+) DAY', query)
+        if interval:
+            df = df[df['date'] >= date.today() - timedelta(days=int(interval.group(1)))]
+        for param in getattr(job_config, 'query_parameters', None) or []:
+            if param.name == 'start_date':
+                df = df[df['date'] >= param.value]
+            elif param.name == 'end_date':
+                df = df[df['date'] <= param.value]
+        columns = [c for c in df.columns if re.search(rf'\b{c}\b', query)]
+
+        if getattr(job_config, 'dry_run', False):
+            return _Job(None, total_bytes_processed=len(df) * len(columns) * 8)
+        with self._lock:
+            self.queries += 1
+        if self.query_delay:
+            time.sleep(self.query_delay)
+        return _Job(df[columns])
+
+# ============================================================================
+# SESSIONS
+# ============================================================================
+
+_client = {}
+_client_lock = threading.Lock()
+_client_options = {}
+
+def run_dashboard():
+    """AppTest entry point: the dashboard with the synthetic client, in the test's session"""
+    import consumption_dashboard
+    with _client_lock:
+        if 'client' not in _client:
+            _client['client'] = SyntheticBigQuery(**_client_options)
+    consumption_dashboard.init_bigquery_client = lambda: _client['client']
+    consumption_dashboard.main()
+
+def _app_script():
+    import load_test
+    load_test.run_dashboard()
+
+def share_runtime():
+    """
+    AppTest installs a mock Runtime singleton for each run and clears it when the run ends,
+    under the feet of the sessions still running in other threads: keep serving the last one
+    """
+    from streamlit.runtime.runtime import Runtime
+    last = {}
+
+    def instance(cls):
+        if cls._instance is not None:
+            last['runtime'] = cls._instance
+        elif 'runtime' not in last:
+            raise RuntimeError("Runtime hasn't been created!")
+        return last['runtime']
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or 'runtime' in last)
+
+def _sidebar_widget(at, kind, label):
+    return next(w for w in getattr(at.sidebar, kind) if w.label == label)
+
+def _timed_run(at, latencies):
+    start = time.perf_counter()
+    at.run(timeout=RERUN_TIMEOUT_SECONDS)
+    latencies.append(time.perf_counter() - start)
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+def new_session():
+    """An AppTest session that is already logged in (the login test hook)"""
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_function(_app_script, default_timeout=RERUN_TIMEOUT_SECONDS)
+    at.session_state['authenticated'] = True
+    at.session_state['user_email'] = LOAD_TEST_EMAIL
+    at.session_state['user_name'] = 'Load Test'
+    return at
+
+def play_session(session_id, iterations, seed):
+    """One simulated user: the scripted interactions, `iterations` times; returns rerun latencies"""
+    rng = random.Random(seed * 1000 + session_id)
+    at = new_session()
+    latencies = []
+    _timed_run(at, latencies)
+    for _ in range(iterations):
+        # Date slider to a random window of at least a week, then apply
+        slider = _sidebar_widget(at, 'slider', "Select Date Range")
+        last = slider.max
+        start = rng.randint(0, max(last - 7, 0))
+        slider.set_value((start, rng.randint(min(start + 7, last), last)))
+        _timed_run(at, latencies)
+        _sidebar_widget(at, 'button', "✅ Apply Filters").click()
+        _timed_run(at, latencies)
+
+        # One dimension filter, then apply
+        multiselect = rng.choice(list(at.sidebar.multiselect))
+        multiselect.set_value(rng.sample(list(multiselect.options), k=1))
+        _timed_run(at, latencies)
+        _sidebar_widget(at, 'button', "✅ Apply Filters").click()
+        _timed_run(at, latencies)
+
+        # Split and smoothing
+        split = _sidebar_widget(at, 'selectbox', "Split by Dimension")
+        split.select(rng.choice(split.options[1:]))
+        _timed_run(at, latencies)
+        smoothing = _sidebar_widget(at, 'radio', "Smoothing")
+        smoothing.set_value(rng.choice(smoothing.options))
+        _timed_run(at, latencies)
+
+        # Back to the default view
+        split.select(split.options[0])
+        multiselect.set_value([])
+        _sidebar_widget(at, 'button', "✅ Apply Filters").click()
+        _timed_run(at, latencies)
+    return latencies
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+def _cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def _rss_mb():
+    """Current resident set size (Linux /proc), else the peak"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+def _peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    scale = 1e6 if sys.platform == 'darwin' else 1e3
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def run_level(concurrency, iterations, seed):
+    """All sessions of one concurrency level at once; returns the level's report row"""
+    cpu_start, wall_start = _cpu_seconds(), time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(play_session, i, iterations, seed) for i in range(concurrency)]
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - wall_start
+    latencies = np.concatenate([np.asarray(r) for r in results])
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'sessions': concurrency,
+        'reruns': len(latencies),
+        'p50': p50, 'p95': p95, 'p99': p99,
+        'reruns_per_second': len(latencies) / wall,
+        'cpu_percent': 100 * (_cpu_seconds() - cpu_start) / wall,
+        'rss_mb': _rss_mb(),
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+def format_row(row):
+    return (f"{row['sessions']:>8} {row['reruns']:>7} {row['p50']:>7.2f}s {row['p95']:>7.2f}s {row['p99']:>7.2f}s "
+            f"{row['reruns_per_second']:>8.1f} {row['cpu_percent']:>6.0f}% {row['rss_mb']:>8.0f} {row['peak_rss_mb']:>8.0f}")
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test of the Consumption Dashboard")
+    parser.add_argument('--concurrency', default=DEFAULT_CONCURRENCY,
+                        help=f"Comma-separated concurrent session counts, run in order (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--iterations', type=int, default=3, help="Passes of the interaction script per session")
+    parser.add_argument('--days', type=int, default=DEFAULT_DAYS, help="Days of synthetic data")
+    parser.add_argument('--cells-per-day', type=int, default=600, help="Synthetic rows per day")
+    parser.add_argument('--query-delay', type=float, default=0.0, metavar='SECONDS',
+                        help="Simulated BigQuery latency per query")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        levels = [int(c) for c in args.concurrency.split(',')]
+    except ValueError:
+        print(f"❌ --concurrency must be comma-separated integers, got {args.concurrency!r}")
+        sys.exit(1)
+
+    # An empty snapshot directory, so the cold start goes through the (synthetic) BigQuery load
+    os.environ['DASHBOARD_SNAPSHOT_DIR'] = tempfile.mkdtemp(prefix='consumption_load_test_')
+    # The app script's `import load_test` must see this module's client options, not a fresh copy
+    sys.modules.setdefault('load_test', sys.modules[__name__])
+    _client_options.update(days=args.days, cells_per_day=args.cells_per_day,
+                           query_delay=args.query_delay, seed=args.seed)
+
+    from streamlit.testing.v1.util import patch_config_options
+    # AppTest switches this option on for each run and back off when the run ends, which would
+    # switch it off under the other sessions still running; holding it on makes the nesting safe
+    with patch_config_options({'global.appTest': True, 'logger.level': 'error'}):
+        share_runtime()
+        run_levels(args, levels)
+
+def run_levels(args, levels):
+    start = time.perf_counter()
+    cold = []
+    try:
+        _timed_run(new_session(), cold)
+    except Exception as e:
+        print(f"❌ Dashboard failed to load: {e}")
+        sys.exit(1)
+    print(f"🧮 Cold start: {cold[0]:.2f}s ({args.days} days x {args.cells_per_day} rows, "
+          f"RSS {_rss_mb():.0f} MB)")
+
+    print(f"{'sessions':>8} {'reruns':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'rerun/s':>8} {'CPU':>7} "
+          f"{'RSS MB':>8} {'peak MB':>8}")
+    for concurrency in levels:
+        try:
+            print(format_row(run_level(concurrency, args.iterations, args.seed)), flush=True)
+        except Exception as e:
+            print(f"❌ Level {concurrency} failed: {e}")
+            sys.exit(1)
+    print(f"✅ Done in {time.perf_counter() - start:.0f}s, {_client['client'].queries} BigQuery queries")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Metric Registry
+Every ratio metric of the dashboard is defined once, as numerator / denominator, each a sum
+of table columns (optionally its absolute value: outflow is stored as negative credits).
+Ratios are percentages, 0 where the denominator is not positive. A definition compiles to:
+- NumPy: a list of metrics becomes two coefficient matrices, so any number of metrics over
+  any number of groups is two matrix products and one division (no per-metric Python)
+- SQL: BigQuery aggregate expressions, to compute the same metrics in a pushdown query
+
+Per-source metrics (free share, RTP) are families built from a list of sources.
+
+Usage (print the pushdown query):
+    python metrics.py [--dimension is_us_player] [--start 2025-01-01 --end 2025-01-31] [metric keys...]
+"""
+
+import argparse
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+DASHBOARD_TABLE = "yotam-395120.peerplay.fact_consumption_daily_dashboard"
+
+# columns: summed table columns; absolute: take the absolute value of the sum
+Sum = namedtuple('Sum', ['columns', 'absolute'])
+# key: SQL-safe identifier; label: display name
+Metric = namedtuple('Metric', ['key', 'label', 'numerator', 'denominator'])
+
+def total(*columns, absolute=False):
+    return Sum(tuple(columns), absolute)
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+INFLOW = total('total_inflow')
+FREE_INFLOW = total('total_free_inflow')
+PAID_INFLOW = total('total_paid_inflow')
+OUTFLOW = total('total_outflow', absolute=True)
+
+CONSUMPTION = Metric('consumption_pct', 'Consumption %', OUTFLOW, INFLOW)
+RTP = Metric('rtp_pct', 'RTP %', FREE_INFLOW, OUTFLOW)
+FREE_SHARE = Metric('free_share_pct', 'Free Share %', FREE_INFLOW, INFLOW)
+PAID_SHARE = Metric('paid_share_pct', 'Paid Share %', PAID_INFLOW, INFLOW)
+
+METRICS = {metric.key: metric for metric in [CONSUMPTION, RTP, FREE_SHARE, PAID_SHARE]}
+
+def source_free_shares(sources, column):
+    """Each source's share of the free inflow of all the given sources (column(source) -> table column)"""
+    all_sources = total(*[column(s) for s in sources])
+    return [Metric(f'{s}_free_share_pct', s, total(column(s)), all_sources) for s in sources]
+
+def source_rtps(sources, column):
+    """Each source's free inflow as a share of outflow"""
+    return [Metric(f'{s}_rtp_pct', s, total(column(s)), OUTFLOW) for s in sources]
+
+# ============================================================================
+# NUMPY
+# ============================================================================
+
+class CompiledMetrics:
+    """A list of metrics compiled to coefficient matrices over the columns they use"""
+
+    def __init__(self, metrics):
+        self.metrics = list(metrics)
+        parts = [m.numerator for m in self.metrics] + [m.denominator for m in self.metrics]
+        self.columns = list(dict.fromkeys(c for part in parts for c in part.columns))
+        index = {c: i for i, c in enumerate(self.columns)}
+        self._numerator = np.zeros((len(self.metrics), len(self.columns)))
+        self._denominator = np.zeros((len(self.metrics), len(self.columns)))
+        for i, metric in enumerate(self.metrics):
+            self._numerator[i, [index[c] for c in metric.numerator.columns]] = 1
+            self._denominator[i, [index[c] for c in metric.denominator.columns]] = 1
+        self._numerator_abs = np.array([[m.numerator.absolute] for m in self.metrics])
+        self._denominator_abs = np.array([[m.denominator.absolute] for m in self.metrics])
+
+    def evaluate(self, sums):
+        """(n_metrics, n_groups) array from per-group column sums (DataFrame or {column: array})"""
+        values = np.vstack([np.asarray(sums[c], dtype=np.float64) for c in self.columns])
+        numerator = self._numerator @ values
+        denominator = self._denominator @ values
+        numerator = np.where(self._numerator_abs, np.abs(numerator), numerator)
+        denominator = np.where(self._denominator_abs, np.abs(denominator), denominator)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denominator > 0, numerator / denominator * 100, 0.0)
+
+def compile_numpy(metrics):
+    return CompiledMetrics(metrics)
+
+def evaluate(metric, sums):
+    """One metric over per-group column sums"""
+    return CompiledMetrics([metric]).evaluate(sums)[0]
+
+# ============================================================================
+# SQL
+# ============================================================================
+
+def _sum_sql(part):
+    terms = " + ".join(f"COALESCE(SUM({c}), 0)" for c in part.columns)
+    if part.absolute:
+        return f"ABS({terms})"
+    return f"({terms})" if len(part.columns) > 1 else terms
+
+def metric_sql(metric):
+    """Aggregate SQL expression of a metric (use with GROUP BY)"""
+    numerator, denominator = _sum_sql(metric.numerator), _sum_sql(metric.denominator)
+    return f"CASE WHEN {denominator} > 0 THEN 100 * {numerator} / {denominator} ELSE 0 END"
+
+def compile_sql(metrics, table=DASHBOARD_TABLE, keys=('date',), where=None):
+    """Pushdown query: the metrics per key (date[, dimension]) computed by BigQuery"""
+    select = ",\n    ".join(list(keys) + [f"{metric_sql(m)} AS {m.key}" for m in metrics])
+    group = ", ".join(keys)
+    where_sql = f"WHERE {where}\n" if where else ""
+    return f"SELECT\n    {select}\nFROM `{table}`\n{where_sql}GROUP BY {group}\nORDER BY {group}"
+
+def main():
+    import views
+
+    families = {
+        'free_share_by_source': source_free_shares(views.FREE_SOURCES, views.source_column),
+        'rtp_by_source': source_rtps(views.FREE_SOURCES, views.source_column),
+    }
+    parser = argparse.ArgumentParser(description="Print the BigQuery pushdown query of dashboard metrics")
+    parser.add_argument('metrics', nargs='*',
+                        help=f"Metric keys or per-source families, of: {', '.join(list(METRICS) + list(families))} "
+                             "(default: all single metrics)")
+    parser.add_argument('--dimension', default=None, help="Split by this column as well as by date")
+    parser.add_argument('--start', type=date.fromisoformat, default=None)
+    parser.add_argument('--end', type=date.fromisoformat, default=None)
+    parser.add_argument('--table', default=DASHBOARD_TABLE)
+    args = parser.parse_args()
+    unknown = [key for key in args.metrics if key not in METRICS and key not in families]
+    if unknown:
+        parser.error(f"unknown metrics: {', '.join(unknown)}")
+
+    selected = []
+    for key in args.metrics or list(METRICS):
+        selected.extend(families.get(key) or [METRICS[key]])
+    conditions = []
+    if args.start:
+        conditions.append(f"date >= '{args.start}'")
+    if args.end:
+        conditions.append(f"date <= '{args.end}'")
+    keys = ('date', args.dimension) if args.dimension else ('date',)
+    print(compile_sql(selected, args.table, keys, " AND ".join(conditions) or None))
+
+if __name__ == "__main__":
+    main()
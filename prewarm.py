@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Prewarm Job for the Consumption Dashboard
+Headless: authenticates with the service account, runs the default dashboard query, builds
+the shared dataset and the default chart aggregations, and writes a snapshot the dashboard
+serves instead of querying BigQuery on the first request (see snapshot.py).
+
+Runs as its own Cloud Run job on a schedule (cloudbuild.yaml) and writes to a shared
+DASHBOARD_SNAPSHOT_DIR (a Cloud Storage mount) that the serving instances read, so they
+never hold a second copy of the dataset or write snapshots to their own /tmp.
+
+Usage:
+    # Load and write the snapshot
+    python prewarm.py
+
+    # Only if the snapshot is missing or stale
+    python prewarm.py --if-stale
+
+    # Keep the snapshot fresh: refresh every 30 minutes (waits one interval first)
+    python prewarm.py --every 1800
+
+    # Is the snapshot fresh? (exit 0 only if a fresh snapshot exists)
+    python prewarm.py --check
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import snapshot
+
+PROJECT_ID = "yotam-395120"
+
+# ============================================================================
+# BIGQUERY CONNECTION
+# ============================================================================
+
+def init_bigquery_client():
+    """Service account (JSON env var or file), then Application Default Credentials (Cloud Run service account)"""
+    from google.auth import default
+    from google.cloud import bigquery
+    from google.oauth2 import service_account
+
+    creds_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS_JSON')
+    if creds_json:
+        credentials = service_account.Credentials.from_service_account_info(json.loads(creds_json))
+        return bigquery.Client(credentials=credentials, project=PROJECT_ID)
+    creds_path = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
+    if creds_path and os.path.exists(creds_path):
+        credentials = service_account.Credentials.from_service_account_file(creds_path)
+        return bigquery.Client(credentials=credentials, project=PROJECT_ID)
+    credentials, _ = default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+    return bigquery.Client(credentials=credentials, project=PROJECT_ID)
+
+# ============================================================================
+# PREWARM
+# ============================================================================
+
+def prewarm(client, date_limit_days=None):
+    """Load the default dataset, build the default aggregations and write the snapshot"""
+    from dashboard_table import query_dashboard_table
+    from shared_dataset import SharedDataset, DIMENSION_COLUMNS
+
+    start = time.time()
+    df = query_dashboard_table(client, date_limit_days)
+    load_seconds = time.time() - start
+    if len(df) == 0:
+        raise RuntimeError("Dashboard query returned no rows")
+
+    # Build what the first page view needs, so a broken snapshot fails here and not for a user
+    start = time.time()
+    dataset = SharedDataset.from_frame(df)
+    rows = dataset.select_rows()
+    dataset.aggregate(rows)
+    for dimension in DIMENSION_COLUMNS:
+        if dimension in dataset.codes:
+            dataset.aggregate(rows, dimension)
+    build_seconds = time.time() - start
+
+    metadata = snapshot.write_snapshot(df, date_limit_days, extra={
+        'load_seconds': round(load_seconds, 2),
+        'build_seconds': round(build_seconds, 2),
+        'dataset_bytes': dataset.nbytes,
+    })
+    print(f"✅ Snapshot written: {metadata['rows']:,} rows ({metadata['min_date']} to {metadata['max_date']}), "
+          f"query {load_seconds:.1f}s, build {build_seconds:.1f}s → {snapshot.SNAPSHOT_DIR}")
+    return metadata
+
+def main():
+    parser = argparse.ArgumentParser(description="Prewarm the Consumption Dashboard snapshot")
+    parser.add_argument('--days', type=int, default=None,
+                        help="History to load in days (default: all, same as the dashboard)")
+    parser.add_argument('--check', action='store_true',
+                        help="Exit 0 if a fresh snapshot exists, 1 otherwise")
+    parser.add_argument('--if-stale', action='store_true',
+                        help="Skip the load when a fresh snapshot already exists")
+    parser.add_argument('--every', type=int, default=None, metavar='SECONDS',
+                        help="Refresh the snapshot every SECONDS (runs until stopped)")
+    args = parser.parse_args()
+
+    if args.check:
+        state = snapshot.status()
+        print(json.dumps(state))
+        sys.exit(0 if state['warm'] else 1)
+
+    if args.if_stale and snapshot.status()['warm']:
+        print("✅ Snapshot is fresh, nothing to do")
+        return
+
+    client = init_bigquery_client()
+    while True:
+        if args.every:
+            time.sleep(args.every)
+        try:
+            prewarm(client, args.days)
+        except Exception as e:
+            print(f"❌ Prewarm failed: {e}")
+            if not args.every:
+                sys.exit(1)
+        if not args.every:
+            return
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+Incremental Refresh Job for the fact_consumption_daily tables
+
+Instead of rebuilding the whole table with CREATE OR REPLACE, this job:
+- Tracks a per-table watermark (last fully refreshed date) in BigQuery
+- Recomputes only new partitions plus source partitions modified since the last run
+  (late-arriving events) inside a short lookback window
+- Overwrites each destination partition atomically (partition-decorator copy with WRITE_TRUNCATE)
+- Backfills long ranges in parallel date chunks
+
+The table SQL lives in sql/create_*.sql and is bound to @start_date / @end_date here.
+
+Usage:
+    # Daily incremental refresh (all tables)
+    python python/refresh_fact_consumption_daily.py
+
+    # Show what would be recomputed without running anything
+    python python/refresh_fact_consumption_daily.py --dry-run
+
+    # Backfill history in parallel 7-day chunks
+    python python/refresh_fact_consumption_daily.py --backfill 2024-01-01 2024-12-31 --chunk-days 7 --workers 4
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+
+from google.api_core.exceptions import NotFound
+from google.auth import default
+from google.cloud import bigquery
+from google.oauth2 import service_account
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+PROJECT_ID = "yotam-395120"
+DATASET_ID = "peerplay"
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sql')
+
+WATERMARK_TABLE = f"{PROJECT_ID}.{DATASET_ID}.fact_consumption_daily_refresh_watermarks"
+
+# Destination table -> SQL file (and layout) that builds it
+TABLES = {
+    'fact_consumption_daily_dashboard': {
+        'sql_file': 'create_fact_consumption_daily_aggregated.sql',
+        'clustering_fields': ['first_chapter_bucket', 'last_balance_bucket', 'is_us_player', 'last_version_of_day'],
+    },
+    'fact_consumption_daily_new_ver_temp': {
+        'sql_file': 'create_fact_consumption_daily_new_ver_temp.sql',
+        'clustering_fields': None,
+    },
+}
+
+# Date-partitioned source tables; a rewritten partition means late-arriving data for that date
+SOURCE_TABLES = ['vmp_master_event_normalized', 'agg_player_daily']
+
+DEFAULT_LOOKBACK_DAYS = 3    # How far back late-arriving partitions are picked up
+DEFAULT_INITIAL_DAYS = 14    # Window for the first run of a table without a watermark
+DEFAULT_CHUNK_DAYS = 7       # Partitions computed per query job
+DEFAULT_WORKERS = 4          # Parallel chunk jobs
+
+# ============================================================================
+# BIGQUERY CONNECTION
+# ============================================================================
+
+def init_bigquery_client():
+    """Initialize BigQuery client (service account file, then Application Default Credentials)"""
+    creds_path = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
+    if creds_path and os.path.exists(creds_path):
+        credentials = service_account.Credentials.from_service_account_file(creds_path)
+        return bigquery.Client(credentials=credentials, project=PROJECT_ID)
+    credentials, _ = default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+    return bigquery.Client(credentials=credentials, project=PROJECT_ID)
+
+# ============================================================================
+# SQL
+# ============================================================================
+
+def load_select_sql(sql_file):
+    """Read a sql/create_*.sql file and return its SELECT body (everything after the `AS` line)"""
+    with open(os.path.join(SQL_DIR, sql_file)) as f:
+        lines = f.read().splitlines()
+    for i, line in enumerate(lines):
+        if line.strip().upper() == 'AS':
+            body = '\n'.join(lines[i + 1:]).strip()
+            return body.rstrip(';').rstrip()
+    raise ValueError(f"{sql_file}: could not find the `AS` line of the CREATE TABLE statement")
+
+def date_params(start_date, end_date):
+    """Query parameters for a partition range"""
+    return [
+        bigquery.ScalarQueryParameter('start_date', 'DATE', start_date),
+        bigquery.ScalarQueryParameter('end_date', 'DATE', end_date),
+    ]
+
+# ============================================================================
+# WATERMARKS
+# ============================================================================
+
+def ensure_watermark_table(client):
+    """Create the watermark table if it does not exist yet"""
+    client.query(f"""
+    CREATE TABLE IF NOT EXISTS `{WATERMARK_TABLE}` (
+        table_name STRING NOT NULL,
+        watermark_date DATE,
+        last_refresh_at TIMESTAMP
+    )
+    """).result()
+
+def get_watermark(client, table_name):
+    """Return (watermark_date, last_refresh_at) for a table, or (None, None) if never refreshed"""
+    job = client.query(
+        f"SELECT watermark_date, last_refresh_at FROM `{WATERMARK_TABLE}` WHERE table_name = @table_name",
+        job_config=bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter('table_name', 'STRING', table_name)
+        ])
+    )
+    try:
+        rows = list(job.result())
+    except NotFound:
+        # Watermark table not created yet (e.g. --dry-run before the first real run)
+        return None, None
+    if not rows:
+        return None, None
+    return rows[0]['watermark_date'], rows[0]['last_refresh_at']
+
+def set_watermark(client, table_name, watermark_date, refresh_started_at):
+    """Upsert the watermark for a table"""
+    client.query(
+        f"""
+        MERGE `{WATERMARK_TABLE}` t
+        USING (SELECT @table_name AS table_name, @watermark_date AS watermark_date, @refreshed_at AS last_refresh_at) s
+        ON t.table_name = s.table_name
+        WHEN MATCHED THEN UPDATE SET watermark_date = s.watermark_date, last_refresh_at = s.last_refresh_at
+        WHEN NOT MATCHED THEN INSERT (table_name, watermark_date, last_refresh_at)
+            VALUES (s.table_name, s.watermark_date, s.last_refresh_at)
+        """,
+        job_config=bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter('table_name', 'STRING', table_name),
+            bigquery.ScalarQueryParameter('watermark_date', 'DATE', watermark_date),
+            bigquery.ScalarQueryParameter('refreshed_at', 'TIMESTAMP', refresh_started_at),
+        ])
+    ).result()
+
+# ============================================================================
+# PLANNING
+# ============================================================================
+
+def get_late_partitions(client, since, min_date, max_date):
+    """Dates whose source partitions were modified after `since` (late-arriving data)"""
+    job = client.query(
+        f"""
+        SELECT DISTINCT PARSE_DATE('%Y%m%d', partition_id) AS partition_date
+        FROM `{PROJECT_ID}.{DATASET_ID}.INFORMATION_SCHEMA.PARTITIONS`
+        WHERE table_name IN UNNEST(@source_tables)
+          AND partition_id NOT IN ('__NULL__', '__UNPARTITIONED__')
+          AND last_modified_time > @since
+          AND partition_id BETWEEN FORMAT_DATE('%Y%m%d', @min_date) AND FORMAT_DATE('%Y%m%d', @max_date)
+        """,
+        job_config=bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ArrayQueryParameter('source_tables', 'STRING', SOURCE_TABLES),
+            bigquery.ScalarQueryParameter('since', 'TIMESTAMP', since),
+            bigquery.ScalarQueryParameter('min_date', 'DATE', min_date),
+            bigquery.ScalarQueryParameter('max_date', 'DATE', max_date),
+        ])
+    )
+    return {row['partition_date'] for row in job.result()}
+
+def plan_incremental_dates(client, table_name, end_date, lookback_days, initial_days):
+    """Return the sorted list of partition dates that need recomputing"""
+    watermark_date, last_refresh_at = get_watermark(client, table_name)
+
+    if watermark_date is None:
+        # First run: build the initial window
+        start_date = end_date - timedelta(days=initial_days - 1)
+        return date_list(start_date, end_date)
+
+    # New partitions since the watermark
+    dates = set(date_list(watermark_date + timedelta(days=1), end_date))
+
+    # Late-arriving data: already-loaded partitions whose sources changed since the last run
+    lookback_start = min(watermark_date, end_date) - timedelta(days=lookback_days - 1)
+    lookback_end = min(watermark_date, end_date)
+    if last_refresh_at is not None and lookback_start <= lookback_end:
+        dates |= get_late_partitions(client, last_refresh_at, lookback_start, lookback_end)
+
+    return sorted(dates)
+
+def date_list(start_date, end_date):
+    """All dates between start_date and end_date inclusive"""
+    return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+def group_into_chunks(dates, chunk_days):
+    """Group sorted dates into contiguous (start, end) ranges of at most chunk_days partitions"""
+    chunks = []
+    for d in dates:
+        if chunks and d == chunks[-1][1] + timedelta(days=1) and (d - chunks[-1][0]).days < chunk_days:
+            chunks[-1] = (chunks[-1][0], d)
+        else:
+            chunks.append((d, d))
+    return chunks
+
+# ============================================================================
+# PARTITION OVERWRITE
+# ============================================================================
+
+def ensure_destination_table(client, table_id, schema, clustering_fields):
+    """Create the date-partitioned destination table from the staging schema if it does not exist"""
+    try:
+        client.get_table(table_id)
+    except NotFound:
+        table = bigquery.Table(table_id, schema=schema)
+        table.time_partitioning = bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field='date')
+        if clustering_fields:
+            table.clustering_fields = clustering_fields
+        client.create_table(table, exists_ok=True)
+        print(f"  Created destination table {table_id}")
+
+def refresh_range(client, table_name, start_date, end_date, max_bytes_billed=None):
+    """Recompute [start_date, end_date] into staging, then swap each partition into the destination"""
+    config = TABLES[table_name]
+    table_id = f"{PROJECT_ID}.{DATASET_ID}.{table_name}"
+    staging_id = (
+        f"{PROJECT_ID}.{DATASET_ID}._staging_{table_name}_"
+        f"{start_date:%Y%m%d}_{end_date:%Y%m%d}_{uuid.uuid4().hex[:8]}"
+    )
+
+    job_config = bigquery.QueryJobConfig(
+        destination=staging_id,
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        time_partitioning=bigquery.TimePartitioning(type_=bigquery.TimePartitioningType.DAY, field='date'),
+        clustering_fields=config['clustering_fields'],
+        query_parameters=date_params(start_date, end_date),
+        use_legacy_sql=False,
+    )
+    if max_bytes_billed:
+        job_config.maximum_bytes_billed = max_bytes_billed
+
+    started = time.time()
+    try:
+        query_job = client.query(load_select_sql(config['sql_file']), job_config=job_config)
+        query_job.result()
+
+        staging = client.get_table(staging_id)
+        ensure_destination_table(client, table_id, staging.schema, config['clustering_fields'])
+        staged_partitions = set(client.list_partitions(staging_id))
+
+        # Each partition is replaced by a single copy job, so readers never see a half-written day
+        for d in date_list(start_date, end_date):
+            partition_id = f"{d:%Y%m%d}"
+            if partition_id in staged_partitions:
+                client.copy_table(
+                    f"{staging_id}${partition_id}",
+                    f"{table_id}${partition_id}",
+                    job_config=bigquery.CopyJobConfig(write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE)
+                ).result()
+            else:
+                # Day has no rows anymore (e.g. all players flagged as fraud) - drop the stale partition
+                client.delete_table(f"{table_id}${partition_id}", not_found_ok=True)
+    finally:
+        client.delete_table(staging_id, not_found_ok=True)
+
+    return {
+        'table': table_name,
+        'start_date': start_date,
+        'end_date': end_date,
+        'bytes_processed': query_job.total_bytes_processed or 0,
+        'seconds': time.time() - started,
+    }
+
+def run_chunks(client, table_name, chunks, workers, max_bytes_billed=None):
+    """Refresh chunks in parallel; raise if any chunk fails"""
+    results = []
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(refresh_range, client, table_name, start, end, max_bytes_billed): (start, end)
+            for start, end in chunks
+        }
+        for future in as_completed(futures):
+            start, end = futures[future]
+            try:
+                result = future.result()
+                results.append(result)
+                print(f"  ✅ {table_name} {start} → {end}: "
+                      f"{result['bytes_processed'] / 1e9:.2f} GB in {result['seconds']:.1f}s")
+            except Exception as e:
+                errors.append((start, end, e))
+                print(f"  ❌ {table_name} {start} → {end}: {e}")
+    if errors:
+        raise RuntimeError(f"{len(errors)} chunk(s) failed for {table_name}")
+    return results
+
+# ============================================================================
+# ENTRY POINTS
+# ============================================================================
+
+def run_incremental(client, table_names, args):
+    """Refresh new and late-arriving partitions for each table and advance its watermark"""
+    end_date = date.today() - timedelta(days=1)  # Only complete days, as before (date < CURRENT_DATE)
+    for table_name in table_names:
+        refresh_started_at = datetime.now(timezone.utc)
+        dates = plan_incremental_dates(client, table_name, end_date, args.lookback_days, args.initial_days)
+        chunks = group_into_chunks(dates, args.chunk_days)
+        print(f"{table_name}: {len(dates)} partition(s) to refresh in {len(chunks)} chunk(s)")
+        for start, end in chunks:
+            print(f"  - {start} → {end}")
+        if args.dry_run or not chunks:
+            continue
+        run_chunks(client, table_name, chunks, args.workers, args.max_bytes_billed)
+        set_watermark(client, table_name, end_date, refresh_started_at)
+
+def run_backfill(client, table_names, args):
+    """Recompute an explicit date range in parallel chunks"""
+    start_date = date.fromisoformat(args.backfill[0])
+    end_date = date.fromisoformat(args.backfill[1])
+    if start_date > end_date:
+        raise ValueError("Backfill start date must not be after end date")
+    chunks = group_into_chunks(date_list(start_date, end_date), args.chunk_days)
+    for table_name in table_names:
+        refresh_started_at = datetime.now(timezone.utc)
+        print(f"{table_name}: backfilling {start_date} → {end_date} in {len(chunks)} chunk(s)")
+        if args.dry_run:
+            continue
+        run_chunks(client, table_name, chunks, args.workers, args.max_bytes_billed)
+        # Only move the watermark forward - backfilling old history must not rewind it
+        watermark_date, _ = get_watermark(client, table_name)
+        if watermark_date is None or end_date > watermark_date:
+            set_watermark(client, table_name, end_date, refresh_started_at)
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental refresh of the fact_consumption_daily tables")
+    parser.add_argument('--table', choices=sorted(TABLES), action='append',
+                        help="Table to refresh (repeatable, default: all)")
+    parser.add_argument('--backfill', nargs=2, metavar=('START', 'END'),
+                        help="Recompute an explicit date range (YYYY-MM-DD YYYY-MM-DD)")
+    parser.add_argument('--lookback-days', type=int, default=DEFAULT_LOOKBACK_DAYS,
+                        help="Days before the watermark checked for late-arriving data")
+    parser.add_argument('--initial-days', type=int, default=DEFAULT_INITIAL_DAYS,
+                        help="Days loaded on the first run of a table")
+    parser.add_argument('--chunk-days', type=int, default=DEFAULT_CHUNK_DAYS,
+                        help="Partitions per query job")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Chunks computed in parallel")
+    parser.add_argument('--max-bytes-billed', type=int, default=None,
+                        help="Per-query billing cap in bytes")
+    parser.add_argument('--dry-run', action='store_true', help="Print the plan without running queries")
+    args = parser.parse_args()
+
+    table_names = args.table or list(TABLES)
+    client = init_bigquery_client()
+    if not args.dry_run:
+        ensure_watermark_table(client)
+
+    try:
+        if args.backfill:
+            run_backfill(client, table_names, args)
+        else:
+            run_incremental(client, table_names, args)
+    except Exception as e:
+        print(f"❌ Refresh failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Query Planner
+Every dashboard load is dry-run before it runs and refused, with the estimate, if it would
+scan more than the budget; the load's caller can then retry a smaller request (e.g. fewer
+days). A load that fits runs with maximum_bytes_billed set to the budget it was checked
+against, so no query is refused by BigQuery half-way through a session.
+
+Latency is estimated from bytes with the scan throughput observed on this process's
+completed loads (a moving average, seeded with a conservative default).
+
+Budget: DASHBOARD_QUERY_BUDGET_GB (default 10).
+"""
+
+import copy
+import os
+import threading
+import time
+from collections import deque, namedtuple
+
+QUERY_BUDGET_BYTES = int(float(os.environ.get('DASHBOARD_QUERY_BUDGET_GB', 10)) * 1e9)
+DEFAULT_BYTES_PER_SECOND = 100e6    # Until a load has been timed
+QUERY_OVERHEAD_SECONDS = 1.0        # Job start-up and first page, independent of size
+THROUGHPUT_SMOOTHING = 0.3          # Weight of the newest observation in the moving average
+
+# name: short label; query / job_config: what runs; downgrade: answers less than requested
+QueryPlan = namedtuple('QueryPlan', ['name', 'query', 'job_config', 'downgrade', 'bytes_estimated', 'seconds_estimated'])
+
+class QueryBudgetExceeded(Exception):
+    """The load does not fit the byte budget"""
+
+    def __init__(self, plan, budget_bytes):
+        super().__init__(
+            f"Query ({plan.name}) would scan {plan.bytes_estimated / 1e9:.2f} GB, "
+            f"over the {budget_bytes / 1e9:.2f} GB budget"
+        )
+        self.plan = plan
+
+_lock = threading.Lock()
+_throughput = {'bytes_per_second': DEFAULT_BYTES_PER_SECOND}
+history = deque(maxlen=20)          # Recent (plan, seconds taken) for display
+
+# ============================================================================
+# ESTIMATES
+# ============================================================================
+
+def estimate_seconds(bytes_estimated):
+    """Expected wall time of a load scanning bytes_estimated"""
+    return QUERY_OVERHEAD_SECONDS + bytes_estimated / _throughput['bytes_per_second']
+
+def record(plan, seconds):
+    """Fold a completed load's observed throughput into the estimate"""
+    with _lock:
+        if plan.bytes_estimated and seconds > QUERY_OVERHEAD_SECONDS:
+            observed = plan.bytes_estimated / (seconds - QUERY_OVERHEAD_SECONDS)
+            _throughput['bytes_per_second'] += THROUGHPUT_SMOOTHING * (observed - _throughput['bytes_per_second'])
+        history.append((plan, seconds))
+
+def dry_run(client, query, job_config):
+    """Bytes BigQuery would process for the query (no cost, nothing runs)"""
+    config = copy.deepcopy(job_config)
+    config.dry_run = True
+    config.use_query_cache = False
+    return client.query(query, job_config=config).total_bytes_processed or 0
+
+# ============================================================================
+# PLANNING
+# ============================================================================
+
+def plan(client, name, query, job_config, downgrade=False, budget_bytes=QUERY_BUDGET_BYTES):
+    """Dry-run the query and return its plan if it fits the budget, else raise QueryBudgetExceeded"""
+    bytes_estimated = dry_run(client, query, job_config)
+    planned = QueryPlan(name, query, job_config, downgrade, bytes_estimated, estimate_seconds(bytes_estimated))
+    if bytes_estimated > budget_bytes:
+        raise QueryBudgetExceeded(planned, budget_bytes)
+    # The billing cap is the budget the plan was checked against
+    job_config.maximum_bytes_billed = budget_bytes
+    return planned
+
+def timed(chosen, run):
+    """Run a planned load via run(plan), recording how long it took"""
+    start = time.time()
+    result = run(chosen)
+    record(chosen, time.time() - start)
+    return result
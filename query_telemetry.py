@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Query Telemetry
+Append-only ledger of the BigQuery jobs the dashboard runs (one JSON line per job), so
+spend and latency can be attributed to dashboard usage and query-cache hits can be seen.
+
+Per job: kind (load / stream / date_range / drilldown), job ID, query parameters, bytes
+processed and billed, slot milliseconds, cache hit, rows, and the time spent waiting for
+the job, downloading results and converting them to a DataFrame.
+
+Each entry is one write() in append mode, so lines stay whole with several sessions and
+processes writing. A failing ledger never fails the query it describes. The summary reads
+only the tail of the file (MAX_READ_BYTES).
+
+Ledger: DASHBOARD_QUERY_LEDGER (default /tmp/consumption_dashboard_queries.jsonl).
+
+Usage (rolling summary of the last 24 hours):
+    python query_telemetry.py [--hours 24]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+LEDGER_PATH = os.environ.get('DASHBOARD_QUERY_LEDGER', '/tmp/consumption_dashboard_queries.jsonl')
+MAX_READ_BYTES = 20 * 1024 * 1024   # Tail of the ledger read for summaries
+SUMMARY_HOURS = 24
+
+_lock = threading.Lock()
+
+# ============================================================================
+# RECORDING
+# ============================================================================
+
+def _parameters(job_config):
+    return {p.name: str(p.value) for p in getattr(job_config, 'query_parameters', None) or []}
+
+def record(kind, job, job_config, rows, query_seconds, download_seconds, to_dataframe_seconds=None):
+    """Append one job's statistics to the ledger; returns the entry"""
+    entry = {
+        'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'kind': kind,
+        'job_id': getattr(job, 'job_id', None),
+        'parameters': _parameters(job_config),
+        'bytes_processed': getattr(job, 'total_bytes_processed', None) or 0,
+        'bytes_billed': getattr(job, 'total_bytes_billed', None) or 0,
+        'slot_millis': getattr(job, 'slot_millis', None) or 0,
+        'cache_hit': bool(getattr(job, 'cache_hit', False)),
+        'rows': rows,
+        'query_seconds': round(query_seconds, 3),
+        'download_seconds': round(download_seconds, 3),
+        'to_dataframe_seconds': None if to_dataframe_seconds is None else round(to_dataframe_seconds, 3),
+    }
+    line = json.dumps(entry) + '\n'
+    with _lock:
+        try:
+            with open(LEDGER_PATH, 'a') as f:
+                f.write(line)
+        except OSError:
+            # Telemetry must never break a load
+            pass
+    return entry
+
+def fetch_dataframe(client, query, job_config=None, kind='query'):
+    """Run a query into a DataFrame, timing job wait, download and conversion separately"""
+    start = time.perf_counter()
+    job = client.query(query, job_config=job_config)
+    rows = job.result()
+    waited = time.perf_counter()
+    table = rows.to_arrow()
+    downloaded = time.perf_counter()
+    df = table.to_pandas()
+    record(kind, job, job_config, len(df), waited - start, downloaded - waited, time.perf_counter() - downloaded)
+    return df
+
+def iter_pages(client, query, job_config=None, page_size=None, kind='query', arrow=True):
+    """
+    Result pages of a query (Arrow record batches, or DataFrames if arrow=False), recorded
+    once the last page has been read. Download time is the time spent fetching pages; for
+    DataFrame pages it includes their conversion.
+    """
+    start = time.perf_counter()
+    job = client.query(query, job_config=job_config)
+    result = job.result(page_size=page_size)
+    query_seconds = time.perf_counter() - start
+    pages = iter(result.to_arrow_iterable() if arrow else result.to_dataframe_iterable())
+    n_rows = 0
+    download_seconds = 0.0
+    while True:
+        fetch_start = time.perf_counter()
+        page = next(pages, None)
+        download_seconds += time.perf_counter() - fetch_start
+        if page is None:
+            break
+        n_rows += page.num_rows if arrow else len(page)
+        yield page
+    record(kind, job, job_config, n_rows, query_seconds, download_seconds)
+
+# ============================================================================
+# SUMMARY
+# ============================================================================
+
+def read_entries(hours=SUMMARY_HOURS):
+    """Ledger entries of the last `hours` hours (from the tail of the file), oldest first"""
+    try:
+        with open(LEDGER_PATH, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - MAX_READ_BYTES))
+            lines = f.read().splitlines()
+    except OSError:
+        return []
+    if size > MAX_READ_BYTES:
+        lines = lines[1:]   # Partial first line
+    cutoff = datetime.now(timezone.utc).timestamp() - hours * 3600
+    entries = []
+    for line in lines:
+        try:
+            entry = json.loads(line)
+            if datetime.fromisoformat(entry['time']).timestamp() >= cutoff:
+                entries.append(entry)
+        except (ValueError, KeyError):
+            continue
+    return entries
+
+def summarize(entries):
+    """One row per query kind (plus 'all'): jobs, cache hits, GB, slot seconds, rows and mean timings"""
+    groups = {}
+    for entry in entries:
+        groups.setdefault(entry['kind'], []).append(entry)
+    if len(groups) > 1:
+        groups['all'] = entries
+    summary = []
+    for kind, group in groups.items():
+        n = len(group)
+        hits = sum(1 for e in group if e['cache_hit'])
+        summary.append({
+            'kind': kind,
+            'jobs': n,
+            'cache_hits': hits,
+            'cache_hit_rate': hits / n,
+            'gb_processed': sum(e['bytes_processed'] for e in group) / 1e9,
+            'gb_billed': sum(e['bytes_billed'] for e in group) / 1e9,
+            'slot_seconds': sum(e['slot_millis'] for e in group) / 1e3,
+            'rows': sum(e['rows'] for e in group),
+            'mean_query_seconds': sum(e['query_seconds'] for e in group) / n,
+            'mean_download_seconds': sum(e['download_seconds'] for e in group) / n,
+        })
+    return summary
+
+def format_summary(summary):
+    lines = [f"{'kind':<12} {'jobs':>6} {'cache hits':>11} {'GB proc':>9} {'GB billed':>10} {'slot s':>9} "
+             f"{'rows':>12} {'query s':>8} {'dl s':>7}"]
+    for row in summary:
+        lines.append(
+            f"{row['kind']:<12} {row['jobs']:>6} {row['cache_hits']:>5} ({row['cache_hit_rate']:>3.0%}) "
+            f"{row['gb_processed']:>9.2f} {row['gb_billed']:>10.2f} {row['slot_seconds']:>9.1f} "
+            f"{row['rows']:>12,} {row['mean_query_seconds']:>8.2f} {row['mean_download_seconds']:>7.2f}"
+        )
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the dashboard's BigQuery query ledger")
+    parser.add_argument('--hours', type=float, default=SUMMARY_HOURS, help="Window to summarize (default: 24)")
+    args = parser.parse_args()
+
+    entries = read_entries(args.hours)
+    if not entries:
+        print(f"💡 No queries recorded in the last {args.hours:g} hours ({LEDGER_PATH})")
+        return
+    print(f"🧮 {len(entries)} queries in the last {args.hours:g} hours ({LEDGER_PATH})")
+    print(format_summary(summarize(entries)))
+
+if __name__ == "__main__":
+    main()
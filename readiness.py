@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Readiness Endpoint for the Consumption Dashboard
+Small HTTP server for startup / readiness probes: GET /ready answers 200 only while a fresh
+snapshot is in DASHBOARD_SNAPSHOT_DIR (see snapshot.py) and 503 until then, so an instance
+takes traffic only once its first page view can be served from the snapshot. GET /health
+answers 200 whenever the server is up (liveness).
+
+Streamlit cannot serve extra paths, so this runs next to it: as a sidecar container whose
+startup probe the dashboard container waits for (service.yaml), or locally in the background.
+
+Usage:
+    python readiness.py --port 8081
+    curl -f http://localhost:8081/ready
+"""
+
+import argparse
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import snapshot
+
+DEFAULT_PORT = int(os.environ.get('DASHBOARD_READINESS_PORT', 8081))
+
+# ============================================================================
+# HTTP
+# ============================================================================
+
+class ReadinessHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            return self._send_json(200, {'status': 'ok'})
+        if path == '/ready':
+            state = snapshot.status()
+            return self._send_json(200 if state['warm'] else 503, state)
+        self._send_json(404, {'error': "Use /ready or /health"})
+
+    def log_message(self, format, *args):
+        # Probes hit this every few seconds; keep the logs for the dashboard
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the dashboard's readiness probe")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), ReadinessHandler)
+    print(f"✅ Readiness on http://{args.host}:{args.port}/ready (snapshot: {snapshot.SNAPSHOT_DIR})", file=sys.stderr)
+    server.serve_forever()
+
+if __name__ == "__main__":
+    main()
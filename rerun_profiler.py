@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Rerun Profiler
+Deterministic profile (cProfile) of one dashboard rerun, armed by an admin from the sidebar
+so hot spots show up in a real production session without a redeploy.
+
+The profile covers the script thread of the session that armed it (background threads such
+as the import prewarm are not included). One rerun is profiled at a time per process: the
+interpreter allows only one active profiler, so while another session's rerun is being
+profiled, an armed session's rerun runs unprofiled and the session stays armed for its next
+rerun.
+
+Outputs:
+- a text report of the hottest functions, by own time and by cumulative time
+- the raw pstats data (.prof), for snakeviz / flameprof / `python -m pstats`
+"""
+
+import cProfile
+import io
+import marshal
+import pstats
+import threading
+import time
+
+REPORT_LINES = 40       # Functions listed per section of the text report
+
+_lock = threading.Lock()
+
+class RerunProfile:
+    """
+    Context manager profiling its block. `active` is False when another profile holds the
+    interpreter's profiler, in which case the block runs unprofiled.
+    """
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+        self.active = False
+        self.seconds = None
+
+    def __enter__(self):
+        self.active = _lock.acquire(blocking=False)
+        if self.active:
+            self._start = time.perf_counter()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.active:
+            self.profiler.disable()
+            self.seconds = time.perf_counter() - self._start
+            _lock.release()
+        # Streamlit's rerun / stop exceptions end the block too; never swallow them
+        return False
+
+    def report(self, limit=REPORT_LINES):
+        """Sorted hot-function report (own time, then cumulative time)"""
+        lines = [f"Rerun profile: {self.seconds:.3f}s wall\n"]
+        for sort, title in [('tottime', "own time"), ('cumulative', "cumulative time")]:
+            stream = io.StringIO()
+            stats = pstats.Stats(self.profiler, stream=stream).strip_dirs().sort_stats(sort)
+            stats.print_stats(limit)
+            lines.append(f"=== Top {limit} functions by {title} ===")
+            lines.append(stream.getvalue())
+        return "\n".join(lines)
+
+    def dump(self):
+        """Raw profile in the pstats file format (what Profile.dump_stats writes)"""
+        self.profiler.create_stats()
+        return marshal.dumps(self.profiler.stats)
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Shared Result Cache
+Query results shared by every dashboard instance and restart, so scaled-out Cloud Run
+instances hit BigQuery once per data version instead of once each (st.cache_data and the
+dataset cache live inside one process).
+
+- Keys are content-addressed: a hash of the table's data version (last modified time and
+  row count), the SQL and its parameters (plus the UTC date for CURRENT_DATE() queries).
+  New data means new keys; stale entries simply expire (DASHBOARD_SHARED_CACHE_TTL_SECONDS).
+- Values are Arrow IPC streams, zstd-compressed above COMPRESS_MIN_BYTES and for streamed
+  results. Results over DASHBOARD_SHARED_CACHE_MAX_MB are not cached.
+- A miss takes a short lease on the key, so instances that miss together wait for the
+  first one's result instead of all querying BigQuery.
+- A failing backend never fails a load: every error counts as a miss.
+
+Backend: DASHBOARD_SHARED_CACHE, one of
+    redis://host:6379/0     network key-value store (production; pip install redis)
+    file:///path/to/dir     files in a directory (a shared volume, or local for development)
+    memory                  in-process (tests)
+unset or empty disables the shared cache.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import pyarrow as pa
+
+SHARED_CACHE_URL = os.environ.get('DASHBOARD_SHARED_CACHE', '')
+SHARED_CACHE_TTL_SECONDS = int(os.environ.get('DASHBOARD_SHARED_CACHE_TTL_SECONDS', 86400))
+MAX_VALUE_BYTES = int(float(os.environ.get('DASHBOARD_SHARED_CACHE_MAX_MB', 256)) * 1e6)
+
+KEY_PREFIX = 'consumption_dashboard:v1'
+COMPRESS_MIN_BYTES = 64 * 1024      # Smaller values are stored uncompressed
+LEASE_SECONDS = 600                 # How long a miss holds the key for its query
+LEASE_POLL_SECONDS = 0.5
+VERSION_TTL_SECONDS = 60            # Data version lookups reused for this long
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+
+class MemoryBackend:
+    """In-process stand-in (tests, single instance)"""
+
+    def __init__(self):
+        self._values = {}   # key -> (value, expires_at)
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._values.get(key)
+        if entry is not None and entry[1] <= time.time():
+            del self._values[key]
+            return None
+        return entry
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key, value, ttl_seconds):
+        with self._lock:
+            self._values[key] = (value, time.time() + ttl_seconds)
+
+    def add(self, key, value, ttl_seconds):
+        """Set only if absent; True if set"""
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._values[key] = (value, time.time() + ttl_seconds)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+class FileBackend:
+    """One file per key in a directory; a file's mtime is its expiry time"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key.replace(':', '_'))
+
+    def _expired(self, path):
+        try:
+            if os.stat(path).st_mtime > time.time():
+                return False
+            os.remove(path)
+        except OSError:
+            pass
+        return True
+
+    def get(self, key):
+        path = self._path(key)
+        if self._expired(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_tmp(self, path, value, ttl_seconds):
+        # Complete file with its expiry, published by rename / link so readers never see a partial one
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(value)
+        expires_at = time.time() + ttl_seconds
+        os.utime(tmp_path, (expires_at, expires_at))
+        return tmp_path
+
+    def set(self, key, value, ttl_seconds):
+        path = self._path(key)
+        os.replace(self._write_tmp(path, value, ttl_seconds), path)
+
+    def add(self, key, value, ttl_seconds):
+        path = self._path(key)
+        self._expired(path)
+        tmp_path = self._write_tmp(path, value, ttl_seconds)
+        try:
+            os.link(tmp_path, path)     # Fails if the key exists
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+class RedisBackend:
+    """Redis / Memorystore"""
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("The redis shared cache backend needs the redis package: pip install redis") from None
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl_seconds):
+        self.client.set(key, value, ex=ttl_seconds)
+
+    def add(self, key, value, ttl_seconds):
+        return bool(self.client.set(key, value, ex=ttl_seconds, nx=True))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+def open_backend(url):
+    """Backend for a DASHBOARD_SHARED_CACHE value (None if disabled)"""
+    if not url:
+        return None
+    if url == 'memory':
+        return MemoryBackend()
+    if url.startswith('file://'):
+        return FileBackend(url[len('file://'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    raise ValueError(f"Unknown shared cache backend: {url}")
+
+# ============================================================================
+# KEYS
+# ============================================================================
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+def data_version(client, table_id):
+    """Data version of a BigQuery table (metadata only, no bytes scanned); None if unavailable"""
+    now = time.time()
+    with _versions_lock:
+        cached = _versions.get(table_id)
+        if cached and now - cached[1] < VERSION_TTL_SECONDS:
+            return cached[0]
+    try:
+        table = client.get_table(table_id)
+    except Exception:
+        return None
+    version = f"{table_id}@{table.modified}/{table.num_rows}"
+    with _versions_lock:
+        _versions[table_id] = (version, now)
+    return version
+
+def query_key(version, query, job_config=None):
+    """Content-addressed key of a query result at a data version"""
+    parameters = [
+        [p.name, getattr(p, 'type_', None), str(p.value)]
+        for p in getattr(job_config, 'query_parameters', None) or []
+    ]
+    parts = [version, query, parameters]
+    if 'CURRENT_DATE()' in query:
+        # Same SQL, different rows every day
+        parts.append(str(datetime.now(timezone.utc).date()))
+    digest = hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+    return f"{KEY_PREFIX}:{digest}"
+
+# ============================================================================
+# ENCODING
+# ============================================================================
+
+def _write_options(compress):
+    if compress and pa.Codec.is_available('zstd'):
+        return pa.ipc.IpcWriteOptions(compression='zstd')
+    return pa.ipc.IpcWriteOptions()
+
+def encode_table(table):
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema, options=_write_options(table.nbytes >= COMPRESS_MIN_BYTES)) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def decode_batches(value):
+    """Record batches of an encoded value, decoded one at a time"""
+    return pa.ipc.open_stream(pa.py_buffer(value))
+
+# ============================================================================
+# CACHE
+# ============================================================================
+
+class SharedCache:
+    """Arrow tables, DataFrames and streamed record batches in a shared backend"""
+
+    def __init__(self, backend, ttl_seconds=SHARED_CACHE_TTL_SECONDS, max_value_bytes=MAX_VALUE_BYTES):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_value_bytes = max_value_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _call(self, method, *args):
+        try:
+            return getattr(self.backend, method)(*args)
+        except Exception:
+            # The cache is an optimization: an unreachable backend behaves as empty
+            return False if method == 'add' else None
+
+    def _put(self, key, value):
+        if len(value) <= self.max_value_bytes:
+            self._call('set', key, value, self.ttl_seconds)
+
+    def _lookup(self, key):
+        """Cached value, waiting for another instance's in-flight query; (value, whether we hold the lease)"""
+        value = self._call('get', key)
+        if value is not None:
+            return value, False
+        if self._call('add', f"{key}:lease", b'1', LEASE_SECONDS):
+            return None, True
+        deadline = time.time() + LEASE_SECONDS
+        while time.time() < deadline:
+            time.sleep(LEASE_POLL_SECONDS)
+            value = self._call('get', key)
+            if value is not None:
+                return value, False
+            if self._call('get', f"{key}:lease") is None:
+                # Holder gave up (result too large, query failed): query ourselves
+                break
+        return None, False
+
+    def _count(self, value):
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def table(self, key, load):
+        """Arrow table for key, from the cache or load() (then cached)"""
+        value, leased = self._lookup(key)
+        self._count(value)
+        if value is not None:
+            return decode_batches(value).read_all()
+        try:
+            table = load()
+            self._put(key, encode_table(table))
+            return table
+        finally:
+            if leased:
+                self._call('delete', f"{key}:lease")
+
+    def frame(self, key, load):
+        """DataFrame for key, from the cache or load() (then cached)"""
+        result = {}
+
+        def load_table():
+            result['df'] = load()
+            return pa.Table.from_pandas(result['df'], preserve_index=False)
+
+        table = self.table(key, load_table)
+        return result['df'] if 'df' in result else table.to_pandas()
+
+    def batches(self, key, load):
+        """
+        Record batches for key, from the cache or the iterable load() returns. A miss is
+        cached as it streams (compressed, never above the size limit) and stored only once
+        the last batch has been read.
+        """
+        value, leased = self._lookup(key)
+        self._count(value)
+        if value is not None:
+            yield from decode_batches(value)
+            return
+        try:
+            sink, writer = pa.BufferOutputStream(), None
+            for batch in load():
+                if sink is not None:
+                    if writer is None:
+                        writer = pa.ipc.new_stream(sink, batch.schema, options=_write_options(True))
+                    writer.write_batch(batch)
+                    if sink.tell() > self.max_value_bytes:
+                        writer.close()
+                        sink = None
+                yield batch
+            if sink is not None and writer is not None:
+                writer.close()
+                self._put(key, sink.getvalue().to_pybytes())
+        finally:
+            if leased:
+                self._call('delete', f"{key}:lease")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_shared_cache():
+    """Process-wide SharedCache for DASHBOARD_SHARED_CACHE, or None when not configured"""
+    global _cache
+    if not SHARED_CACHE_URL:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SharedCache(open_backend(SHARED_CACHE_URL))
+        return _cache
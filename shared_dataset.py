@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Shared Dataset
+The loaded table is held once per process as an immutable, columnar structure:
+- rows sorted by date, so a date range is a contiguous slice (two binary searches)
+- dimensions stored as small integer codes plus their sorted distinct values
+- metric columns as read-only float64 arrays
+
+Sessions never copy it. A filter resolves to an index array of matching rows and charts
+receive a small (date x dimension) aggregate computed with np.bincount over those rows.
+
+For the date slider, date_cube() holds per-cell cumulative sums along the calendar axis for a
+(dimension, filters) pair: any date window, and trailing 7/28-day rolling sums for every day,
+are then two lookups per series instead of a pass over the rows. Comparison periods (previous
+N days, same days last week / month) are the same lookups at shifted cube rows.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+DIMENSION_COLUMNS = [
+    'first_chapter_bucket',
+    'is_us_player',
+    'last_balance_bucket',
+    'last_version_of_day',
+    'paid_today_flag',
+    'paid_ever_flag'
+]
+
+SKETCH_COLUMN = 'players_sketch'
+
+# Bytes of date cubes kept per dataset, least recently used dropped first (the newest is always kept)
+CUBE_BUDGET_BYTES = int(float(os.environ.get('DASHBOARD_CUBE_BUDGET_MB', 256)) * 1e6)
+
+def _freeze(array):
+    """Mark a NumPy array read-only so no session can mutate shared data"""
+    array.setflags(write=False)
+    return array
+
+class SharedDataset:
+    """Immutable, process-wide view of the loaded fact table"""
+
+    def __init__(self, dates, date_codes, codes, values, columns, sketches=None):
+        self.dates = dates              # Sorted distinct dates (object array of datetime.date)
+        self.date_codes = date_codes    # Row -> index into self.dates (sorted ascending)
+        self.codes = codes              # Dimension -> row codes into self.values[dimension]
+        self.values = values            # Dimension -> sorted distinct values
+        self.columns = columns          # Metric column -> float64 values per row
+        self.sketches = sketches        # Decoded HLL++ player sketches (row aligned) or None
+        self._date_starts = np.searchsorted(date_codes, np.arange(len(dates) + 1))
+        # Calendar axis: day offset of each loaded date from the first one (gaps stay gaps)
+        self._day_offsets = np.array([(d - dates[0]).days for d in dates], dtype=np.int64)
+        self.n_days = int(self._day_offsets[-1]) + 1 if len(dates) else 0
+        self.column_names = list(columns)
+        self._cubes = OrderedDict()
+        self._cube_bytes = 0
+        self._cubes_lock = threading.Lock()
+        self.cube_budget_bytes = CUBE_BUDGET_BYTES
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build the shared dataset from a freshly loaded DataFrame (the frame is not kept)"""
+        from date_store import DateChunkedStore
+        if len(df) == 0:
+            return None
+        return DateChunkedStore().append(df).to_dataset()
+
+    # ------------------------------------------------------------------
+    # Metadata
+    # ------------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.date_codes)
+
+    @property
+    def min_date(self):
+        return self.dates[0]
+
+    @property
+    def max_date(self):
+        return self.dates[-1]
+
+    @property
+    def cube_nbytes(self):
+        """Size of the cached date cubes"""
+        return self._cube_bytes
+
+    @property
+    def nbytes(self):
+        """Resident size of the shared arrays and cached date cubes"""
+        total = self.dates.nbytes + self.date_codes.nbytes + self._date_starts.nbytes
+        total += sum(a.nbytes for a in self.codes.values()) + sum(a.nbytes for a in self.values.values())
+        total += sum(a.nbytes for a in self.columns.values())
+        if self.sketches is not None:
+            total += self.sketches.nbytes
+        return total + self._cube_bytes
+
+    def dimension_values(self, column):
+        """Sorted distinct non-null values of a dimension (filter options)"""
+        return [v for v in self.values.get(column, []) if not pd.isna(v)]
+
+    # ------------------------------------------------------------------
+    # Selection
+    # ------------------------------------------------------------------
+
+    def select_rows(self, date_range=None, column_filters=None):
+        """
+        Index array of rows matching a date range and {column: allowed values} filters.
+        The date range is a slice of the date-sorted rows; dimension filters use per-value
+        lookup tables on the integer codes. Nothing is copied from the shared arrays.
+        """
+        start, end = 0, len(self)
+        if date_range:
+            date_min, date_max = date_range
+            start = self._date_starts[np.searchsorted(self.dates, date_min, side='left')]
+            end = self._date_starts[np.searchsorted(self.dates, date_max, side='right')]
+
+        mask = None
+        for column, allowed in (column_filters or {}).items():
+            if not allowed or column not in self.codes:
+                continue
+            lookup = np.isin(self.values[column], list(allowed))
+            column_mask = lookup[self.codes[column][start:end]]
+            mask = column_mask if mask is None else (mask & column_mask)
+
+        if mask is None:
+            return np.arange(start, end, dtype=np.int64)
+        return start + np.flatnonzero(mask)
+
+    # ------------------------------------------------------------------
+    # Aggregation
+    # ------------------------------------------------------------------
+
+    def group_keys(self, rows, dimension=None):
+        """Combined (date, dimension) group code per row and the number of possible groups"""
+        date_codes = self.date_codes[rows].astype(np.int64)
+        if not dimension:
+            return date_codes, len(self.dates), 1
+        n_values = len(self.values[dimension])
+        return date_codes * n_values + self.codes[dimension][rows], len(self.dates) * n_values, n_values
+
+    def aggregate(self, rows, dimension=None, columns=None):
+        """Sum metric columns per date (and dimension value) over the selected rows"""
+        columns = [c for c in (columns or self.columns) if c in self.columns]
+        keys, n_groups, n_values = self.group_keys(rows, dimension)
+        present = np.bincount(keys, minlength=n_groups) > 0
+        group_ids = np.flatnonzero(present)
+
+        data = {'date': self.dates[group_ids // n_values]}
+        if dimension:
+            data[dimension] = self.values[dimension][group_ids % n_values]
+        for column in columns:
+            data[column] = np.bincount(keys, weights=self.columns[column][rows], minlength=n_groups)[present]
+        return pd.DataFrame(data)
+
+    def pivot(self, rows, row_dimension, column_dimension, columns=None, by_date=False):
+        """
+        Sum metric columns per (row value, column value) cell - and per date with by_date -
+        over the selected rows: one bincount per column over the combined dimension codes
+        """
+        columns = [c for c in (columns or self.columns) if c in self.columns]
+        n_columns = len(self.values[column_dimension])
+        n_cells = len(self.values[row_dimension]) * n_columns
+        keys = self.codes[row_dimension][rows].astype(np.int64) * n_columns + self.codes[column_dimension][rows]
+        n_groups = n_cells
+        if by_date:
+            keys = self.date_codes[rows].astype(np.int64) * n_cells + keys
+            n_groups *= len(self.dates)
+        present = np.bincount(keys, minlength=n_groups) > 0
+        group_ids = np.flatnonzero(present)
+        cell_ids = group_ids % n_cells
+
+        data = {'date': self.dates[group_ids // n_cells]} if by_date else {}
+        data[row_dimension] = self.values[row_dimension][cell_ids // n_columns]
+        data[column_dimension] = self.values[column_dimension][cell_ids % n_columns]
+        for column in columns:
+            data[column] = np.bincount(keys, weights=self.columns[column][rows], minlength=n_groups)[present]
+        return pd.DataFrame(data)
+
+    # ------------------------------------------------------------------
+    # Prefix sums along the date axis
+    # ------------------------------------------------------------------
+
+    def date_cube(self, dimension=None, column_filters=None):
+        """
+        Cumulative sums along the calendar axis for the rows matching column_filters:
+        (sums, counts) of shape (n_days + 1, n_values, n_columns) and (n_days + 1, n_values),
+        with row 0 all zeros, so the total over days [a, b) is cube[b] - cube[a].
+        Built with one bincount pass per column and cached per (dimension, filters) within
+        cube_budget_bytes.
+        """
+        key = (dimension, tuple(sorted(
+            (column, tuple(sorted(map(str, allowed)))) for column, allowed in (column_filters or {}).items() if allowed
+        )))
+        with self._cubes_lock:
+            if key in self._cubes:
+                self._cubes.move_to_end(key)
+                return self._cubes[key]
+
+        rows = self.select_rows(None, column_filters)
+        n_values = len(self.values[dimension]) if dimension else 1
+        keys = self._day_offsets[self.date_codes[rows]] * n_values
+        if dimension:
+            keys = keys + self.codes[dimension][rows]
+        n_cells = self.n_days * n_values
+
+        sums = np.zeros((self.n_days + 1, n_values, len(self.column_names)))
+        for j, column in enumerate(self.column_names):
+            sums[1:, :, j] = np.bincount(keys, weights=self.columns[column][rows], minlength=n_cells).reshape(self.n_days, n_values)
+        counts = np.zeros((self.n_days + 1, n_values), dtype=np.int64)
+        counts[1:] = np.bincount(keys, minlength=n_cells).reshape(self.n_days, n_values)
+        np.cumsum(sums, axis=0, out=sums)
+        np.cumsum(counts, axis=0, out=counts)
+
+        with self._cubes_lock:
+            if key not in self._cubes:
+                self._cubes[key] = (sums, counts)
+                self._cube_bytes += sums.nbytes + counts.nbytes
+            while self._cube_bytes > self.cube_budget_bytes and len(self._cubes) > 1:
+                _, (old_sums, old_counts) = self._cubes.popitem(last=False)
+                self._cube_bytes -= old_sums.nbytes + old_counts.nbytes
+        return sums, counts
+
+    def window_frame(self, date_range=None, column_filters=None, dimension=None, rolling_days=1, shift=None):
+        """
+        Same shape as aggregate() for the date window, read from the date cube. With
+        rolling_days > 1 each day holds the trailing rolling_days average (days before the
+        window count, days before the first loaded date do not).
+        With a shift (pd.DateOffset), each day of the window holds the values of the day
+        `shift` earlier, so a comparison period lines up with the current one.
+        """
+        sums, counts = self.date_cube(dimension, column_filters)
+        first_day = 0
+        last_day = self.n_days - 1
+        if date_range:
+            first_day = max(first_day, (date_range[0] - self.dates[0]).days)
+            last_day = min(last_day, (date_range[1] - self.dates[0]).days)
+        keys = ['date', dimension] if dimension else ['date']
+        if last_day < first_day:
+            return pd.DataFrame(columns=keys + self.column_names)
+
+        days = np.arange(first_day, last_day + 1)
+        shown_dates = np.array([self.dates[0] + timedelta(days=int(d)) for d in days], dtype=object)
+        source_days = days
+        if shift is not None:
+            # Aligned shift: day d reads the cube at its counterpart day (outside the loaded days = no data)
+            source_days = ((pd.DatetimeIndex(shown_dates) - shift) - pd.Timestamp(self.dates[0])).days.to_numpy()
+
+        # Each output day d covers days [lo, d] -> cube rows lo .. d + 1
+        hi = np.clip(source_days + 1, 0, self.n_days)
+        lo = np.maximum(hi - max(rolling_days, 1), 0)
+        window_sums = (sums[hi] - sums[lo]) / np.maximum(hi - lo, 1)[:, None, None]
+        window_counts = (counts[hi] - counts[lo]) * (source_days == hi - 1)[:, None]
+
+        day_index, value_index = np.nonzero(window_counts > 0)
+        data = {'date': shown_dates[day_index]}
+        if dimension:
+            data[dimension] = self.values[dimension][value_index]
+        for j, column in enumerate(self.column_names):
+            data[column] = window_sums[day_index, value_index, j]
+        return pd.DataFrame(data)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Dataset Snapshot
+On-disk copy of the default dashboard load, written by prewarm.py and read by the dashboard
+before it falls back to BigQuery. The data is written first and the metadata file last
+(both atomically), so a snapshot with metadata is always complete; the metadata doubles
+as the readiness marker.
+
+Location: DASHBOARD_SNAPSHOT_DIR (default /tmp/consumption_dashboard_snapshot). Point it at
+a shared volume (e.g. a Cloud Storage mount) to warm every instance from one prewarm run.
+Freshness: DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS (default 3600).
+"""
+
+import json
+import os
+import time
+
+SNAPSHOT_DIR = os.environ.get('DASHBOARD_SNAPSHOT_DIR', '/tmp/consumption_dashboard_snapshot')
+SNAPSHOT_MAX_AGE_SECONDS = int(os.environ.get('DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS', 3600))
+
+DATA_FILE = 'dataset.parquet'
+ROW_GROUP_ROWS = 100000     # Date-sorted row groups: a date-filtered read decodes only its groups
+METADATA_FILE = 'snapshot.json'
+
+def _path(name):
+    return os.path.join(SNAPSHOT_DIR, name)
+
+def _write_atomic(name, write):
+    """Write to a temp file then rename, so readers never see a partial file"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    tmp_path = _path(f".{name}.{os.getpid()}.tmp")
+    write(tmp_path)
+    os.replace(tmp_path, _path(name))
+
+def read_metadata():
+    """Snapshot metadata, or None if there is no complete snapshot"""
+    try:
+        with open(_path(METADATA_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def status(max_age_seconds=SNAPSHOT_MAX_AGE_SECONDS):
+    """Readiness: whether a complete snapshot exists and is fresh enough to serve"""
+    metadata = read_metadata()
+    if metadata is None:
+        return {'warm': False, 'reason': 'no snapshot'}
+    age = time.time() - metadata['created_at']
+    if age > max_age_seconds:
+        return {'warm': False, 'reason': f"snapshot is {age:,.0f}s old (max {max_age_seconds}s)", 'age_seconds': age}
+    return {'warm': True, 'age_seconds': age, 'rows': metadata['rows'], 'date_limit_days': metadata['date_limit_days']}
+
+def write_snapshot(df, date_limit_days=None, extra=None):
+    """Persist a loaded DataFrame and its metadata"""
+    if not df['date'].is_monotonic_increasing:
+        df = df.sort_values('date', kind='stable')
+    _write_atomic(DATA_FILE, lambda path: df.to_parquet(path, index=False, row_group_size=ROW_GROUP_ROWS))
+    metadata = {
+        'created_at': time.time(),
+        'rows': len(df),
+        'date_limit_days': date_limit_days,
+        'min_date': str(df['date'].min()) if len(df) else None,
+        'max_date': str(df['date'].max()) if len(df) else None,
+    }
+    metadata.update(extra or {})
+
+    def write(path):
+        with open(path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+    _write_atomic(METADATA_FILE, write)
+    return metadata
+
+def read_snapshot(date_limit_days=None, max_age_seconds=SNAPSHOT_MAX_AGE_SECONDS):
+    """The snapshot DataFrame if it is fresh and covers date_limit_days of history, else None"""
+    state = status(max_age_seconds)
+    if not state['warm']:
+        return None
+    loaded_days = state['date_limit_days']
+    if loaded_days is not None and (date_limit_days is None or loaded_days < date_limit_days):
+        return None
+    import pandas as pd
+    try:
+        df = pd.read_parquet(_path(DATA_FILE))
+    except Exception:
+        return None
+    if loaded_days != date_limit_days and date_limit_days:
+        # Trim a longer snapshot to the requested history, as the date-limited query would
+        cutoff = pd.Timestamp.now().normalize() - pd.Timedelta(days=date_limit_days)
+        df = df[pd.to_datetime(df['date']) >= cutoff].reset_index(drop=True)
+    return df
+
+def covers(start_date=None, max_age_seconds=SNAPSHOT_MAX_AGE_SECONDS):
+    """True if a fresh snapshot holds every day from start_date (None: all history) on"""
+    state = status(max_age_seconds)
+    if not state['warm']:
+        return False
+    if state['date_limit_days'] is None:
+        return True
+    # A date-limited snapshot does not hold the older days
+    metadata = read_metadata()
+    return start_date is not None and metadata['min_date'] is not None and str(start_date) >= metadata['min_date']
+
+def read_snapshot_range(start_date=None, end_date=None, columns=None, max_age_seconds=SNAPSHOT_MAX_AGE_SECONDS):
+    """
+    Only the rows of [start_date, end_date] (None: open) from a fresh snapshot covering the
+    range, read with a date filter so the rest of the file is never loaded (and only
+    `columns`, when given); else None
+    """
+    if not covers(start_date, max_age_seconds):
+        return None
+    filters = []
+    if start_date is not None:
+        filters.append(('date', '>=', start_date))
+    if end_date is not None:
+        filters.append(('date', '<=', end_date))
+    import pandas as pd
+    try:
+        return pd.read_parquet(_path(DATA_FILE), columns=columns, filters=filters or None)
+    except Exception:
+        return None
@@ -2,74 +2,80 @@
 -- FACT_CONSUMPTION_DAILY_AGGREGATED TABLE
 -- ================================================================
 -- Purpose: Aggregated credits inflow and outflow by source and dimensions
--- Granularity: date, source, dimension buckets (NOT by distinct_id)
--- Update Frequency: Daily (processes last 30 days)
+-- Granularity: date, dimension buckets (NOT by distinct_id), sources as columns
+-- Players: `players` (exact, per cell only) and `players_sketch` (HLL++, mergeable)
+-- Update Frequency: Daily, incremental (see python/refresh_fact_consumption_daily.py)
 -- Partition: By date
+-- Clustering: first_chapter_bucket, last_balance_bucket, is_us_player, last_version_of_day
+-- Parameters: @start_date, @end_date (DATE) - the partitions to (re)compute,
+--             bound by the refresh job
 -- ================================================================
 -- OPTIMIZATION: Aggregated at dimension level instead of player level
 -- This reduces table size significantly while maintaining all dashboard functionality
+-- OPTIMIZATION: The event table is scanned once; each row is classified as
+-- inflow or outflow, the player dimensions are joined once, and potential
+-- fraudsters are removed with a single anti-join
 -- ================================================================
 
 CREATE OR REPLACE TABLE `yotam-395120.peerplay.fact_consumption_daily_dashboard`
     PARTITION BY date
+    CLUSTER BY first_chapter_bucket, last_balance_bucket, is_us_player, last_version_of_day
 AS 
 
-WITH inflow AS (
+WITH fraudsters AS (
+    SELECT DISTINCT distinct_id
+    FROM `yotam-395120.peerplay.potential_fraudsters`
+),
+
+-- Single scan: inflow (credit rewards) and outflow (generation, bubble purchase) rows together
+events AS (
     SELECT
         e.date,
         e.distinct_id,
-        mp_event_name AS source,
-        'inflow' AS inflow_outflow,
-        -- Aggregate dimensions
+        e.mp_event_name AS source,
         CASE
-            WHEN apd.first_chapter BETWEEN 0 AND 10 THEN '0-10'
-            WHEN apd.first_chapter BETWEEN 11 AND 20 THEN '11-20'
-            WHEN apd.first_chapter BETWEEN 21 AND 50 THEN '21-50'
-            ELSE '50+'
-        END AS first_chapter_bucket,
+            WHEN e.mp_event_name IN ('generation', 'click_bubble_purchase') THEN 'outflow'
+            ELSE 'inflow'
+        END AS inflow_outflow,
+        -- Per-row value: credits rewarded (inflow) or credits spent (outflow)
         CASE
-            WHEN dp.first_country = 'US' THEN 1
-            ELSE 0
-        END AS is_us_player,
+            WHEN e.mp_event_name IN ('generation', 'click_bubble_purchase')
+                THEN (IFNULL(e.delta_credits, 0) * -1) + IFNULL(e.bubble_cost, 0)
+            ELSE e.item_quantity_1
+        END AS sum_value,
+        -- Per-row count: one per reward event, number of generations / purchases for outflow
         CASE
-            WHEN apd.last_credit_balance BETWEEN 0 AND 100 THEN '0-100'
-            WHEN apd.last_credit_balance BETWEEN 101 AND 300 THEN '101-300'
-            WHEN apd.last_credit_balance BETWEEN 301 AND 500 THEN '301-500'
-            WHEN apd.last_credit_balance BETWEEN 501 AND 1000 THEN '501-1000'
-            WHEN apd.last_credit_balance BETWEEN 1001 AND 3000 THEN '1001-3000'
-            WHEN apd.last_credit_balance BETWEEN 3001 AND 5000 THEN '3001-5000'
-            ELSE '5000+'
-        END AS last_balance_bucket,
-        COALESCE(apd.last_app_version, 0) AS last_version_of_day,
-        CASE WHEN apd.total_purchase_revenue > 0 THEN 1 ELSE 0 END AS paid_today_flag,
-        CASE WHEN dp.ltv_purchases > 0 THEN 1 ELSE 0 END AS paid_ever_flag,
-        -- Metrics
-        SUM(item_quantity_1) AS sum_value,
-        COUNT(DISTINCT e.distinct_id) AS distinct_players,
-        COUNT(*) AS cnt
+            WHEN e.mp_event_name IN ('generation', 'click_bubble_purchase') THEN
+                CASE
+                    WHEN e.number_of_events IS NULL AND e.delta_credits IS NOT NULL
+                        THEN (e.delta_credits / CASE WHEN e.mode_status = 3 THEN 6 ELSE (e.mode_status + 1) END) * -1
+                    ELSE IFNULL(e.number_of_events, 0)
+                END
+                + CASE WHEN e.mp_event_name = 'click_bubble_purchase' THEN 1 ELSE 0 END
+            ELSE 1
+        END AS cnt
     FROM `yotam-395120.peerplay.vmp_master_event_normalized` e
-    INNER JOIN `yotam-395120.peerplay.agg_player_daily` apd
-        ON e.date = apd.date
-        AND e.distinct_id = apd.distinct_id
-    LEFT JOIN `yotam-395120.peerplay.dim_player` dp
-        ON e.distinct_id = dp.distinct_id
-    WHERE e.date >= CURRENT_DATE - 14 AND e.date < CURRENT_DATE
+    LEFT JOIN fraudsters f
+        ON e.distinct_id = f.distinct_id
+    WHERE e.date BETWEEN @start_date AND @end_date
       AND e.res_timestamp IS NOT NULL
-      AND e.mp_event_name LIKE '%rewards%'
-      AND LOWER(e.item_id_1_name) LIKE '%credits%'
       AND e.mp_country_code NOT IN ('UA', 'IL', 'AM')
-      AND e.distinct_id NOT IN (SELECT distinct_id FROM `yotam-395120.peerplay.potential_fraudsters`)
-      AND dp.first_country NOT IN ('UA', 'IL', 'AM')
-    GROUP BY all
+      AND f.distinct_id IS NULL  -- Anti-join: exclude potential fraudsters
+      AND (
+          (e.mp_event_name LIKE '%rewards%' AND LOWER(e.item_id_1_name) LIKE '%credits%')
+          OR e.mp_event_name IN ('generation', 'click_bubble_purchase')
+      )
 ),
 
-outflow AS (
+-- Player-day dimensions, joined and bucketed once for both directions
+classified AS (
     SELECT
-        e.date,
-        e.distinct_id,
-        mp_event_name AS source,
-        'outflow' AS inflow_outflow,
-        -- Aggregate dimensions
+        ev.date,
+        ev.distinct_id,
+        ev.source,
+        ev.inflow_outflow,
+        ev.sum_value,
+        ev.cnt,
         CASE
             WHEN apd.first_chapter BETWEEN 0 AND 10 THEN '0-10'
             WHEN apd.first_chapter BETWEEN 11 AND 20 THEN '11-20'
@@ -91,151 +97,81 @@ outflow AS (
         END AS last_balance_bucket,
         COALESCE(apd.last_app_version, 0) AS last_version_of_day,
         CASE WHEN apd.total_purchase_revenue > 0 THEN 1 ELSE 0 END AS paid_today_flag,
-        CASE WHEN dp.ltv_purchases > 0 THEN 1 ELSE 0 END AS paid_ever_flag,
-        -- Metrics
-        (SUM(IFNULL(e.delta_credits, 0)) * -1) + SUM(IFNULL(e.bubble_cost, 0)) AS sum_value,
-        COUNT(DISTINCT e.distinct_id) AS distinct_players,
-        SUM(
-            CASE
-                WHEN e.number_of_events IS NULL AND e.delta_credits IS NOT NULL
-                    THEN (e.delta_credits / CASE WHEN e.mode_status = 3 THEN 6 ELSE (e.mode_status + 1) END) * -1
-                ELSE IFNULL(e.number_of_events, 0)
-            END
-        ) + SUM(CASE WHEN e.mp_event_name = 'click_bubble_purchase' THEN 1 ELSE 0 END) AS cnt
-    FROM `yotam-395120.peerplay.vmp_master_event_normalized` e
+        CASE WHEN dp.ltv_purchases > 0 THEN 1 ELSE 0 END AS paid_ever_flag
+    FROM events ev
     INNER JOIN `yotam-395120.peerplay.agg_player_daily` apd
-        ON e.date = apd.date
-        AND e.distinct_id = apd.distinct_id
+        ON ev.date = apd.date
+        AND ev.distinct_id = apd.distinct_id
     LEFT JOIN `yotam-395120.peerplay.dim_player` dp
-        ON e.distinct_id = dp.distinct_id
-    WHERE e.date >= CURRENT_DATE - 14 AND e.date < CURRENT_DATE
-      AND e.res_timestamp IS NOT NULL
-      AND e.mp_event_name IN ('generation', 'click_bubble_purchase')
-      AND e.mp_country_code NOT IN ('UA', 'IL', 'AM')
-      AND e.distinct_id NOT IN (SELECT distinct_id FROM `yotam-395120.peerplay.potential_fraudsters`)
+        ON ev.distinct_id = dp.distinct_id
+    WHERE apd.date BETWEEN @start_date AND @end_date
       AND dp.first_country NOT IN ('UA', 'IL', 'AM')
-    GROUP BY all 
 ),
 
-combine AS (
-    SELECT * FROM inflow
-    UNION ALL
-    SELECT * FROM outflow
-), 
-
--- Pivot sources into columns: per dimension combination, get sum_value and cnt for each source
+-- Pivot sources into columns: one row per date and dimension combination
 source_pivoted AS (
     SELECT
         date,
-        distinct_id,
         first_chapter_bucket,
         is_us_player,
         last_balance_bucket,
         last_version_of_day,
         paid_today_flag,
         paid_ever_flag,
-        -- Pivot sum_value by source (inflow sources - all 18 sources)
+        COUNT(DISTINCT distinct_id) AS players,
+        -- Mergeable HLL++ sketch of the cell's players: unlike `players`, sketches can be
+        -- merged across cells (HLL_COUNT.MERGE / dashboard), so a player in several cells is
+        -- counted once; the count is approximate (precision 14: ~0.8% relative standard error)
+        HLL_COUNT.INIT(distinct_id, 14) AS players_sketch,
+        -- Inflow sources (as columns) - all 18 sources
         SUM(CASE WHEN source = 'rewards_race' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_race_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_store' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_store_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_rolling_offer_collect' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_rolling_offer_collect_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_board_task' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_board_task_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_harvest_collect' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_harvest_collect_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_missions_total' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_missions_total_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_recipes' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_recipes_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_flowers' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_flowers_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_rewarded_video' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_rewarded_video_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_disco' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_disco_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_timed_task' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_timed_task_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_sell_board_item' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_sell_board_item_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_mass_compensation' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_mass_compensation_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_missions_task' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_missions_task_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_album_set_completion' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_album_set_completion_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_self_collectable' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_self_collectable_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_eoc' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_eoc_inflow_sum_value,
-        SUM(CASE WHEN source = 'rewards_frenzy_non_jackpot' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_frenzy_non_jackpot_inflow_sum_value,
-        -- Pivot cnt by source (inflow sources - all 18 sources)
         SUM(CASE WHEN source = 'rewards_race' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_race_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_store' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_store_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_store' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_store_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_rolling_offer_collect' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_rolling_offer_collect_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_rolling_offer_collect' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_rolling_offer_collect_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_board_task' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_board_task_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_board_task' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_board_task_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_harvest_collect' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_harvest_collect_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_harvest_collect' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_harvest_collect_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_missions_total' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_missions_total_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_missions_total' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_missions_total_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_recipes' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_recipes_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_recipes' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_recipes_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_flowers' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_flowers_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_flowers' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_flowers_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_rewarded_video' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_rewarded_video_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_rewarded_video' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_rewarded_video_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_disco' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_disco_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_disco' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_disco_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_timed_task' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_timed_task_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_timed_task' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_timed_task_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_sell_board_item' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_sell_board_item_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_sell_board_item' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_sell_board_item_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_mass_compensation' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_mass_compensation_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_mass_compensation' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_mass_compensation_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_missions_task' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_missions_task_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_missions_task' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_missions_task_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_album_set_completion' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_album_set_completion_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_album_set_completion' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_album_set_completion_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_self_collectable' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_self_collectable_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_self_collectable' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_self_collectable_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_eoc' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_eoc_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_eoc' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_eoc_inflow_cnt,
+        SUM(CASE WHEN source = 'rewards_frenzy_non_jackpot' AND inflow_outflow = 'inflow' THEN sum_value ELSE 0 END) AS rewards_frenzy_non_jackpot_inflow_sum_value,
         SUM(CASE WHEN source = 'rewards_frenzy_non_jackpot' AND inflow_outflow = 'inflow' THEN cnt ELSE 0 END) AS rewards_frenzy_non_jackpot_inflow_cnt,
-        -- Pivot sum_value by source (outflow sources - 2 sources)
+        -- Outflow sources (as columns) - 2 sources
         SUM(CASE WHEN source = 'generation' AND inflow_outflow = 'outflow' THEN sum_value ELSE 0 END) AS generation_outflow_sum_value,
-        SUM(CASE WHEN source = 'click_bubble_purchase' AND inflow_outflow = 'outflow' THEN sum_value ELSE 0 END) AS click_bubble_purchase_outflow_sum_value,
-        -- Pivot cnt by source (outflow sources - 2 sources)
         SUM(CASE WHEN source = 'generation' AND inflow_outflow = 'outflow' THEN cnt ELSE 0 END) AS generation_outflow_cnt,
+        SUM(CASE WHEN source = 'click_bubble_purchase' AND inflow_outflow = 'outflow' THEN sum_value ELSE 0 END) AS click_bubble_purchase_outflow_sum_value,
         SUM(CASE WHEN source = 'click_bubble_purchase' AND inflow_outflow = 'outflow' THEN cnt ELSE 0 END) AS click_bubble_purchase_outflow_cnt
-    FROM combine
-    WHERE date >= CURRENT_DATE - 14 AND date < CURRENT_DATE
-    GROUP BY ALL 
+    FROM classified
+    GROUP BY ALL
 )
 
--- Final output: Pivoted by source (sources as columns instead of rows)
+-- Final output: Pivoted by source (sources as columns instead of rows) plus calculated totals
 SELECT
-    date,
-    first_chapter_bucket,
-    is_us_player,
-    last_balance_bucket,
-    last_version_of_day,
-    paid_today_flag,
-    paid_ever_flag,
-    count(distinct distinct_id) as players,
-    -- Inflow sources (as columns) - all 18 sources
-    sum(rewards_race_inflow_sum_value) as rewards_race_inflow_sum_value,
-    sum(rewards_race_inflow_cnt) as rewards_race_inflow_cnt,
-    sum(rewards_store_inflow_sum_value) as rewards_store_inflow_sum_value,
-    sum(rewards_store_inflow_cnt) as rewards_store_inflow_cnt,
-    sum(rewards_rolling_offer_collect_inflow_sum_value) as rewards_rolling_offer_collect_inflow_sum_value,
-    sum(rewards_rolling_offer_collect_inflow_cnt) as rewards_rolling_offer_collect_inflow_cnt,
-    sum(rewards_board_task_inflow_sum_value) as rewards_board_task_inflow_sum_value,
-    sum(rewards_board_task_inflow_cnt) as rewards_board_task_inflow_cnt,
-    sum(rewards_harvest_collect_inflow_sum_value) as rewards_harvest_collect_inflow_sum_value,
-    sum(rewards_harvest_collect_inflow_cnt) as rewards_harvest_collect_inflow_cnt,
-    sum(rewards_missions_total_inflow_sum_value) as rewards_missions_total_inflow_sum_value,
-    sum(rewards_missions_total_inflow_cnt) as rewards_missions_total_inflow_cnt,
-    sum(rewards_recipes_inflow_sum_value) as rewards_recipes_inflow_sum_value,
-    sum(rewards_recipes_inflow_cnt) as rewards_recipes_inflow_cnt,
-    sum(rewards_flowers_inflow_sum_value) as rewards_flowers_inflow_sum_value,
-    sum(rewards_flowers_inflow_cnt) as rewards_flowers_inflow_cnt,
-    sum(rewards_rewarded_video_inflow_sum_value) as rewards_rewarded_video_inflow_sum_value,
-    sum(rewards_rewarded_video_inflow_cnt) as rewards_rewarded_video_inflow_cnt,
-    sum(rewards_disco_inflow_sum_value) as rewards_disco_inflow_sum_value,
-    sum(rewards_disco_inflow_cnt) as rewards_disco_inflow_cnt,
-    sum(rewards_timed_task_inflow_sum_value) as rewards_timed_task_inflow_sum_value,
-    sum(rewards_timed_task_inflow_cnt) as rewards_timed_task_inflow_cnt,
-    sum(rewards_sell_board_item_inflow_sum_value) as rewards_sell_board_item_inflow_sum_value,
-    sum(rewards_sell_board_item_inflow_cnt) as rewards_sell_board_item_inflow_cnt,
-    sum(rewards_mass_compensation_inflow_sum_value) as rewards_mass_compensation_inflow_sum_value,
-    sum(rewards_mass_compensation_inflow_cnt) as rewards_mass_compensation_inflow_cnt,
-    sum(rewards_missions_task_inflow_sum_value) as rewards_missions_task_inflow_sum_value,
-    sum(rewards_missions_task_inflow_cnt) as rewards_missions_task_inflow_cnt,
-    sum(rewards_album_set_completion_inflow_sum_value) as rewards_album_set_completion_inflow_sum_value,
-    sum(rewards_album_set_completion_inflow_cnt) as rewards_album_set_completion_inflow_cnt,
-    sum(rewards_self_collectable_inflow_sum_value) as rewards_self_collectable_inflow_sum_value,
-    sum(rewards_self_collectable_inflow_cnt) as rewards_self_collectable_inflow_cnt,
-    sum(rewards_eoc_inflow_sum_value) as rewards_eoc_inflow_sum_value,
-    sum(rewards_eoc_inflow_cnt) as rewards_eoc_inflow_cnt,
-    sum(rewards_frenzy_non_jackpot_inflow_sum_value) as rewards_frenzy_non_jackpot_inflow_sum_value,
-    sum(rewards_frenzy_non_jackpot_inflow_cnt) as rewards_frenzy_non_jackpot_inflow_cnt,
-    -- Outflow sources (as columns) - 2 sources
-    sum(generation_outflow_sum_value) as generation_outflow_sum_value,
-    sum(generation_outflow_cnt) as generation_outflow_cnt,
-    sum(click_bubble_purchase_outflow_sum_value) as click_bubble_purchase_outflow_sum_value,
-    sum(click_bubble_purchase_outflow_cnt) as click_bubble_purchase_outflow_cnt,
-    -- Calculated totals
+    *,
     -- Total inflow: sum of all inflow sources
     (rewards_race_inflow_sum_value +
      rewards_store_inflow_sum_value +
@@ -255,7 +191,7 @@ SELECT
      rewards_self_collectable_inflow_sum_value +
      rewards_eoc_inflow_sum_value +
      rewards_frenzy_non_jackpot_inflow_sum_value) AS total_inflow,
-    -- Total free inflow: all inflow sources EXCEPT rewards_store and rewards_rolling_offer_collect
+    -- Total free inflow: all inflow sources EXCEPT rewards_store, rewards_rolling_offer_collect and rewards_disco
     (rewards_race_inflow_sum_value +
      rewards_board_task_inflow_sum_value +
      rewards_harvest_collect_inflow_sum_value +
@@ -271,12 +207,11 @@ SELECT
      rewards_self_collectable_inflow_sum_value +
      rewards_eoc_inflow_sum_value +
      rewards_frenzy_non_jackpot_inflow_sum_value) AS total_free_inflow,
-    -- Total paid inflow: rewards_store and rewards_rolling_offer_collect only
+    -- Total paid inflow: rewards_store, rewards_rolling_offer_collect and rewards_disco
     (rewards_store_inflow_sum_value +
-     rewards_rolling_offer_collect_inflow_sum_value+rewards_disco_inflow_sum_value) AS total_paid_inflow,
-    -- Total outflow: sum of all outflow sources (already calculated as total_outflow_per_dimension_per_day, but adding explicit calculation)
+     rewards_rolling_offer_collect_inflow_sum_value +
+     rewards_disco_inflow_sum_value) AS total_paid_inflow,
+    -- Total outflow: sum of all outflow sources
     (generation_outflow_sum_value +
      click_bubble_purchase_outflow_sum_value) AS total_outflow
-FROM source_pivoted
-WHERE date >= CURRENT_DATE - 14 AND date < CURRENT_DATE
-GROUP BY ALL ;
+FROM source_pivoted;
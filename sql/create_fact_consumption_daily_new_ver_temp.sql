@@ -3,8 +3,10 @@
 -- ================================================================
 -- Purpose: Documents credits inflow and outflow by source
 -- Granularity: date, distinct_id, source (mp_event_name)
--- Update Frequency: Daily (processes last 7 days)
+-- Update Frequency: Daily, incremental (see python/refresh_fact_consumption_daily.py)
 -- Partition: By date
+-- Parameters: @start_date, @end_date (DATE) - the partitions to (re)compute,
+--             bound by the refresh job
 -- ================================================================
 
 CREATE OR REPLACE TABLE `yotam-395120.peerplay.fact_consumption_daily_new_ver_temp`
@@ -20,7 +22,7 @@ WITH inflow AS (
         SUM(item_quantity_1) AS sum_value,
         COUNT(*) AS cnt
     FROM `yotam-395120.peerplay.vmp_master_event_normalized`
-    WHERE date >= CURRENT_DATE - 7
+    WHERE date BETWEEN @start_date AND @end_date
       AND res_timestamp IS NOT NULL
       AND mp_event_name LIKE '%rewards%'
       AND LOWER(item_id_1_name) LIKE '%credits%'
@@ -44,7 +46,7 @@ outflow AS (
             END
         ) + SUM(CASE WHEN mp_event_name = 'click_bubble_purchase' THEN 1 ELSE 0 END) AS cnt
     FROM `yotam-395120.peerplay.vmp_master_event_normalized`
-    WHERE date >= CURRENT_DATE - 7
+    WHERE date BETWEEN @start_date AND @end_date
       AND res_timestamp IS NOT NULL
       AND mp_event_name IN ('generation', 'click_bubble_purchase')
       AND mp_country_code NOT IN ('UA', 'IL', 'AM')
@@ -90,7 +92,7 @@ player_dimensions AS (
     FROM `yotam-395120.peerplay.agg_player_daily` apd
     LEFT JOIN `yotam-395120.peerplay.dim_player` dp
         ON apd.distinct_id = dp.distinct_id
-    WHERE apd.date >= CURRENT_DATE - 7
+    WHERE apd.date BETWEEN @start_date AND @end_date
       AND dp.first_country NOT IN ('UA', 'IL', 'AM')
       AND apd.distinct_id NOT IN (SELECT distinct_id FROM `yotam-395120.peerplay.potential_fraudsters`)
 )
@@ -115,7 +117,7 @@ FROM combine c
 LEFT JOIN player_dimensions pd
     ON c.date = pd.date
     AND c.distinct_id = pd.distinct_id
-WHERE c.date >= CURRENT_DATE - 7;
+WHERE c.date BETWEEN @start_date AND @end_date;
 
 
 
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Startup Profile
+Deferred imports and cold-start timing for the dashboard.
+
+Heavy modules (pandas, plotly, google-cloud-bigquery, ...) are wrapped in LazyModule and
+imported on first attribute access, so the login page is served before the data stack
+loads. Every deferred import and startup milestone is timed; set DASHBOARD_STARTUP_PROFILE=1
+to log the profile and show it in the sidebar.
+
+Usage (standalone import timings of the deferred modules):
+    python startup_profile.py
+"""
+
+import importlib
+import os
+import sys
+import threading
+import time
+
+PROCESS_START = time.perf_counter()
+
+# Modules the dashboard defers, in the order the data path first needs them
+DEFERRED_MODULES = [
+    'numpy',
+    'pandas',
+    'google.auth',
+    'google.oauth2.service_account',
+    'google.cloud.bigquery',
+    'plotly.graph_objects',
+    'plotly.express',
+    'plotly.subplots',
+]
+
+_timings = {}       # Module name -> import seconds (first import only)
+_milestones = {}    # Milestone -> seconds since PROCESS_START (first occurrence only)
+_lock = threading.Lock()
+_prewarm_thread = None
+
+def enabled():
+    return os.environ.get('DASHBOARD_STARTUP_PROFILE', '').lower() in ('1', 'true', 'yes')
+
+def import_module(name):
+    """Import a module, recording how long the first import took"""
+    if name in sys.modules:
+        return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    with _lock:
+        _timings.setdefault(name, time.perf_counter() - start)
+    return module
+
+def mark(milestone):
+    """Record the first time a startup milestone is reached"""
+    with _lock:
+        if milestone not in _milestones:
+            _milestones[milestone] = time.perf_counter() - PROCESS_START
+            if enabled():
+                print(f"[startup] {milestone}: {_milestones[milestone]:.3f}s", flush=True)
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access"""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'deferred'
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+def prewarm(modules=None):
+    """Import deferred modules on a background thread (e.g. while the login page is shown), once per process"""
+    global _prewarm_thread
+    with _lock:
+        if _prewarm_thread is not None:
+            return _prewarm_thread
+
+    def run():
+        for name in modules or DEFERRED_MODULES:
+            try:
+                import_module(name)
+            except Exception:
+                # The foreground import will surface the error where it is needed
+                pass
+        mark('data stack imported')
+    with _lock:
+        if _prewarm_thread is None:
+            _prewarm_thread = threading.Thread(target=run, name='import-prewarm', daemon=True)
+            _prewarm_thread.start()
+        return _prewarm_thread
+
+def report():
+    """Snapshot of import timings (slowest first) and milestones"""
+    with _lock:
+        imports = sorted(_timings.items(), key=lambda item: item[1], reverse=True)
+        milestones = sorted(_milestones.items(), key=lambda item: item[1])
+    return {'imports': imports, 'milestones': milestones}
+
+def format_report(profile=None):
+    profile = profile or report()
+    lines = ["Startup milestones (since the dashboard module was first loaded):"]
+    lines += [f"  {seconds:8.3f}s  {name}" for name, seconds in profile['milestones']]
+    lines.append("Deferred imports (first import, includes not-yet-loaded dependencies):")
+    lines += [f"  {seconds:8.3f}s  {name}" for name, seconds in profile['imports']]
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    mark('profiler started')
+    for module_name in DEFERRED_MODULES:
+        try:
+            import_module(module_name)
+        except ImportError as e:
+            print(f"  skipped {module_name}: {e}")
+    mark('all deferred modules imported')
+    print(format_report())
@@ -0,0 +1,180 @@
+"""
+DateChunkedStore ingest, retention and backfill.
+"""
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import date_store
+from date_store import DateChunkedStore
+
+END = date(2024, 3, 31)
+ROWS_PER_DAY = 3
+
+def frame(first_day, last_day, outflow=None):
+    """ROWS_PER_DAY rows per day; total_outflow is the day's ordinal unless given"""
+    days = [first_day + timedelta(days=d) for d in range((last_day - first_day).days + 1)]
+    dates = np.repeat(days, ROWS_PER_DAY)
+    return pd.DataFrame({
+        'date': dates,
+        'is_us_player': np.tile([True, False, True], len(days)),
+        'first_chapter_bucket': np.tile(['1-5', '6-10', None], len(days)),
+        'total_outflow': [float(outflow if outflow is not None else d.toordinal()) for d in dates],
+        'total_inflow': np.arange(len(dates), dtype=np.int64),
+    })
+
+def days_before(n):
+    return END - timedelta(days=n)
+
+def outflow_by_date(dataset):
+    sums = np.bincount(dataset.date_codes, weights=dataset.columns['total_outflow'])
+    return dict(zip(dataset.dates.tolist(), sums.tolist()))
+
+# ============================================================================
+# INGEST
+# ============================================================================
+
+def test_ingest_pages_in_any_order():
+    df = frame(days_before(9), END)
+    # Out of order, with one day spread over two pages
+    pages = [df.iloc[15:], df.iloc[:4], df.iloc[4:15]]
+    store = DateChunkedStore().ingest(pages)
+    assert store.n_days == 10 and len(store) == 30
+    assert (store.min_date, store.max_date) == (days_before(9), END)
+
+    dataset = store.to_dataset()
+    assert list(dataset.dates) == sorted(df['date'].unique())
+    assert outflow_by_date(dataset) == {d: ROWS_PER_DAY * float(d.toordinal()) for d in dataset.dates}
+    assert dataset.columns['total_inflow'].sum() == df['total_inflow'].sum()
+
+def test_dimension_codes_follow_sorted_values():
+    store = DateChunkedStore().ingest([frame(days_before(1), END)])
+    dataset = store.to_dataset()
+    values = dataset.values['first_chapter_bucket']
+    assert list(values[:2]) == ['1-5', '6-10'] and pd.isna(values[2])
+    decoded = values[dataset.codes['first_chapter_bucket']]
+    assert list(decoded[:2]) == ['1-5', '6-10'] and pd.isna(decoded[2])
+
+def test_arrow_pages_match_frames():
+    df = frame(days_before(4), END)
+    from_frames = DateChunkedStore().ingest([df]).to_dataset()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    from_arrow = DateChunkedStore().ingest(table.to_batches(max_chunksize=4)).to_dataset()
+    assert list(from_arrow.dates) == list(from_frames.dates)
+    for column in from_frames.columns:
+        assert np.array_equal(from_arrow.columns[column], from_frames.columns[column])
+    for dimension in from_frames.codes:
+        assert np.array_equal(from_arrow.codes[dimension], from_frames.codes[dimension])
+
+def test_reloaded_day_replaces_held_day():
+    store = DateChunkedStore().ingest([frame(days_before(2), END)])
+    store.append(frame(END, END, outflow=1.0))
+    assert len(store) == 9
+    assert outflow_by_date(store.to_dataset())[END] == ROWS_PER_DAY
+
+def test_page_without_store_columns_is_rejected():
+    store = DateChunkedStore().ingest([frame(days_before(2), days_before(1))])
+    with pytest.raises(ValueError, match='total_inflow'):
+        store.append(frame(END, END).drop(columns=['total_inflow']))
+
+def test_published_dataset_shares_the_store_arrays():
+    store = DateChunkedStore().ingest([frame(days_before(3), END)])
+    dataset = store.to_dataset()
+    for chunk in store.chunks_between():
+        assert np.shares_memory(chunk.columns['total_outflow'], dataset.columns['total_outflow'])
+    assert store.nbytes == sum(chunk.nbytes for chunk in store.chunks_between())
+
+def test_chunks_between():
+    store = DateChunkedStore().ingest([frame(days_before(9), END)])
+    chunks = store.chunks_between(days_before(5), days_before(3))
+    assert [chunk.date for chunk in chunks] == [days_before(5), days_before(4), days_before(3)]
+    assert store.chunks_between(END + timedelta(days=1)) == []
+
+# ============================================================================
+# RETENTION
+# ============================================================================
+
+def test_retention_drops_days_outside_the_window():
+    store = DateChunkedStore(retention_days=5).ingest([frame(days_before(9), END)])
+    assert store.apply_retention() == 5
+    assert (store.min_date, store.max_date) == (days_before(4), END)
+    assert store.history_start == days_before(4)
+    assert store.missing_before(days_before(5))
+    assert not store.missing_before(days_before(4))
+
+def test_budget_drops_oldest_days_and_keeps_the_newest():
+    store = DateChunkedStore().ingest([frame(days_before(9), END)])
+    day_bytes = store.chunks_between(END)[0].nbytes
+    store.budget_bytes = 3 * day_bytes
+    assert store.apply_retention() == 7
+    assert store.min_date == days_before(2)
+    store.budget_bytes = 1
+    store.apply_retention()
+    assert store.n_days == 1 and store.max_date == END
+
+# ============================================================================
+# BACKFILL
+# ============================================================================
+
+def test_backfill_is_kept_through_retention_until_its_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(date_store.time, 'time', lambda: now[0])
+    store = DateChunkedStore(retention_days=5, backfill_ttl_seconds=60)
+    store.ingest([frame(days_before(4), END)])
+    store.apply_retention()
+
+    store.backfill([frame(days_before(9), days_before(5))], days_before(9))
+    assert store.history_start == days_before(9)
+    assert not store.missing_before(days_before(9))
+    assert store.apply_retention() == 0
+    assert store.n_days == 10
+
+    # A new day arrives: still within the backfill TTL
+    store.append(frame(END + timedelta(days=1), END + timedelta(days=1)))
+    assert store.apply_retention() == 0
+
+    now[0] += 61
+    assert store.apply_retention() == 6
+    assert store.min_date == days_before(3)
+    assert store.history_start == days_before(3)
+    assert store.missing_before(days_before(4))
+
+def test_ingest_enforces_the_budget():
+    store = DateChunkedStore().ingest([frame(days_before(2), END)])
+    store.budget_bytes = 3 * store.chunks_between(END)[0].nbytes
+    store.append(frame(END + timedelta(days=1), END + timedelta(days=1)))
+    assert store.n_days == 3 and store.min_date == days_before(1)
+    assert store.trimmed_by_budget() and store.missing_before(days_before(2))
+
+def test_backfill_range_is_cut_to_the_budget_headroom():
+    store = DateChunkedStore(retention_days=3).ingest([frame(days_before(9), END)])
+    store.apply_retention()
+    day_bytes = store.chunks_between(END)[0].nbytes
+    store.budget_bytes = 5 * day_bytes
+    assert store.backfill_range(days_before(9)) == (days_before(4), days_before(3))
+    assert store.backfill_range(END) is None
+
+    # Full: nothing to fetch, so a rerun does not query days the budget would drop again
+    store.budget_bytes = 3 * day_bytes
+    assert store.backfill_range(days_before(9)) is None
+
+def test_backfill_over_budget_starts_history_where_the_budget_cut():
+    store = DateChunkedStore(retention_days=3).ingest([frame(days_before(2), END)])
+    store.budget_bytes = 4 * store.chunks_between(END)[0].nbytes
+    store.backfill([frame(days_before(5), days_before(3))], days_before(5))
+    assert store.n_days == 4 and store.history_start == days_before(3)
+    assert store.trimmed_by_budget()
+    assert store.backfill_range(days_before(5)) is None
+
+def test_budget_overrides_backfill_ttl():
+    store = DateChunkedStore(retention_days=5, backfill_ttl_seconds=3600)
+    store.ingest([frame(days_before(4), END)])
+    store.backfill([frame(days_before(9), days_before(5))], days_before(9))
+    store.budget_bytes = 5 * store.chunks_between(END)[0].nbytes
+    assert store.apply_retention() == 5
+    assert store.min_date == days_before(4)
+    assert store.missing_before(days_before(5))
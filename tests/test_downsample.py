@@ -0,0 +1,128 @@
+"""
+LTTB and min/max envelope point selection, and figure downsampling.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import pytest
+
+from downsample import downsample_figure, envelope_indices, lttb_indices
+
+def reference_lttb(x, y, n_out):
+    """Plain-loop LTTB (Steinarsson 2013) with the same bucket boundaries"""
+    n = len(y)
+    every = (n - 2) / (n_out - 2)
+    selected = [0]
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = int(1 + i * every), int(1 + (i + 1) * every)
+        next_hi = min(int(1 + (i + 2) * every), n) if i + 2 < n_out - 1 else n
+        cx = sum(x[hi:next_hi]) / (next_hi - hi)
+        cy = sum(y[hi:next_hi]) / (next_hi - hi)
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        a = best
+    return selected + [n - 1]
+
+# ============================================================================
+# LTTB
+# ============================================================================
+
+@pytest.mark.parametrize('n, n_out', [(1000, 100), (365, 50), (101, 3), (50, 49)])
+def test_lttb_matches_reference(n, n_out):
+    rng = np.random.default_rng(n)
+    x = np.arange(n, dtype=np.float64)
+    y = rng.normal(size=n).cumsum()
+    assert lttb_indices(x, y, n_out).tolist() == reference_lttb(x.tolist(), y.tolist(), n_out)
+
+def test_lttb_keeps_endpoints_and_one_point_per_bucket():
+    n, n_out = 997, 120
+    y = np.sin(np.arange(n) / 20)
+    indices = lttb_indices(np.arange(n), y, n_out)
+    assert len(indices) == n_out
+    assert indices[0] == 0 and indices[-1] == n - 1
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    assert np.all((indices[1:-1] >= edges[:-1]) & (indices[1:-1] < edges[1:]))
+
+def test_lttb_keeps_spikes():
+    y = np.zeros(2000)
+    y[777], y[1500] = 50.0, -30.0
+    indices = lttb_indices(np.arange(2000), y, 100)
+    assert 777 in indices and 1500 in indices
+
+def test_lttb_leaves_short_series_alone():
+    assert lttb_indices(np.arange(10), np.ones(10), 10).tolist() == list(range(10))
+    assert lttb_indices(np.arange(10), np.ones(10), 2).tolist() == list(range(10))
+
+def test_lttb_nan_is_treated_as_zero():
+    y = np.ones(500)
+    y[::7] = np.nan
+    indices = lttb_indices(np.arange(500), y, 50)
+    assert len(indices) == 50 and np.all(np.diff(indices) > 0)
+
+# ============================================================================
+# ENVELOPE
+# ============================================================================
+
+def test_envelope_keeps_bucket_extremes_of_every_series():
+    rng = np.random.default_rng(7)
+    ys = rng.gamma(2.0, 10.0, size=(3, 1000))
+    n_out = 200
+    indices = envelope_indices(ys, n_out)
+    assert len(indices) <= n_out
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+    for y in ys:
+        assert y.argmin() in indices and y.argmax() in indices
+
+def test_envelope_halves_buckets_until_it_fits():
+    # Four series with extremes in different places cannot keep 2 points per series per bucket
+    rng = np.random.default_rng(8)
+    ys = rng.normal(size=(4, 5000))
+    indices = envelope_indices(ys, 100)
+    assert 2 <= len(indices) <= 100
+    for y in ys:
+        assert y.argmax() in indices
+
+def test_envelope_leaves_short_series_alone():
+    assert envelope_indices([[1, 2, 3]], 3).tolist() == [0, 1, 2]
+
+# ============================================================================
+# FIGURES
+# ============================================================================
+
+def daily_x(n):
+    return pd.date_range('2022-01-01', periods=n, freq='D')
+
+def test_line_traces_are_thinned_with_their_attributes():
+    n = 1500
+    fig = go.Figure([go.Scatter(x=daily_x(n), y=np.arange(n), customdata=np.arange(n)),
+                     go.Scatter(x=daily_x(100), y=np.arange(100))])
+    downsample_figure(fig, 300)
+    long, short = fig.data
+    assert len(long.x) == len(long.y) == len(long.customdata) == 300
+    assert np.array_equal(np.asarray(long.customdata), np.asarray(long.y))
+    assert len(short.x) == 100
+
+def test_stacked_bars_share_one_envelope():
+    n = 1200
+    rng = np.random.default_rng(9)
+    fig = go.Figure([go.Bar(x=daily_x(n), y=rng.gamma(2.0, size=n)) for _ in range(3)])
+    fig.update_layout(barmode='stack')
+    downsample_figure(fig, 200)
+    kept = [np.asarray(trace.x) for trace in fig.data]
+    assert all(np.array_equal(kept[0], other) for other in kept[1:])
+    assert len(kept[0]) <= 200
+    # Widened bars still tile the full date range
+    day_ms = 86400000
+    assert np.asarray(fig.data[0].width).sum() == n * day_ms
+
+def test_bars_on_different_grids_are_left_alone():
+    fig = go.Figure([go.Bar(x=daily_x(1000), y=np.ones(1000)), go.Bar(x=daily_x(900), y=np.ones(900))])
+    downsample_figure(fig, 100)
+    assert [len(trace.x) for trace in fig.data] == [1000, 900]
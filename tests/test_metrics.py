@@ -0,0 +1,83 @@
+"""
+Metric registry: the NumPy and SQL compilations of a metric list give the same numbers.
+
+The pushdown SQL runs on SQLite here; its columns are REAL so `/` divides as in BigQuery.
+"""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import metrics
+import views
+
+TABLE = 'fact_consumption_daily_dashboard'
+
+ALL_METRICS = (list(metrics.METRICS.values())
+               + metrics.source_free_shares(views.FREE_SOURCES, views.source_column)
+               + metrics.source_rtps(views.FREE_SOURCES, views.source_column))
+
+@pytest.fixture
+def table():
+    """Cells over 6 days x 2 countries, with zero-inflow and zero-outflow groups and NULLs"""
+    rng = np.random.default_rng(0)
+    columns = list(dict.fromkeys(c for m in ALL_METRICS for part in (m.numerator, m.denominator)
+                                 for c in part.columns))
+    n = 60
+    df = pd.DataFrame({
+        'date': np.repeat([f'2024-01-0{d}' for d in range(1, 7)], n // 6),
+        'is_us_player': np.tile([1, 0], n // 2),
+    })
+    for c in columns:
+        df[c] = rng.gamma(1.5, 400, n).round()
+    df['total_outflow'] = -df['total_outflow']
+    # A day without inflow and one without outflow: ratios over them are 0, not errors
+    df.loc[df['date'] == '2024-01-02', 'total_inflow'] = 0
+    df.loc[df['date'] == '2024-01-03', 'total_outflow'] = 0
+    # Missing values sum as nothing (SUM skips NULL; COALESCE covers all-NULL groups)
+    df.loc[df['date'] == '2024-01-04', 'rewards_race_inflow_sum_value'] = np.nan
+    df.loc[5, 'total_paid_inflow'] = np.nan
+
+    connection = sqlite3.connect(':memory:')
+    column_sql = ", ".join(['date TEXT', 'is_us_player INTEGER'] + [f'{c} REAL' for c in columns])
+    connection.execute(f"CREATE TABLE {TABLE} ({column_sql})")
+    connection.executemany(f"INSERT INTO {TABLE} VALUES ({', '.join('?' * len(df.columns))})",
+                           df.astype(object).where(df.notna(), None).itertuples(index=False))
+    yield df, connection
+    connection.close()
+
+def numpy_result(df, compiled, keys):
+    sums = df.groupby(list(keys), sort=True)[compiled.columns].sum()
+    return sums.index, compiled.evaluate(sums)
+
+@pytest.mark.parametrize('keys', [('date',), ('date', 'is_us_player')])
+def test_numpy_and_sql_agree(table, keys):
+    df, connection = table
+    compiled = metrics.compile_numpy(ALL_METRICS)
+    index, expected = numpy_result(df, compiled, keys)
+
+    sql = metrics.compile_sql(ALL_METRICS, TABLE, keys)
+    result = pd.read_sql_query(sql, connection)
+    assert len(result) == len(index)
+    for i, metric in enumerate(ALL_METRICS):
+        assert np.allclose(result[metric.key].to_numpy(), expected[i]), metric.key
+
+def test_sql_where_clause(table):
+    df, connection = table
+    sql = metrics.compile_sql([metrics.RTP], TABLE, where="date >= '2024-01-05'")
+    result = pd.read_sql_query(sql, connection)
+    _, expected = numpy_result(df[df['date'] >= '2024-01-05'], metrics.compile_numpy([metrics.RTP]), ('date',))
+    assert result['date'].tolist() == ['2024-01-05', '2024-01-06']
+    assert np.allclose(result['rtp_pct'], expected[0])
+
+def test_non_positive_denominator_is_zero():
+    sums = {'total_inflow': [0.0, -5.0, 10.0], 'total_outflow': [-3.0, -3.0, -4.0]}
+    assert metrics.evaluate(metrics.CONSUMPTION, sums).tolist() == [0.0, 0.0, 40.0]
+
+def test_absolute_sums():
+    # Outflow is stored negative: RTP and consumption use its absolute value
+    sums = {'total_free_inflow': [30.0], 'total_outflow': [-60.0], 'total_inflow': [120.0]}
+    assert metrics.evaluate(metrics.RTP, sums).tolist() == [50.0]
+    assert metrics.evaluate(metrics.CONSUMPTION, sums).tolist() == [50.0]
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Dashboard Views (data only)
+The series behind the five dashboard views, computed from any frame of date[, dimension]
+rows with summable metric columns (the shared dataset aggregate or raw table rows).
+Chart functions, the export API and batch reports all build on these, so every output
+shows the same numbers. No Plotly here.
+
+Every series is reindexed to the full date (x dimension value) grid of the range, with
+zeros where there is no data, and sorted by date. Ratios come from the metric registry
+(metrics.py), the same definitions the pushdown SQL is compiled from.
+"""
+
+import pandas as pd
+
+import metrics
+
+# Free inflow sources (all inflow sources EXCEPT paid ones)
+# Based on SQL: total_free_inflow excludes rewards_store, rewards_rolling_offer_collect, rewards_disco
+FREE_SOURCES = [
+    'rewards_race', 'rewards_board_task', 'rewards_harvest_collect',
+    'rewards_missions_total', 'rewards_recipes', 'rewards_flowers',
+    'rewards_rewarded_video', 'rewards_timed_task', 'rewards_sell_board_item',
+    'rewards_mass_compensation', 'rewards_missions_task', 'rewards_album_set_completion',
+    'rewards_self_collectable', 'rewards_eoc', 'rewards_frenzy_non_jackpot'
+]
+
+TOTAL_COLUMNS = ['total_inflow', 'total_free_inflow', 'total_paid_inflow', 'total_outflow']
+
+def source_column(source):
+    return f'{source}_inflow_sum_value'
+
+# ============================================================================
+# AGGREGATION
+# ============================================================================
+
+def _as_date(value):
+    if isinstance(value, tuple):
+        value = value[0]
+    if isinstance(value, pd.Timestamp):
+        value = value.date()
+    return value
+
+def sum_by_date(df, dimension=None, columns=None, date_range=None, dimension_values=None):
+    """
+    Sum columns per date (and dimension value) over the full grid of the date range
+    (the data's own min/max if no range is given); missing cells are zero.
+    """
+    columns = [c for c in (columns or TOTAL_COLUMNS) if c in df.columns]
+    keys = ['date', dimension] if dimension else ['date']
+    if len(df) == 0:
+        return pd.DataFrame(columns=keys + columns)
+
+    if date_range and len(date_range) == 2 and None not in date_range:
+        min_date, max_date = (_as_date(d) for d in date_range)
+    else:
+        min_date, max_date = _as_date(df['date'].min()), _as_date(df['date'].max())
+    all_dates = pd.date_range(start=min_date, end=max_date, freq='D').date
+
+    sums = df.groupby(keys, sort=False)[columns].sum()
+    if dimension:
+        if dimension_values is None:
+            dimension_values = sorted(df[dimension].dropna().unique())
+        grid = pd.MultiIndex.from_product([all_dates, dimension_values], names=keys)
+    else:
+        grid = pd.Index(all_dates, name='date')
+    return sums.reindex(grid, fill_value=0).reset_index()
+
+def _by_source(df, dimension, date_range, sources, dimension_values, family, name):
+    """
+    Long (date[, dimension], source) frame of free inflow per source, plus the per-source
+    metric family evaluated on the per-cell sums as column `name`
+    """
+    columns = [source_column(s) for s in sources] + ['total_outflow']
+    sums = sum_by_date(df, dimension, columns, date_range, dimension_values)
+    keys = ['date', dimension] if dimension else ['date']
+    long = sums.melt(
+        id_vars=keys,
+        value_vars=[source_column(s) for s in sources],
+        var_name='source', value_name='Free Inflow'
+    )
+    long['source'] = long['source'].str.slice(0, -len('_inflow_sum_value'))
+    # melt stacks sources one after another, as the rows of the evaluated (source, cell) matrix
+    long[name] = metrics.compile_numpy(family(sources, source_column)).evaluate(sums).ravel()
+    return long, keys
+
+# ============================================================================
+# VIEW SERIES
+# ============================================================================
+
+def consumption_series(df, dimension=None, date_range=None, dimension_values=None):
+    """Daily Consumption: outflow / inflow % (plus the components the credits view uses)"""
+    sums = sum_by_date(df, dimension, TOTAL_COLUMNS, date_range, dimension_values)
+    if len(sums) == 0:
+        return sums
+    keys = ['date', dimension] if dimension else ['date']
+    return pd.DataFrame({
+        **{key: sums[key] for key in keys},
+        'total_outflow': -sums['total_outflow'].abs(),      # Negative for display (below zero)
+        'total_free_inflow': sums['total_free_inflow'],
+        'total_paid_inflow': sums['total_paid_inflow'],
+        'consumption': metrics.evaluate(metrics.CONSUMPTION, sums)
+    })
+
+def credits_components_series(df, dimension=None, date_range=None, dimension_values=None):
+    """Credits Components: outflow (negative) and total inflow (free + paid) per day"""
+    series = consumption_series(df, dimension, date_range, dimension_values)
+    if len(series) == 0:
+        return series
+    keys = ['date', dimension] if dimension else ['date']
+    return pd.DataFrame({
+        **{key: series[key] for key in keys},
+        'total_outflow': series['total_outflow'],
+        'total_inflow': series['total_free_inflow'] + series['total_paid_inflow']
+    })
+
+def free_vs_paid_series(df, dimension=None, date_range=None, dimension_values=None):
+    """Daily Free vs Paid Inflow: absolute credits and share of total inflow"""
+    sums = sum_by_date(df, dimension, TOTAL_COLUMNS, date_range, dimension_values)
+    if len(sums) == 0:
+        return sums
+    keys = ['date', dimension] if dimension else ['date']
+    free_share, paid_share = metrics.compile_numpy([metrics.FREE_SHARE, metrics.PAID_SHARE]).evaluate(sums)
+    return pd.DataFrame({
+        **{key: sums[key] for key in keys},
+        'Free Inflow': sums['total_free_inflow'],
+        'Paid Inflow': sums['total_paid_inflow'],
+        'Free Share %': free_share,
+        'Paid Share %': paid_share
+    })
+
+def free_share_by_source_series(df, dimension=None, date_range=None, dimension_values=None, sources=None):
+    """Daily Free Share by Source: each free source's share of the day's free inflow"""
+    if sources is None:
+        # Sources with any free inflow in the data
+        sources = [s for s in FREE_SOURCES if source_column(s) in df.columns and (df[source_column(s)] > 0).any()]
+    if len(df) == 0 or not sources:
+        return pd.DataFrame(columns=['date'] + ([dimension] if dimension else []) + ['source', 'Free Inflow', 'Share'])
+    long, keys = _by_source(df, dimension, date_range, sources, dimension_values, metrics.source_free_shares, 'Share')
+    return long.sort_values(keys + ['source'], kind='stable').reset_index(drop=True)
+
+def rtp_by_source_series(df, dimension=None, date_range=None, dimension_values=None, sources=None):
+    """Daily RTP by Source: each free source's inflow as % of the day's outflow"""
+    if sources is None:
+        sources = [s for s in FREE_SOURCES if source_column(s) in df.columns]
+    if len(df) == 0 or not sources:
+        return pd.DataFrame(columns=['date'] + ([dimension] if dimension else []) + ['source', 'RTP'])
+    long, keys = _by_source(df, dimension, date_range, sources, dimension_values, metrics.source_rtps, 'RTP')
+    return long[keys + ['source', 'RTP']].sort_values(keys + ['source'], kind='stable').reset_index(drop=True)
+
+# ============================================================================
+# TWO-DIMENSION PIVOT
+# ============================================================================
+
+# Pivot metric label -> registry metric over summed TOTAL_COLUMNS
+PIVOT_METRICS = {metric.label: metric for metric in [metrics.CONSUMPTION, metrics.RTP, metrics.FREE_SHARE]}
+
+def pivot_series(sums, row_dimension, column_dimension, metric, by_date=False):
+    """Long (date,) row value, column value, metric frame from per-cell sums (SharedDataset.pivot)"""
+    keys = (['date'] if by_date else []) + [row_dimension, column_dimension]
+    if len(sums) == 0:
+        return pd.DataFrame(columns=keys + [metric])
+    return pd.DataFrame({**{key: sums[key] for key in keys}, metric: metrics.evaluate(PIVOT_METRICS[metric], sums)})
+
+def pivot_matrix(sums, row_dimension, column_dimension, metric):
+    """Row values x column values matrix of a metric (NaN where the combination has no data)"""
+    series = pivot_series(sums, row_dimension, column_dimension, metric)
+    return series.pivot(index=row_dimension, columns=column_dimension, values=metric).sort_index().sort_index(axis=1)
+
+# View name -> (title, series function)
+VIEWS = {
+    'consumption': ("Daily Consumption Trend", consumption_series),
+    'credits_components': ("Credits Components", credits_components_series),
+    'free_vs_paid': ("Daily Free vs Paid Inflow", free_vs_paid_series),
+    'free_share_by_source': ("Daily Free Share by Source", free_share_by_source_series),
+    'rtp_by_source': ("Daily RTP by Source", rtp_by_source_series),
+}